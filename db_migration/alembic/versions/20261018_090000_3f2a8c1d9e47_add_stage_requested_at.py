@@ -0,0 +1,25 @@
+"""Add stage_requested_at to drs_objects
+
+Revision ID: 3f2a8c1d9e47
+Revises: dda104bd723f
+Create Date: 2026-10-18 09:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "3f2a8c1d9e47"
+down_revision = "dda104bd723f"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "drs_objects", sa.Column("stage_requested_at", sa.DateTime(), nullable=True)
+    )
+
+
+def downgrade():
+    op.drop_column("drs_objects", "stage_requested_at")
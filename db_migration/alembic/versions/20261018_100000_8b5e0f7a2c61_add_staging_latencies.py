@@ -0,0 +1,52 @@
+"""Add staging_latencies table
+
+Revision ID: 8b5e0f7a2c61
+Revises: 3f2a8c1d9e47
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8b5e0f7a2c61"
+down_revision = "3f2a8c1d9e47"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "staging_latencies",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("file_id", sa.String(), nullable=False),
+        sa.Column("size", sa.Integer(), nullable=True),
+        sa.Column("latency", sa.Float(), nullable=False),
+        sa.Column(
+            "staged_at",
+            sa.DateTime(),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        op.f("ix_staging_latencies_staged_at"),
+        "staging_latencies",
+        ["staged_at"],
+        unique=False,
+    )
+    op.create_index(
+        op.f("ix_drs_objects_stage_requested_at"),
+        "drs_objects",
+        ["stage_requested_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_drs_objects_stage_requested_at"), table_name="drs_objects")
+    op.drop_index(
+        op.f("ix_staging_latencies_staged_at"), table_name="staging_latencies"
+    )
+    op.drop_table("staging_latencies")
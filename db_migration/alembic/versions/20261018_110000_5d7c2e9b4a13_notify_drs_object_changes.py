@@ -0,0 +1,56 @@
+"""Notify about changes to drs_objects
+
+Revision ID: 5d7c2e9b4a13
+Revises: 8b5e0f7a2c61
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5d7c2e9b4a13"
+down_revision = "8b5e0f7a2c61"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_drs_object_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', OLD.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp())
+                    )::text
+                );
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.file_id <> OLD.file_id)
+            THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', NEW.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp())
+                    )::text
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
+    op.execute("""
+        CREATE TRIGGER notify_drs_object_change
+        AFTER INSERT OR DELETE
+            OR UPDATE OF file_id, md5_checksum, size, registration_date
+        ON drs_objects
+        FOR EACH ROW EXECUTE PROCEDURE notify_drs_object_change()
+        """)
+
+
+def downgrade():
+    op.execute("DROP TRIGGER notify_drs_object_change ON drs_objects")
+    op.execute("DROP FUNCTION notify_drs_object_change()")
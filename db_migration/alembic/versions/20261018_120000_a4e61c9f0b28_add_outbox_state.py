@@ -0,0 +1,44 @@
+"""Add outbox state to drs_objects
+
+Revision ID: a4e61c9f0b28
+Revises: 5d7c2e9b4a13
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a4e61c9f0b28"
+down_revision = "5d7c2e9b4a13"
+branch_labels = None
+depends_on = None
+
+
+def _replace_trigger(columns: str):
+    op.execute("DROP TRIGGER notify_drs_object_change ON drs_objects")
+    op.execute(f"""
+        CREATE TRIGGER notify_drs_object_change
+        AFTER INSERT OR DELETE
+            OR UPDATE OF {columns}
+        ON drs_objects
+        FOR EACH ROW EXECUTE PROCEDURE notify_drs_object_change()
+        """)
+
+
+def upgrade():
+    op.add_column("drs_objects", sa.Column("staged_at", sa.DateTime(), nullable=True))
+    op.add_column(
+        "drs_objects", sa.Column("last_verified_at", sa.DateTime(), nullable=True)
+    )
+    # changes of the outbox state are notified as well:
+    _replace_trigger(
+        "file_id, md5_checksum, size, registration_date, stage_requested_at, staged_at"
+    )
+
+
+def downgrade():
+    _replace_trigger("file_id, md5_checksum, size, registration_date")
+    op.drop_column("drs_objects", "last_verified_at")
+    op.drop_column("drs_objects", "staged_at")
@@ -0,0 +1,36 @@
+"""Add access tracking and pinning to drs_objects
+
+Revision ID: e2b9d47c5a31
+Revises: a4e61c9f0b28
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e2b9d47c5a31"
+down_revision = "a4e61c9f0b28"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "drs_objects", sa.Column("last_accessed_at", sa.DateTime(), nullable=True)
+    )
+    op.add_column(
+        "drs_objects",
+        sa.Column("access_count", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.add_column(
+        "drs_objects",
+        sa.Column("pinned", sa.Boolean(), nullable=False, server_default=sa.false()),
+    )
+
+
+def downgrade():
+    op.drop_column("drs_objects", "pinned")
+    op.drop_column("drs_objects", "access_count")
+    op.drop_column("drs_objects", "last_accessed_at")
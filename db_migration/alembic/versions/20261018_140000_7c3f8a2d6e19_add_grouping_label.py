@@ -0,0 +1,33 @@
+"""Add grouping_label to drs_objects
+
+Revision ID: 7c3f8a2d6e19
+Revises: e2b9d47c5a31
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7c3f8a2d6e19"
+down_revision = "e2b9d47c5a31"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "drs_objects", sa.Column("grouping_label", sa.String(), nullable=True)
+    )
+    op.create_index(
+        op.f("ix_drs_objects_grouping_label"),
+        "drs_objects",
+        ["grouping_label"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index(op.f("ix_drs_objects_grouping_label"), table_name="drs_objects")
+    op.drop_column("drs_objects", "grouping_label")
@@ -0,0 +1,82 @@
+"""Notify whether changed drs_objects left the outbox
+
+Revision ID: 9d1b6f3e2a70
+Revises: 7c3f8a2d6e19
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "9d1b6f3e2a70"
+down_revision = "7c3f8a2d6e19"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_drs_object_change() RETURNS trigger AS $$
+        DECLARE
+            unstaged boolean := false;
+        BEGIN
+            IF TG_OP = 'DELETE' THEN
+                unstaged := OLD.staged_at IS NOT NULL;
+            ELSIF TG_OP = 'UPDATE' THEN
+                unstaged := OLD.staged_at IS NOT NULL AND NEW.staged_at IS NULL;
+            END IF;
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', OLD.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp()),
+                        'unstaged', unstaged
+                    )::text
+                );
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.file_id <> OLD.file_id)
+            THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', NEW.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp()),
+                        'unstaged', false
+                    )::text
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
+
+
+def downgrade():
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_drs_object_change() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', OLD.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp())
+                    )::text
+                );
+            END IF;
+            IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.file_id <> OLD.file_id)
+            THEN
+                PERFORM pg_notify(
+                    'drs_object_changes',
+                    json_build_object(
+                        'file_id', NEW.file_id,
+                        'changed_at', extract(epoch FROM clock_timestamp())
+                    )::text
+                );
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+        """)
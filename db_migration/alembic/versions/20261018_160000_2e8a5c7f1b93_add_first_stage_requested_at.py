@@ -0,0 +1,42 @@
+"""Add first_stage_requested_at to drs_objects
+
+Revision ID: 2e8a5c7f1b93
+Revises: 9d1b6f3e2a70
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "2e8a5c7f1b93"
+down_revision = "9d1b6f3e2a70"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column(
+        "drs_objects",
+        sa.Column("first_stage_requested_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index(
+        op.f("ix_drs_objects_first_stage_requested_at"),
+        "drs_objects",
+        ["first_stage_requested_at"],
+        unique=False,
+    )
+    # the pending stage requests are measured from the last request, as the first
+    # one is not known:
+    op.execute(
+        "UPDATE drs_objects SET first_stage_requested_at = stage_requested_at"
+        + " WHERE stage_requested_at IS NOT NULL"
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_drs_objects_first_stage_requested_at"), table_name="drs_objects"
+    )
+    op.drop_column("drs_objects", "first_stage_requested_at")
@@ -0,0 +1,60 @@
+"""Store the timestamps of the outbox state with time zone
+
+Revision ID: 6b4d9e2f8c15
+Revises: 2e8a5c7f1b93
+Create Date: 2026-10-18 17:00:00.000000
+
+"""
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "6b4d9e2f8c15"
+down_revision = "2e8a5c7f1b93"
+branch_labels = None
+depends_on = None
+
+# the columns that were set from the database clock in the time zone of the session:
+DATABASE_CLOCK_COLUMNS = [
+    ("drs_objects", "stage_requested_at"),
+    ("drs_objects", "first_stage_requested_at"),
+    ("drs_objects", "staged_at"),
+    ("drs_objects", "last_verified_at"),
+    ("staging_latencies", "staged_at"),
+]
+
+
+def upgrade():
+    for table_name, column_name in DATABASE_CLOCK_COLUMNS:
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=sa.DateTime(timezone=True),
+            existing_type=sa.DateTime(),
+        )
+    # the time of the last access was set by the service in UTC:
+    op.alter_column(
+        "drs_objects",
+        "last_accessed_at",
+        type_=sa.DateTime(timezone=True),
+        existing_type=sa.DateTime(),
+        postgresql_using="last_accessed_at AT TIME ZONE 'UTC'",
+    )
+
+
+def downgrade():
+    op.alter_column(
+        "drs_objects",
+        "last_accessed_at",
+        type_=sa.DateTime(),
+        existing_type=sa.DateTime(timezone=True),
+        postgresql_using="last_accessed_at AT TIME ZONE 'UTC'",
+    )
+    for table_name, column_name in DATABASE_CLOCK_COLUMNS:
+        op.alter_column(
+            table_name,
+            column_name,
+            type_=sa.DateTime(),
+            existing_type=sa.DateTime(timezone=True),
+        )
@@ -0,0 +1,27 @@
+"""Forget the placeholder sizes of drs_objects and staging_latencies
+
+Revision ID: c3a7e5d1f9b2
+Revises: 6b4d9e2f8c15
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3a7e5d1f9b2"
+down_revision = "6b4d9e2f8c15"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # until now, every object was registered with the same fictional size, the
+    # real sizes are recorded once the objects are staged:
+    op.execute("UPDATE drs_objects SET size = NULL")
+    op.execute("UPDATE staging_latencies SET size = NULL")
+
+
+def downgrade():
+    # the placeholder sizes are not restored, as they were never used
+    pass
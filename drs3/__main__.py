@@ -18,20 +18,116 @@
 Entrypoint for the package.
 """
 
+from typing import Any, Dict
 from wsgiref.simple_server import make_server
 
+from ghga_service_chassis_lib.api import run_server
+from gunicorn.app.base import BaseApplication
+
 from .api.main import get_app
 from .config import CONFIG, Config
+from .core.access_tracker import close_access_trackers
+from .dao import (
+    dispose_postgresql_connectors,
+    dispose_s3_clients,
+    stop_change_listeners,
+)
+from .metrics import mark_dead_processes, mark_process_dead
+from .pubsub import close_publishers, close_stage_request_batchers
 
 app = get_app()
 
 
+def release_connections(_server: Any, _worker: Any) -> None:
+    """
+    Close all pooled database, storage, and broker connections of the current
+    process, recording the pending object accesses and publishing the batched stage
+    requests before. Suitable for use as gunicorn `post_fork` or `worker_exit`
+    server hook.
+    """
+
+    close_access_trackers()
+    dispose_postgresql_connectors()
+    stop_change_listeners()
+    dispose_s3_clients()
+    close_stage_request_batchers()
+    close_publishers()
+
+
+def release_metrics(_server: Any, worker: Any) -> None:
+    """
+    Clean up the metrics of a worker process that exited.
+    Suitable for use as gunicorn `child_exit` server hook.
+    """
+
+    mark_process_dead(worker.pid)
+
+
+class GunicornApplication(BaseApplication):  # pylint: disable=abstract-method
+    """Serves a WSGI app using gunicorn without the need for a gunicorn config file."""
+
+    def __init__(self, wsgi_app: Any, options: Dict[str, Any]):
+        """Initialize with the app to serve and the gunicorn settings to apply."""
+
+        self.application = wsgi_app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        """Apply the settings passed on init."""
+
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        """Return the app to serve."""
+
+        return self.application
+
+
+def get_gunicorn_options(config: Config = CONFIG) -> Dict[str, Any]:
+    """Translates the config into gunicorn settings."""
+
+    return {
+        "bind": f"{config.host}:{config.port}",
+        "workers": config.workers,
+        "worker_class": "gthread",
+        "threads": config.threads,
+        "keepalive": config.keepalive,
+        "backlog": config.backlog,
+        "timeout": config.worker_timeout,
+        "graceful_timeout": config.graceful_timeout,
+        "max_requests": config.max_requests,
+        "max_requests_jitter": config.max_requests_jitter,
+        "reload": config.auto_reload,
+        # gunicorn knows no "trace" level:
+        "loglevel": "debug" if config.log_level == "trace" else config.log_level,
+        # connections opened by the master while building the app must not be
+        # shared with the workers:
+        "post_fork": release_connections,
+        "worker_exit": release_connections,
+        "child_exit": release_metrics,
+    }
+
+
 def run(config: Config = CONFIG) -> None:
     """
     Starts backend server
     """
-    server = make_server(config.host, config.port, app)
-    server.serve_forever()
+    # clean up the metrics of the exited workers of previous runs:
+    mark_dead_processes()
+
+    if config.server == "simple":
+        server = make_server(config.host, config.port, app)
+        server.serve_forever()
+        return
+
+    if config.server == "asgi":
+        # the import path is passed, so that every worker creates its own app:
+        run_server("drs3.api.main_async:app", config=config)
+        return
+
+    GunicornApplication(app, options=get_gunicorn_options(config)).run()
 
 
 if __name__ == "__main__":
@@ -23,18 +23,32 @@ Additional endpoints might be structured in dedicated modules
 from pathlib import Path
 from typing import Any
 
+from pydantic import BaseModel
 from pyramid.config import Configurator
 from pyramid.events import NewRequest
-from pyramid.httpexceptions import HTTPAccepted, HTTPNotFound
+from pyramid.httpexceptions import (
+    HTTPAccepted,
+    HTTPNotFound,
+    HTTPRequestEntityTooLarge,
+)
+from pyramid.renderers import JSON
 from pyramid.request import Request
+from pyramid.response import Response
 from pyramid.view import view_config
 
 from ..config import CONFIG, Config
-from ..core.main import get_drs_object_serve
+from ..core import (
+    AccessIdNotFoundError,
+    get_drs_object_access_url,
+    get_drs_object_serve,
+    get_drs_objects_serve,
+    get_retry_after,
+)
 from ..custom_openapi3.custom_explorer_view import add_custom_explorer_view
-from ..dao import DrsObjectNotFoundError
-from ..models import DrsObjectServe
-from ..pubsub.publish import publish_stage_request
+from ..dao import DrsObjectNotFoundError, get_postgresql_connector
+from ..metrics import render_metrics
+from ..models import AccessURL, BulkDrsObjectsServe, BulkObjectIds, DrsObjectServe
+from ..pubsub.publish import publish_stage_request, publish_stage_requests
 from .cors import cors_header_response_callback_factory
 
 
@@ -56,6 +70,14 @@ def get_app(config: Config = CONFIG) -> Any:
         pyramid_config.add_subscriber(
             cors_header_response_callback_factory(config), NewRequest
         )
+        pyramid_config.add_tween(".metrics.metrics_tween_factory")
+
+        # allow views to return pydantic models:
+        json_renderer = JSON()
+        json_renderer.add_adapter(
+            BaseModel, lambda model, _: model.dict(exclude_none=True)
+        )
+        pyramid_config.add_renderer("json", json_renderer)
 
         pyramid_config.include("pyramid_openapi3")
         pyramid_config.pyramid_openapi3_spec(
@@ -67,7 +89,10 @@ def get_app(config: Config = CONFIG) -> Any:
 
         pyramid_config.add_route("hello", "/")
         pyramid_config.add_route("health", "/health")
+        pyramid_config.add_route("health_db_pool", "/health/db_pool")
+        pyramid_config.add_route("metrics", "/metrics")
 
+        pyramid_config.add_route("objects", str(api_route / "objects"))
         pyramid_config.add_route(
             "objects_id", str(api_route / "objects" / "{object_id}")
         )
@@ -99,7 +124,10 @@ def get_objects_id(
 
     try:
         drs_object = get_drs_object_serve(
-            drs_id, make_stage_request=publish_stage_request, config=config
+            drs_id,
+            make_stage_request=publish_stage_request,
+            config=config,
+            inline_access_url=config.inline_access_urls,
         )
     except DrsObjectNotFoundError as object_not_found_error:
         raise HTTPNotFound(
@@ -113,8 +141,102 @@ def get_objects_id(
         # return the drs_object
         return drs_object
 
-    # tell client to retry after 5 minutes
-    return HTTPAccepted(retry_after="300")
+    # tell client when to retry
+    return HTTPAccepted(retry_after=str(get_retry_after([drs_id], config=config)))
+
+
+@view_config(
+    route_name="objects_id_access_id",
+    renderer="json",
+    openapi=True,
+    request_method="GET",
+)
+def get_objects_id_access_id(request: Request) -> AccessURL:
+    """
+    Get a URL for fetching the bytes of a ``DrsObject``.
+    Args:
+        request: An instance of ``pyramid.request.Request``
+    Returns:
+        An instance of ``AccessURL``
+    """
+
+    drs_id = request.matchdict["object_id"]
+    access_id = request.matchdict["access_id"]
+
+    config: Config = CONFIG
+
+    try:
+        access_url = get_drs_object_access_url(
+            drs_id,
+            access_id=access_id,
+            make_stage_request=publish_stage_request,
+            config=config,
+        )
+    except DrsObjectNotFoundError as object_not_found_error:
+        raise HTTPNotFound(
+            json={
+                "msg": "The requested DRSObject does not exist",
+                "status_code": 404,
+            }
+        ) from object_not_found_error
+    except AccessIdNotFoundError as access_id_not_found_error:
+        raise HTTPNotFound(
+            json={
+                "msg": "The requested access ID does not exist",
+                "status_code": 404,
+            }
+        ) from access_id_not_found_error
+
+    if access_url is not None:
+        return access_url
+
+    # tell client when to retry
+    return HTTPAccepted(retry_after=str(get_retry_after([drs_id], config=config)))
+
+
+@view_config(route_name="objects", renderer="json", openapi=True, request_method="POST")
+def post_objects(request: Request) -> BulkDrsObjectsServe:
+    """
+    Get info about multiple ``DrsObject``s.
+    Args:
+        request: An instance of ``pyramid.request.Request``
+    Returns:
+        An instance of ``BulkDrsObjectsServe``
+    """
+
+    bulk_object_ids = BulkObjectIds(**request.json_body).bulk_object_ids
+
+    config: Config = CONFIG
+
+    if len(bulk_object_ids) > config.bulk_max_object_ids:
+        raise HTTPRequestEntityTooLarge(
+            json={
+                "msg": "The request must not contain more than "
+                + f"{config.bulk_max_object_ids} object IDs",
+                "status_code": 413,
+            }
+        )
+
+    drs_objects = get_drs_objects_serve(
+        bulk_object_ids,
+        make_stage_requests=publish_stage_requests,
+        config=config,
+        inline_access_url=config.inline_access_urls,
+    )
+
+    staged_ids = [
+        object_id
+        for unresolved in drs_objects.unresolved_drs_objects
+        if unresolved.error_code == 202
+        for object_id in unresolved.object_ids
+    ]
+    if staged_ids:
+        # tell client when to retry the staged objects
+        request.response.headers["Retry-After"] = str(
+            get_retry_after(staged_ids, config=config)
+        )
+
+    return drs_objects
 
 
 @view_config(route_name="health", renderer="json", openapi=False, request_method="GET")
@@ -123,3 +245,25 @@ def get_health(_, __):
     Check for the health of the service.
     """
     return {"status": "OK"}
+
+
+@view_config(
+    route_name="health_db_pool", renderer="json", openapi=False, request_method="GET"
+)
+def get_health_db_pool(_, __):
+    """
+    Get statistics on the database connection pool of the serving process.
+    """
+    config: Config = CONFIG
+
+    return get_postgresql_connector(config).pool_status()
+
+
+@view_config(route_name="metrics", openapi=False, request_method="GET")
+def get_metrics(_, __):
+    """
+    Expose the metrics of all processes of the service in the Prometheus text format.
+    """
+    body, content_type = render_metrics()
+
+    return Response(body=body, content_type=content_type, charset=None)
@@ -0,0 +1,407 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Module containing the ASGI counterpart of the Pyramid app defined in the main module.
+It serves the same routes, validated against the same OpenAPI spec, however, all
+requests are handled in an event loop using non-blocking database, S3, and broker
+connections. Requires the `asgi` extra.
+"""
+
+import json
+import time
+from pathlib import Path
+from string import Template
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
+from ghga_service_chassis_lib.api import configure_app
+from openapi_core import create_spec
+from openapi_core.validation.request.datatypes import OpenAPIRequest, RequestParameters
+from openapi_core.validation.request.validators import RequestValidator
+from openapi_core.validation.response.datatypes import OpenAPIResponse
+from openapi_core.validation.response.validators import ResponseValidator
+from openapi_spec_validator import validate_spec
+from openapi_spec_validator.schemas import read_yaml_file
+from pydantic import BaseModel
+from starlette.requests import Request
+from werkzeug.datastructures import ImmutableMultiDict
+
+from ..config import CONFIG, Config
+from ..core import AccessIdNotFoundError, get_retry_after_async
+from ..core.access_tracker import close_access_trackers
+from ..core.main_async import (
+    get_drs_object_access_url_async,
+    get_drs_object_serve_async,
+    get_drs_objects_serve_async,
+)
+from ..custom_openapi3.custom_explorer_view import SWAGGER_HTML
+from ..dao import (
+    DrsObjectNotFoundError,
+    dispose_async_postgresql_connectors,
+    get_async_postgresql_connector,
+    stop_change_listeners,
+)
+from ..dao.s3_async import dispose_http_sessions
+from ..metrics import REQUEST_DURATION, REQUESTS, render_metrics
+from ..models import BulkObjectIds
+from ..pubsub import close_publishers, close_stage_request_batchers
+from ..pubsub.publish_async import (
+    dispose_amqp_connections,
+    publish_stage_requests_async,
+)
+from .metrics import UNRECORDED_ROUTES
+
+OPENAPI_SPEC_PATH = Path(__file__).parent / "openapi.yaml"
+
+
+def _error_response(msg: str, status_code: int) -> JSONResponse:
+    """Creates a response with a body that complies with the Error schema."""
+
+    return JSONResponse({"msg": msg, "status_code": status_code}, status_code)
+
+
+def _model_response(model: BaseModel) -> Response:
+    """Creates a response with the model as JSON body."""
+
+    return Response(model.json(exclude_none=True), media_type="application/json")
+
+
+class OpenAPIValidator:
+    """Validates requests and responses of the API routes against the OpenAPI spec."""
+
+    def __init__(self, spec_path: Path):
+        """Load the spec from the provided path."""
+
+        spec_dict = read_yaml_file(spec_path)
+        validate_spec(spec_dict)
+        spec = create_spec(spec_dict)
+
+        self._request_validator = RequestValidator(spec)
+        self._response_validator = ResponseValidator(spec)
+
+    @staticmethod
+    def _create_openapi_request(
+        request: Request, path_pattern: str, body: bytes
+    ) -> OpenAPIRequest:
+        """Create an OpenAPIRequest from a Starlette request."""
+
+        return OpenAPIRequest(
+            full_url_pattern=str(request.base_url).rstrip("/") + path_pattern,
+            method=request.method.lower(),
+            parameters=RequestParameters(
+                path=request.path_params,
+                query=ImmutableMultiDict(list(request.query_params.multi_items())),
+                header=list(request.headers.items()),
+                cookie=request.cookies,
+            ),
+            body=body,
+            mimetype=request.headers.get("content-type", "").split(";")[0],
+        )
+
+    def _set_base_url(self, request: Request):
+        """
+        Needed to support relative `servers` entries in `openapi.yaml`
+        (see `pyramid_openapi3.openapi_view`).
+        """
+        base_url = str(request.base_url).rstrip("/")
+        self._request_validator.base_url = base_url
+        self._response_validator.base_url = base_url
+
+    def validate_request(
+        self, request: Request, path_pattern: str, body: bytes
+    ) -> Optional[Response]:
+        """
+        Validates the request. Returns a response that rejects the request if it is
+        invalid or None otherwise.
+        """
+
+        self._set_base_url(request)
+        result = self._request_validator.validate(
+            self._create_openapi_request(request, path_pattern, body)
+        )
+        if result.errors:
+            return _error_response(
+                "; ".join(str(error) for error in result.errors), 400
+            )
+
+        return None
+
+    def validate_response(
+        self, request: Request, path_pattern: str, body: bytes, response: Response
+    ) -> Response:
+        """
+        Validates the response. Returns the response if it is valid or an internal
+        server error otherwise.
+        """
+
+        self._set_base_url(request)
+        result = self._response_validator.validate(
+            request=self._create_openapi_request(request, path_pattern, body),
+            response=OpenAPIResponse(
+                data=response.body,
+                status_code=response.status_code,
+                mimetype=response.media_type or "",
+            ),
+        )
+        if result.errors:
+            return _error_response("The response violates the API spec", 500)
+
+        return response
+
+
+def _add_openapi_route(
+    app: FastAPI,
+    validator: OpenAPIValidator,
+    path: str,
+    name: str,
+    method: str,
+    handler: Callable[[Request, bytes], Awaitable[Response]],
+):
+    """
+    Adds a route whose requests and responses are validated against the OpenAPI
+    spec. The handler receives the request along with its body.
+    """
+
+    async def endpoint(request: Request) -> Response:
+        body = await request.body()
+
+        rejection = validator.validate_request(request, path, body)
+        if rejection is not None:
+            return rejection
+
+        response = await handler(request, body)
+
+        return validator.validate_response(request, path, body, response)
+
+    app.add_route(path, endpoint, methods=[method], name=name)
+
+
+async def get_objects_id(request: Request, _: bytes) -> Response:
+    """
+    Get info about a ``DrsObject``.
+    """
+
+    drs_id = request.path_params["object_id"]
+
+    config: Config = CONFIG
+
+    try:
+        drs_object = await get_drs_object_serve_async(
+            drs_id,
+            make_stage_requests=publish_stage_requests_async,
+            config=config,
+            inline_access_url=config.inline_access_urls,
+        )
+    except DrsObjectNotFoundError:
+        return _error_response("The requested DRSObject does not exist", 404)
+
+    if drs_object is not None:
+        # return the drs_object
+        return _model_response(drs_object)
+
+    # tell client when to retry
+    retry_after = await get_retry_after_async([drs_id], config=config)
+    return Response(status_code=202, headers={"Retry-After": str(retry_after)})
+
+
+async def get_objects_id_access_id(request: Request, _: bytes) -> Response:
+    """
+    Get a URL for fetching the bytes of a ``DrsObject``.
+    """
+
+    drs_id = request.path_params["object_id"]
+    access_id = request.path_params["access_id"]
+
+    config: Config = CONFIG
+
+    try:
+        access_url = await get_drs_object_access_url_async(
+            drs_id,
+            access_id=access_id,
+            make_stage_requests=publish_stage_requests_async,
+            config=config,
+        )
+    except DrsObjectNotFoundError:
+        return _error_response("The requested DRSObject does not exist", 404)
+    except AccessIdNotFoundError:
+        return _error_response("The requested access ID does not exist", 404)
+
+    if access_url is not None:
+        return _model_response(access_url)
+
+    # tell client when to retry
+    retry_after = await get_retry_after_async([drs_id], config=config)
+    return Response(status_code=202, headers={"Retry-After": str(retry_after)})
+
+
+async def post_objects(_: Request, body: bytes) -> Response:
+    """
+    Get info about multiple ``DrsObject``s.
+    """
+
+    bulk_object_ids = BulkObjectIds(**json.loads(body)).bulk_object_ids
+
+    config: Config = CONFIG
+
+    if len(bulk_object_ids) > config.bulk_max_object_ids:
+        return _error_response(
+            "The request must not contain more than "
+            + f"{config.bulk_max_object_ids} object IDs",
+            413,
+        )
+
+    drs_objects = await get_drs_objects_serve_async(
+        bulk_object_ids,
+        make_stage_requests=publish_stage_requests_async,
+        config=config,
+        inline_access_url=config.inline_access_urls,
+    )
+
+    response = _model_response(drs_objects)
+
+    staged_ids = [
+        object_id
+        for unresolved in drs_objects.unresolved_drs_objects
+        if unresolved.error_code == 202
+        for object_id in unresolved.object_ids
+    ]
+    if staged_ids:
+        # tell client when to retry the staged objects
+        retry_after = await get_retry_after_async(staged_ids, config=config)
+        response.headers["Retry-After"] = str(retry_after)
+
+    return response
+
+
+def get_app(config: Config = CONFIG) -> FastAPI:
+    """
+    Builds the ASGI app
+    Args:
+        config: Settings for the application
+    Returns:
+        An instance of a FastAPI app
+    """
+    api_route = Path(config.api_route)
+    spec_route = str(api_route / "openapi.yaml")
+
+    # the API is documented by the OpenAPI spec, not by FastAPI:
+    app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+    configure_app(app, config=config)
+
+    validator = OpenAPIValidator(OPENAPI_SPEC_PATH)
+
+    # (path, name, method, handler) of the routes specified in the OpenAPI spec:
+    openapi_routes: List[tuple] = [
+        (str(api_route / "objects"), "objects", "POST", post_objects),
+        (
+            str(api_route / "objects" / "{object_id}"),
+            "objects_id",
+            "GET",
+            get_objects_id,
+        ),
+        (
+            str(api_route / "objects" / "{object_id}" / "access" / "{access_id}"),
+            "objects_id_access_id",
+            "GET",
+            get_objects_id_access_id,
+        ),
+    ]
+    for path, name, method, handler in openapi_routes:
+        _add_openapi_route(app, validator, path, name, method, handler)
+
+    @app.get(spec_route, name="spec")
+    async def get_spec():
+        return FileResponse(OPENAPI_SPEC_PATH, media_type="text/yaml")
+
+    @app.get(str(api_route), name="explorer")
+    async def get_explorer():
+        template = Template(SWAGGER_HTML.read_text())
+        return HTMLResponse(
+            template.safe_substitute(
+                ui_version="3.17.1",
+                spec_url=config.custom_spec_url or spec_route,
+            )
+        )
+
+    @app.get("/health", name="health")
+    async def get_health():
+        """
+        Check for the health of the service.
+        """
+        return {"status": "OK"}
+
+    @app.get("/health/db_pool", name="health_db_pool")
+    async def get_health_db_pool():
+        """
+        Get statistics on the database connection pool of the serving process.
+        """
+        return get_async_postgresql_connector(config).pool_status()
+
+    @app.get("/metrics", name="metrics")
+    async def get_metrics():
+        """
+        Expose the metrics of all processes of the service in the Prometheus text
+        format.
+        """
+        body, content_type = render_metrics()
+        return Response(body, headers={"Content-Type": content_type})
+
+    route_names: Dict[Callable, str] = {
+        route.endpoint: route.name for route in app.routes  # type: ignore
+    }
+
+    @app.middleware("http")
+    async def record_metrics(request: Request, call_next):
+        """
+        Records the duration and the status code of the response, using the name of
+        the matched route as label (see `metrics_tween_factory`).
+        """
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route_name = route_names.get(request.scope.get("endpoint"), "unmatched")
+
+            if route_name not in UNRECORDED_ROUTES:
+                REQUEST_DURATION.labels(route=route_name).observe(
+                    time.perf_counter() - start
+                )
+                REQUESTS.labels(route=route_name, status=str(status)).inc()
+
+    @app.on_event("shutdown")
+    async def release_connections():
+        """
+        Close all pooled database, storage, and broker connections of the event loop
+        as well as the listening database connections of the process, recording the
+        pending object accesses before. Batched stage requests are published before
+        closing the broker connections of the process.
+        """
+        close_access_trackers()
+        await dispose_async_postgresql_connectors()
+        stop_change_listeners()
+        await dispose_http_sessions()
+        await dispose_amqp_connections()
+        close_stage_request_batchers()
+        close_publishers()
+
+    return app
+
+
+app = get_app()
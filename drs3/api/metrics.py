@@ -0,0 +1,63 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Record request metrics
+"""
+
+import time
+from typing import Any, Callable
+
+from pyramid.request import Request
+from pyramid.response import Response
+
+from ..metrics import REQUEST_DURATION, REQUESTS
+
+# routes that are not worth recording:
+UNRECORDED_ROUTES = {"metrics", "health", "health_db_pool"}
+
+
+def metrics_tween_factory(
+    handler: Callable[[Request], Response], _: Any
+) -> Callable[[Request], Response]:
+    """
+    A factory for a tween that records the duration and the outcome of all requests
+    to API routes. It can be added to a pyramid config by:
+    ``config.add_tween("drs3.api.metrics.metrics_tween_factory")``
+    """
+
+    def metrics_tween(request: Request) -> Response:
+        """
+        Records the duration and the status code of the response, using the name of
+        the matched route as label.
+        """
+
+        start = time.perf_counter()
+        status = 500
+        try:
+            response = handler(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.matched_route
+            route_name = "unmatched" if route is None else route.name
+
+            if route_name not in UNRECORDED_ROUTES:
+                REQUEST_DURATION.labels(route=route_name).observe(
+                    time.perf_counter() - start
+                )
+                REQUESTS.labels(route=route_name, status=str(status)).inc()
+
+    return metrics_tween
@@ -15,13 +15,14 @@
 
 """Config Parameter Modeling and Parsing"""
 
-from typing import Literal, Optional
+from typing import List, Literal, Optional
 
 from ghga_service_chassis_lib.api import ApiConfigBase
 from ghga_service_chassis_lib.config import config_from_yaml
 from ghga_service_chassis_lib.postgresql import PostgresqlConfigBase
 from ghga_service_chassis_lib.pubsub import PubSubConfigBase
 from ghga_service_chassis_lib.s3 import S3ConfigBase
+from pydantic import validator
 
 LogLevel = Literal["critical", "error", "warning", "info", "debug", "trace"]
 
@@ -44,11 +45,228 @@ class Config(ApiConfigBase, PubSubConfigBase, PostgresqlConfigBase, S3ConfigBase
 
     service_name: str = "drs3"
     topic_name_stage_request: str = "non_staged_file_requested"
+    topic_name_stage_request_batch: str = "non_staged_file_requested_batch"
     topic_name_file_staged: str = "file_staged_for_download"
     topic_name_file_registered: str = "file-internally-registered"
     topic_name_drs_object_registered: str = "drs-object-registered"
 
     s3_outbox_bucket_id: str
 
+    # Messages are published by a background thread over a long-lived connection
+    # per process, so that publishing does not delay responses. Up to
+    # `amqp_publish_queue_size` messages are buffered while the broker is slow or
+    # unreachable and as many may be sent but not yet confirmed, publishing fails
+    # if the buffer stays full for `amqp_publish_timeout` seconds. If
+    # `amqp_publisher_confirms` is set, the broker confirms every message and
+    # messages that were not confirmed before the connection was lost are sent
+    # again after reconnecting:
+    amqp_publisher_confirms: bool = True
+    amqp_publish_queue_size: int = 10000
+    amqp_publish_timeout: float = 10
+    amqp_reconnect_delay: float = 1
+
+    # Stage requests are published as one message per object to the stage request
+    # topic, unless `stage_request_batching` is set. Then, each process collects
+    # them for up to `stage_request_batch_window` seconds or until
+    # `stage_request_batch_max_size` of them have been collected and publishes them
+    # as one message to the stage request batch topic (see the
+    # non_staged_file_requested_batch schema), which consumers need to support:
+    stage_request_batching: bool = False
+    stage_request_batch_window: float = 0.5
+    stage_request_batch_max_size: int = 500
+
+    # Messages of the file registered topic are processed in batches of up to
+    # `file_registered_batch_size` messages, waiting at most
+    # `file_registered_batch_window` seconds for a batch to fill up. The objects of
+    # a batch are registered in one transaction and the messages are acknowledged
+    # once it has been committed and the follow-up messages have been published.
+    # A batch size of 1 processes the messages one by one:
+    file_registered_batch_size: int = 1
+    file_registered_batch_window: float = 0.5
+
+    # The consumer started by `drs3-consumer` processes the messages of all topics
+    # in `consumer_workers` threads, sharing the connection pools of the process
+    # (so `db_pool_size` should not be smaller). Messages are assigned to the
+    # threads by file ID, so that the messages concerning a file are processed in
+    # the order they were received, each thread batching the file registered
+    # messages it is assigned as described above. Up to `consumer_prefetch`
+    # unacknowledged messages are delivered per topic at a time (at least one
+    # batch), which also applies to the subscriber of the file registered topic:
+    consumer_workers: int = 4
+    consumer_prefetch: int = 32
+
+    # If set to False, served DrsObjects only contain the access ID of their access
+    # method and the access URL has to be obtained via the access endpoint. This
+    # saves checking the outbox and signing an URL for metadata-only lookups:
+    inline_access_urls: bool = True
+
+    # Presigned download URLs expire after that many seconds. They are cached per
+    # file ID in each process for `download_url_cache_ttl` seconds (0 disables
+    # caching), which must not exceed half of the expiry so that URLs served from
+    # the cache always remain valid long enough:
+    download_url_expires_after: int = 86400
+    download_url_cache_ttl: int = 3600
+    download_url_cache_max_size: int = 10000
+
+    # Whether an object exists in the outbox is decided from the outbox state that
+    # is recorded in the database when objects are staged. The outbox is only
+    # checked for objects with unknown state and for staged objects whose presence
+    # was last verified more than `outbox_verify_interval` seconds ago (0 checks
+    # staged objects on every request):
+    outbox_verify_interval: int = 3600
+
+    # Requests of objects are counted in each process and recorded in the database
+    # every `access_flush_interval` seconds (0 disables tracking the accesses):
+    access_flush_interval: float = 10
+
+    # The eviction service (`drs3-evictor`) keeps the outbox within
+    # `outbox_byte_budget` bytes (None disables eviction) by evicting the least
+    # recently requested objects every `outbox_eviction_interval` seconds, locking
+    # `outbox_eviction_batch_size` objects at a time. Pinned objects and objects
+    # staged less than `outbox_min_residency` seconds ago are never evicted, so
+    # that objects are not evicted before they could be downloaded. The usage of
+    # the outbox adds up the sizes of the staged objects, which are recorded when
+    # they are staged (or looked up in the outbox by the eviction service):
+    outbox_byte_budget: Optional[int] = None
+    outbox_eviction_interval: int = 60
+    outbox_eviction_batch_size: int = 100
+    outbox_min_residency: int = 3600
+
+    # The results of checking whether an object exists in the outbox are cached per
+    # file ID in each process. Positive and negative results are cached for
+    # different durations (0 disables caching the respective result):
+    outbox_cache_positive_ttl: int = 60
+    outbox_cache_negative_ttl: int = 10
+    outbox_cache_max_size: int = 100000
+
+    # The metadata of DrsObjects is cached per file ID in each process for
+    # `metadata_cache_ttl` seconds (0 disables caching). Entries are invalidated as
+    # soon as the database notifies about a change of the object, which is received
+    # by a listener in each process. While the listener is not connected, the cache
+    # is bypassed. The listener reconnects after `db_listener_reconnect_delay`
+    # seconds:
+    metadata_cache_ttl: int = 3600
+    metadata_cache_max_size: int = 100000
+    db_listener_reconnect_delay: float = 1
+
+    # Lookups of file IDs that don't exist are answered without querying the
+    # database using a Bloom filter of the file IDs of all DrsObjects in each
+    # process. The filter is loaded from the database in the background and kept up
+    # to date using the same notifications as the metadata cache. It is sized for
+    # `file_id_filter_capacity` file IDs (0 disables the filter) and falsely reports
+    # unknown file IDs as known at the `file_id_filter_error_rate`, which rises
+    # beyond the capacity. At a rate of 1%, the filter takes 1.2 bytes per file ID:
+    file_id_filter_capacity: int = 1000000
+    file_id_filter_error_rate: float = 0.01
+
+    # Staging an object is requested at most once within that many seconds, no
+    # matter how often or by how many processes it is requested (0 disables the
+    # deduplication of stage requests, the time of the first request is recorded
+    # anyway to learn staging latencies). A request that could not be queued for
+    # publishing is retried right away, but one that is queued and later rejected
+    # by the broker is only retried once this window has passed:
+    stage_request_dedup_window: int = 300
+
+    # When an object that has not been staged is requested, staging is also
+    # requested for up to `prestage_max_siblings` objects with the same grouping
+    # label (0 disables prestaging), most frequently requested first. Each process
+    # prestages the siblings of a group at most once within `prestage_group_interval`
+    # seconds, remembering up to `prestage_group_cache_max_size` groups:
+    prestage_max_siblings: int = 20
+    prestage_group_interval: int = 600
+    prestage_group_cache_max_size: int = 10000
+
+    # Concurrent lookups of the same object are coalesced, so that only one of them
+    # queries the database and S3 (and possibly requests staging) while the others
+    # wait for and share its result. "process" coalesces the lookups within each
+    # process, "database" additionally makes sure that only one process at a time
+    # looks up an object (using a PostgreSQL advisory lock), so that a hot object
+    # causes at most one concurrent S3 request, "off" disables coalescing:
+    single_flight_mode: Literal["off", "process", "database"] = "process"
+
+    # The Retry-After returned for objects that are being staged is derived from
+    # the observed staging latencies (the `staging_latency_quantile` of the
+    # `staging_latency_sample_size` most recent ones, optionally grouped by object
+    # size using the upper bounds in bytes given in `staging_latency_size_buckets`)
+    # and the number of stage requests pending ahead of the object. The size of an
+    # object is only known once it has been staged, so the size buckets only apply
+    # to objects that are staged again, e.g. after being evicted, while the
+    # latencies of all sizes are used for the others. The default is used as long
+    # as no stagings have been observed:
+    retry_after_default: int = 300
+    retry_after_min: int = 5
+    retry_after_max: int = 3600
+    staging_latency_quantile: float = 0.5
+    staging_latency_sample_size: int = 200
+    staging_latency_size_buckets: List[int] = []
+    # the staging throughput is measured over that many seconds:
+    staging_rate_window: int = 3600
+    # staging statistics are refreshed from the database after that many seconds:
+    staging_stats_ttl: int = 60
+    staging_latency_retention: int = 604800
+
+    # Bulk requests (POST /objects) resolve at most that many IDs at once and check
+    # the outbox for up to that many objects concurrently (the results are recorded
+    # in the database at once, so that this does not take database connections):
+    bulk_max_object_ids: int = 5000
+    bulk_outbox_check_concurrency: int = 16
+
+    # Server used to serve the API: "gunicorn" is a pre-forking server that spawns
+    # `workers` processes each serving `threads` requests concurrently, "asgi"
+    # serves the API with uvicorn in `workers` processes each running an event loop
+    # that handles all requests concurrently using non-blocking database, S3, and
+    # broker connections (requires the `asgi` extra), "simple" is the
+    # single-threaded wsgiref server that is only intended for development:
+    server: Literal["gunicorn", "asgi", "simple"] = "gunicorn"
+    threads: int = 4
+    keepalive: int = 5
+    backlog: int = 2048
+    worker_timeout: int = 60
+    graceful_timeout: int = 30
+    # recycle a worker after it served that many requests (0 disables recycling),
+    # a random jitter avoids that all workers are restarted at once:
+    max_requests: int = 0
+    max_requests_jitter: int = 0
+
+    # Connection pool of the process-wide PostgreSQL engine
+    # (see the `pool_*` parameters of `sqlalchemy.create_engine`):
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+
+    # Connection pool and retry behavior of the process-wide S3 client
+    # (see the parameters of `botocore.config.Config`). Settings made in the
+    # `aws_config_ini` take precedence:
+    s3_max_pool_connections: int = 50
+    s3_connect_timeout: float = 5
+    s3_read_timeout: float = 30
+    s3_max_attempts: int = 3
+    s3_retry_mode: Literal["legacy", "standard", "adaptive"] = "standard"
+
+    # pylint: disable=no-self-argument,no-self-use
+    @validator("download_url_cache_ttl")
+    def check_download_url_cache_ttl(cls, value: int, values: dict):
+        """Checks that cached download URLs can't expire while still being served."""
+
+        expires_after = values.get("download_url_expires_after")
+        if expires_after is not None and value > expires_after / 2:
+            raise ValueError(
+                "must not exceed half of download_url_expires_after "
+                + f"({expires_after} seconds)"
+            )
+
+        return value
+
+    @validator("file_id_filter_error_rate")
+    def check_file_id_filter_error_rate(cls, value: float):
+        """Checks that the false positive rate is a probability."""
+
+        if not 0 < value < 1:
+            raise ValueError("must be between 0 and 1")
+
+        return value
+
 
 CONFIG = Config()
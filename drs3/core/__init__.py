@@ -16,7 +16,15 @@
 """This sub-package contains the core functionality"""
 
 from .main import (  # noqa: F401
+    S3_ACCESS_ID,
+    AccessIdNotFoundError,
+    forget_outbox_state,
+    get_drs_object_access_url,
     get_drs_object_serve,
+    get_drs_objects_serve,
     handle_registered_file,
+    handle_registered_files,
     handle_staged_file,
+    remember_outbox_state,
 )
+from .retry_after import get_retry_after, get_retry_after_async  # noqa: F401
@@ -0,0 +1,167 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Tracking how often and how recently objects are requested. Accesses are counted in
+memory and recorded in the database in batches by a background thread, so that
+serving a request never writes to the database.
+"""
+
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Tuple
+
+from ..config import CONFIG, Config
+from ..dao import Database
+from ..models import DrsObjectAccesses
+
+
+class AccessTracker:
+    """
+    Counts the accesses of objects per file ID and records them in the database
+    every `access_flush_interval` seconds.
+    """
+
+    def __init__(self, config: Config):
+        """Initialize without accesses and start recording in the background."""
+
+        self._config = config
+
+        # the number of accesses and the time of the last access per file ID:
+        self._pending: Dict[str, Tuple[int, datetime]] = {}
+        self._lock = threading.Lock()
+
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="access-tracker", daemon=True
+        )
+        self._thread.start()
+
+    def track(self, file_ids: Iterable[str]) -> None:
+        """Count an access of each of the objects with the specified file IDs."""
+
+        now = datetime.now(timezone.utc)
+
+        with self._lock:
+            for file_id in file_ids:
+                count, _ = self._pending.get(file_id, (0, now))
+                self._pending[file_id] = (count + 1, now)
+
+    def _merge(self, accesses: Dict[str, Tuple[int, datetime]]) -> None:
+        """Add accesses that could not be recorded back to the pending ones."""
+
+        with self._lock:
+            for file_id, (count, last_accessed_at) in accesses.items():
+                pending_count, pending_last = self._pending.get(
+                    file_id, (0, last_accessed_at)
+                )
+                self._pending[file_id] = (
+                    pending_count + count,
+                    max(pending_last, last_accessed_at),
+                )
+
+    def flush(self) -> None:
+        """Record all pending accesses in the database."""
+
+        with self._lock:
+            accesses, self._pending = self._pending, {}
+
+        if not accesses:
+            return
+
+        records: List[DrsObjectAccesses] = [
+            DrsObjectAccesses.construct(
+                file_id=file_id, count=count, last_accessed_at=last_accessed_at
+            )
+            for file_id, (count, last_accessed_at) in accesses.items()
+        ]
+
+        try:
+            with Database(config=self._config) as database:
+                database.record_accesses(records)
+        except Exception:
+            # try again with the next batch:
+            self._merge(accesses)
+            raise
+
+    def _run(self) -> None:
+        """Record the pending accesses periodically until stopped."""
+
+        while not self._stopped.wait(self._config.access_flush_interval):
+            try:
+                self.flush()
+            except Exception as error:  # pylint: disable=broad-except
+                logging.warning("Could not record object accesses: %s", error)
+
+    def close(self) -> None:
+        """Stop recording in the background and record the pending accesses."""
+
+        self._stopped.set()
+        self._thread.join()
+        self.flush()
+
+
+_TRACKERS: Dict[Tuple[Any, ...], AccessTracker] = {}
+_TRACKERS_LOCK = threading.Lock()
+
+
+def get_access_tracker(config: Config = CONFIG) -> AccessTracker:
+    """
+    Get the process-wide access tracker for the database of the provided config.
+    The tracker is created on first use and shared by all subsequent callers in the
+    same process.
+    """
+
+    key = (os.getpid(), config.db_url, config.access_flush_interval)
+
+    with _TRACKERS_LOCK:
+        tracker = _TRACKERS.get(key)
+        if tracker is None:
+            tracker = AccessTracker(config)
+            _TRACKERS[key] = tracker
+
+    return tracker
+
+
+def track_accesses(file_ids: Iterable[str], config: Config = CONFIG) -> None:
+    """
+    Count an access of each of the objects with the specified file IDs, unless
+    access tracking is disabled.
+    """
+
+    if config.access_flush_interval > 0:
+        get_access_tracker(config).track(file_ids)
+
+
+def close_access_trackers() -> None:
+    """
+    Record the pending accesses of all trackers of the current process and forget
+    about all trackers. Trackers inherited from a parent process are dropped
+    without recording their accesses as these are recorded by the parent.
+    """
+
+    pid = os.getpid()
+
+    with _TRACKERS_LOCK:
+        trackers = [tracker for key, tracker in _TRACKERS.items() if key[0] == pid]
+        _TRACKERS.clear()
+
+    for tracker in trackers:
+        try:
+            tracker.close()
+        except Exception as error:  # pylint: disable=broad-except
+            logging.warning("Could not record object accesses: %s", error)
@@ -0,0 +1,91 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Probabilistic set membership"""
+
+import hashlib
+import math
+import threading
+from typing import Iterable
+
+
+class BloomFilter:
+    """
+    A compact set of strings that may report strings as contained that have never
+    been added (false positives), but never reports added strings as not contained.
+    The filter is sized so that, with up to `capacity` added strings, false
+    positives occur at the specified `error_rate`. Adding strings is thread-safe.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        """Initialize an empty filter."""
+
+        if capacity <= 0:
+            raise ValueError("The capacity must be positive.")
+        if not 0 < error_rate < 1:
+            raise ValueError("The error rate must be between 0 and 1.")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+
+        # the optimal number of bits and hash functions for the capacity:
+        self.num_bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_hashes = max(round(self.num_bits / capacity * math.log(2)), 1)
+
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+
+    @property
+    def size(self) -> int:
+        """The memory used by the bits of the filter in bytes."""
+
+        return len(self._bits)
+
+    def _get_positions(self, value: str) -> Iterable[int]:
+        """Get the positions of the bits representing the value, derived from two
+        independent hashes (see Kirsch and Mitzenmacher, "Less Hashing, Same
+        Performance")."""
+
+        digest = hashlib.blake2b(value.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+
+        return (
+            (first + index * second) % self.num_bits for index in range(self.num_hashes)
+        )
+
+    def add(self, value: str) -> None:
+        """Add the value to the filter."""
+
+        positions = list(self._get_positions(value))
+
+        with self._lock:
+            for position in positions:
+                self._bits[position >> 3] |= 1 << (position & 7)
+
+    def update(self, values: Iterable[str]) -> None:
+        """Add all values to the filter."""
+
+        for value in values:
+            self.add(value)
+
+    def __contains__(self, value: str) -> bool:
+        """Check whether the value may have been added to the filter."""
+
+        bits = self._bits
+        return all(
+            bits[position >> 3] & (1 << (position & 7))
+            for position in self._get_positions(value)
+        )
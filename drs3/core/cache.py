@@ -0,0 +1,128 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""In-process caches"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class TtlCache(Generic[KeyType, ValueType]):
+    """
+    A thread-safe cache that holds at most `max_size` entries, evicting the least
+    recently used ones first. Entries expire after `ttl` seconds, which may be
+    overridden per entry. A `ttl` of zero or a `max_size` of zero disables caching.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        """Initialize an empty cache."""
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+        self._entries: "OrderedDict[KeyType, Tuple[float, ValueType]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: KeyType) -> Optional[ValueType]:
+        """Get the value cached for the key or None if there is no valid entry."""
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[0] <= time.monotonic():
+                # the entry expired:
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: KeyType, value: ValueType, ttl: Optional[float] = None) -> None:
+        """Cache the value for the key. If specified, the `ttl` overrides the default
+        TTL of the cache."""
+
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0 or self.max_size <= 0:
+            return
+
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key: KeyType) -> None:
+        """Remove the entry for the key, if any."""
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        """Remove all entries."""
+
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Returns the size of the cache and the number of hits and misses."""
+
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_CACHES: Dict[Tuple[Any, ...], TtlCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_cache(name: str, max_size: int, ttl: float) -> TtlCache:
+    """
+    Get the process-wide cache with the specified name. The cache is created on
+    first use and shared by all subsequent callers in the same process.
+    """
+
+    key = (name, max_size, ttl)
+
+    with _CACHES_LOCK:
+        cache = _CACHES.get(key)
+        if cache is None:
+            cache = TtlCache(max_size=max_size, ttl=ttl)
+            _CACHES[key] = cache
+
+    return cache
+
+
+def clear_caches() -> None:
+    """Remove all entries from all process-wide caches."""
+
+    with _CACHES_LOCK:
+        for cache in _CACHES.values():
+            cache.clear()
@@ -0,0 +1,148 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Keeping the outbox within its byte budget by evicting the least recently used
+objects. The usage of the outbox is derived from the sizes of the objects that are
+recorded as staged in the database. The sizes are recorded when objects are staged
+and looked up in the outbox for objects that were staged otherwise.
+"""
+
+import logging
+import signal
+import threading
+from typing import List, Optional
+
+from ..config import CONFIG, Config
+from ..dao import Database, ObjectNotFoundError, ObjectStorage
+from ..models import DrsObjectUpdate
+
+
+def record_missing_sizes(config: Config = CONFIG) -> None:
+    """
+    Look up the sizes of the staged objects whose size is not known in the outbox
+    and record them, `outbox_eviction_batch_size` objects at a time. Objects that
+    turn out not to be in the outbox are no longer considered as staged.
+    """
+
+    while True:
+        with Database(config=config) as database:
+            file_ids = database.get_staged_file_ids_without_size(
+                limit=config.outbox_eviction_batch_size
+            )
+        if not file_ids:
+            return
+
+        with ObjectStorage(config=config) as storage:
+            sizes = [
+                storage.get_object_size(config.s3_outbox_bucket_id, file_id)
+                for file_id in file_ids
+            ]
+
+        with Database(config=config) as database:
+            database.update_drs_objects(
+                [
+                    DrsObjectUpdate(file_id=file_id, size=size)
+                    for file_id, size in zip(file_ids, sizes)
+                    if size is not None
+                ]
+            )
+            for file_id, size in zip(file_ids, sizes):
+                if size is None:
+                    database.record_outbox_verification(file_id, in_outbox=False)
+
+
+def evict_from_outbox(config: Config = CONFIG) -> List[str]:
+    """
+    Evict staged objects from the outbox, least recently used first, until the
+    outbox fits into the `outbox_byte_budget`. Pinned objects and objects staged
+    within the last `outbox_min_residency` seconds are never evicted, so the budget
+    may remain exceeded. Returns the file IDs of the evicted objects.
+    """
+
+    if config.outbox_byte_budget is None:
+        return []
+
+    record_missing_sizes(config)
+
+    with Database(config=config) as database:
+        usage = database.get_outbox_usage()
+
+    evicted: List[str] = []
+    error: Optional[Exception] = None
+
+    while usage > config.outbox_byte_budget and error is None:
+        # The evicted objects are locked while deleting them, so that they are not
+        # staged again before the deletion is recorded:
+        with Database(config=config) as database, ObjectStorage(
+            config=config
+        ) as storage:
+            candidates = database.lock_eviction_candidates(
+                limit=config.outbox_eviction_batch_size,
+                min_residency=config.outbox_min_residency,
+            )
+            if not candidates:
+                break
+
+            for candidate in candidates:
+                if usage <= config.outbox_byte_budget:
+                    break
+
+                try:
+                    storage.delete_object(
+                        bucket_id=config.s3_outbox_bucket_id,
+                        object_id=candidate.file_id,
+                    )
+                except ObjectNotFoundError:
+                    # the object left the outbox already
+                    pass
+                except Exception as delete_error:  # pylint: disable=broad-except
+                    # record the deletions made so far before giving up:
+                    error = delete_error
+                    break
+
+                # this is notified to all serving processes, which forget the
+                # cached outbox state of the object:
+                database.record_outbox_verification(candidate.file_id, in_outbox=False)
+                usage -= candidate.size or 0
+                evicted.append(candidate.file_id)
+
+    if error is not None:
+        raise error
+
+    return evicted
+
+
+def run(config: Config = CONFIG) -> None:
+    """
+    Starts the eviction service, which evicts objects from the outbox every
+    `outbox_eviction_interval` seconds.
+    """
+
+    stopped = threading.Event()
+
+    # finish the eviction in progress when asked to terminate:
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: stopped.set())
+
+    while not stopped.is_set():
+        try:
+            evicted = evict_from_outbox(config)
+        except Exception:  # pylint: disable=broad-except
+            logging.exception("Evicting objects from the outbox failed.")
+        else:
+            if evicted:
+                logging.info("Evicted %s objects from the outbox.", len(evicted))
+
+        stopped.wait(config.outbox_eviction_interval)
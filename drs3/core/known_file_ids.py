@@ -0,0 +1,267 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Answering lookups of unknown file IDs without querying the database. Each process
+keeps a Bloom filter of the file IDs of all DrsObjects, which is loaded from the
+database in the background and kept up to date using the notifications of changes
+(see `DRS_OBJECT_CHANGES_CHANNEL`).
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from ..config import CONFIG, Config
+from ..dao import Database, DrsObjectNotFoundError, get_change_listener
+from ..dao.db_models import DRS_OBJECT_CHANGES_CHANNEL
+from ..dao.listener import ChangeListener
+from ..metrics import FILE_ID_FILTER_LOOKUPS
+from .bloom_filter import BloomFilter
+
+# how long (in seconds) to wait for the notifications of recent registrations
+# before an object is considered as absent:
+SYNC_TIMEOUT = 1.0
+
+
+class FileIdFilter:
+    """
+    A Bloom filter of the file IDs of all DrsObjects. As notifications are lost
+    while not listening, the filter is discarded whenever listening (re)starts and
+    loaded anew, during which time it is not available.
+    """
+
+    def __init__(self, config: Config):
+        """Initialize without loading the filter."""
+
+        self._config = config
+        self._filter: Optional[BloomFilter] = None
+        self._loading: Optional[BloomFilter] = None
+        self._next_load = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, file_ids: Iterable[str]) -> None:
+        """Add the file IDs to the filter, including the one that is being loaded."""
+
+        with self._lock:
+            filters = [
+                bloom_filter
+                for bloom_filter in (self._filter, self._loading)
+                if bloom_filter is not None
+            ]
+
+        file_ids = list(file_ids)
+        for bloom_filter in filters:
+            bloom_filter.update(file_ids)
+
+    def _on_notify(self, payload: str) -> None:
+        """Add the file ID of a changed object, which may have been registered."""
+
+        self.add([json.loads(payload)["file_id"]])
+
+    def _on_reset(self) -> None:
+        """Discard the filter as changes may have been missed."""
+
+        with self._lock:
+            self._filter = None
+            self._loading = None
+
+    def may_exist(self, file_id: str) -> Optional[bool]:
+        """
+        Check whether an object with the file ID may exist. Returns None if the
+        filter is not available (yet), in which case loading it is started.
+        As the registration of an object may not have been notified yet, an absent
+        object should be confirmed using `may_exist_after_sync`.
+        """
+
+        listener = self._get_listener()
+
+        bloom_filter = self._filter
+        if bloom_filter is not None:
+            return file_id in bloom_filter
+
+        if listener.listening:
+            self._start_loading()
+
+        return None
+
+    def may_exist_after_sync(self, file_id: str) -> Optional[bool]:
+        """
+        Same as `may_exist`, but waits until all notifications that were sent before
+        have been received, e.g. of a registration the client just learned about
+        from the drs_object_registered event. Returns None if this takes longer than
+        `SYNC_TIMEOUT` seconds.
+        """
+
+        if not self._get_listener().sync(timeout=SYNC_TIMEOUT):
+            return None
+
+        return self.may_exist(file_id)
+
+    def _get_listener(self) -> ChangeListener:
+        """Get the listener keeping the filter up to date, subscribing to it."""
+
+        listener = get_change_listener(DRS_OBJECT_CHANGES_CHANNEL, config=self._config)
+        listener.subscribe(
+            "file_id_filter", on_notify=self._on_notify, on_reset=self._on_reset
+        )
+
+        return listener
+
+    def _start_loading(self) -> None:
+        """
+        Start loading the filter in the background, unless it is being loaded
+        already or loading failed recently.
+        """
+
+        with self._lock:
+            if (
+                self._filter is not None
+                or self._loading is not None
+                or time.monotonic() < self._next_load
+            ):
+                return
+
+            self._loading = BloomFilter(
+                capacity=self._config.file_id_filter_capacity,
+                error_rate=self._config.file_id_filter_error_rate,
+            )
+            self._next_load = (
+                time.monotonic() + self._config.db_listener_reconnect_delay
+            )
+            loading = self._loading
+
+        threading.Thread(
+            target=self._load, args=(loading,), name="file-id-filter", daemon=True
+        ).start()
+
+    def _load(self, bloom_filter: BloomFilter) -> None:
+        """
+        Add the file IDs of all objects to the filter and make it available, unless
+        it was discarded in the meantime.
+        """
+
+        loaded = False
+        try:
+            with Database(config=self._config) as database:
+                for file_ids in database.iter_file_ids():
+                    bloom_filter.update(file_ids)
+            loaded = True
+        finally:
+            with self._lock:
+                if self._loading is bloom_filter:
+                    self._loading = None
+                    if loaded:
+                        self._filter = bloom_filter
+
+
+_FILTERS: Dict[Tuple[Any, ...], FileIdFilter] = {}
+_FILTERS_LOCK = threading.Lock()
+
+
+def _get_filter_key(config: Config) -> Tuple[Any, ...]:
+    """Get the key of the filter of the current process for the provided config."""
+
+    return (
+        os.getpid(),
+        config.db_url,
+        config.file_id_filter_capacity,
+        config.file_id_filter_error_rate,
+    )
+
+
+def get_file_id_filter(config: Config = CONFIG) -> Optional[FileIdFilter]:
+    """
+    Get the process-wide filter of known file IDs or None if the filter is disabled.
+    The filter is created on first use and shared by all subsequent callers in the
+    same process.
+    """
+
+    if config.file_id_filter_capacity <= 0:
+        return None
+
+    key = _get_filter_key(config)
+
+    with _FILTERS_LOCK:
+        file_id_filter = _FILTERS.get(key)
+        if file_id_filter is None:
+            file_id_filter = FileIdFilter(config)
+            _FILTERS[key] = file_id_filter
+
+    return file_id_filter
+
+
+def add_known_file_ids(file_ids: Iterable[str], config: Config = CONFIG) -> None:
+    """
+    Add the file IDs to the filter of the current process, if the process uses one.
+    """
+
+    file_id_filter = _FILTERS.get(_get_filter_key(config))
+    if file_id_filter is not None:
+        file_id_filter.add(file_ids)
+
+
+def _count_lookup(file_id: str, may_exist: Optional[bool]) -> None:
+    """
+    Count the lookup in the filter and raise a DrsObjectNotFoundError if the object
+    is absent.
+    """
+
+    FILE_ID_FILTER_LOOKUPS.labels(
+        result={None: "unavailable", True: "maybe_present", False: "absent"}[may_exist]
+    ).inc()
+
+    if may_exist is False:
+        raise DrsObjectNotFoundError(file_id=file_id)
+
+
+def check_file_id_known(file_id: str, config: Config = CONFIG) -> None:
+    """
+    Raises a DrsObjectNotFoundError if the filter of known file IDs tells that no
+    object with the file ID exists, even after receiving all notifications of
+    changes that were sent before.
+    """
+
+    file_id_filter = get_file_id_filter(config)
+    if file_id_filter is None:
+        return
+
+    may_exist = file_id_filter.may_exist(file_id)
+    if may_exist is False:
+        may_exist = file_id_filter.may_exist_after_sync(file_id)
+
+    _count_lookup(file_id, may_exist)
+
+
+async def check_file_id_known_async(file_id: str, config: Config = CONFIG) -> None:
+    """
+    Same as `check_file_id_known` but waits for the notifications in a thread, so
+    that the event loop is not blocked.
+    """
+
+    file_id_filter = get_file_id_filter(config)
+    if file_id_filter is None:
+        return
+
+    may_exist = file_id_filter.may_exist(file_id)
+    if may_exist is False:
+        may_exist = await asyncio.to_thread(
+            file_id_filter.may_exist_after_sync, file_id
+        )
+
+    _count_lookup(file_id, may_exist)
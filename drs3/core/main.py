@@ -15,65 +15,695 @@
 
 """Main business-logic of this service"""
 
-from typing import Any, Callable, Dict, Optional
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from ..config import CONFIG, Config
-from ..dao import Database, DrsObjectNotFoundError, ObjectNotFoundError, ObjectStorage
+from ..dao import (
+    Database,
+    DrsObjectNotFoundError,
+    ObjectNotFoundError,
+    ObjectStorage,
+    get_change_listener,
+)
+from ..dao.db_models import DRS_OBJECT_CHANGES_CHANNEL
+from ..metrics import (
+    COALESCED_LOOKUPS,
+    DB_LOOKUP,
+    OUTBOX_CHECK,
+    PRESTAGE_REQUESTS,
+    STAGE_REQUEST_PUBLISHING,
+    URL_SIGNING,
+    time_stage,
+)
 from ..models import (
     AccessMethod,
     AccessURL,
+    BulkDrsObjectsServe,
+    BulkSummary,
     Checksum,
     DrsObjectInitial,
-    DrsObjectInternal,
+    DrsObjectRecord,
     DrsObjectServe,
+    DrsObjectUpdate,
+    UnresolvedDrsObjects,
 )
+from .access_tracker import track_accesses
+from .cache import TtlCache, get_cache
+from .known_file_ids import add_known_file_ids, check_file_id_known
+from .metadata_cache import get_drs_object_cached
+from .retry_after import record_staging_latency
+from .single_flight import get_single_flight
+
+ResultType = TypeVar("ResultType")
+
+
+def _format_created_time(registration_date: datetime) -> str:
+    """
+    Formats the registration date as RFC3339 timestamp. Naive dates, as stored in
+    the database, are interpreted as UTC.
+    """
+
+    if registration_date.tzinfo is None:
+        registration_date = registration_date.replace(tzinfo=timezone.utc)
+
+    return registration_date.isoformat()
+
+
+class AccessIdNotFoundError(RuntimeError):
+    """Thrown when requesting an access method of a DrsObject with an access ID
+    that doesn't exist."""
+
+    def __init__(self, access_id: str):
+        message = f"The access method with access ID '{access_id}' does not exist."
+        super().__init__(message)
+
+
+# the ID of the only access method, which is used if access URLs are not included
+# in the DrsObjects but minted on demand:
+S3_ACCESS_ID = "s3"
+
+
+def _get_drs_object_serve(
+    db_object_info: DrsObjectRecord, download_url: Optional[str], config: Config
+) -> DrsObjectServe:
+    """
+    Builds the drs object for serving from the database info and the download url.
+    If no download url is provided, the access method refers to the access ID
+    instead.
+    """
+
+    access_method = (
+        AccessMethod(access_id=S3_ACCESS_ID, type="s3")
+        if download_url is None
+        else AccessMethod(access_url=AccessURL(url=download_url), type="s3")
+    )
+
+    return DrsObjectServe(
+        id=db_object_info.file_id,
+        self_uri=f"{config.drs_self_url}/{db_object_info.file_id}",
+        size=db_object_info.size,
+        created_time=_format_created_time(db_object_info.registration_date),
+        checksums=[Checksum(checksum=db_object_info.md5_checksum, type="md5")],
+        access_methods=[access_method],
+    )
+
+
+def get_download_url_cache(config: Config = CONFIG) -> TtlCache[str, str]:
+    """
+    Get the process-wide cache of presigned download urls keyed by file ID.
+    """
+
+    return get_cache(
+        "download_urls",
+        max_size=config.download_url_cache_max_size,
+        ttl=config.download_url_cache_ttl,
+    )
+
+
+def get_outbox_cache(config: Config = CONFIG) -> TtlCache[str, bool]:
+    """
+    Get the process-wide cache of outbox existence check results keyed by file ID.
+    """
+
+    return get_cache(
+        "outbox",
+        max_size=config.outbox_cache_max_size,
+        ttl=config.outbox_cache_positive_ttl,
+    )
+
+
+def remember_outbox_state(drs_id: str, in_outbox: bool, config: Config = CONFIG):
+    """
+    Caches whether the object with the specified ID exists in the outbox.
+    If it doesn't, cached download urls are dropped as well.
+    """
+
+    get_outbox_cache(config).set(
+        drs_id,
+        in_outbox,
+        ttl=(
+            config.outbox_cache_positive_ttl
+            if in_outbox
+            else config.outbox_cache_negative_ttl
+        ),
+    )
+
+    if not in_outbox:
+        get_download_url_cache(config).invalidate(drs_id)
+
+
+def forget_outbox_state(drs_id: str, config: Config = CONFIG):
+    """
+    Drops all cached information on the outbox state of the object with the
+    specified ID, e.g. because it has been removed from the outbox. This happens in
+    every process once the database notifies that the object left the outbox (see
+    `_watch_outbox_changes`).
+    """
+
+    get_outbox_cache(config).invalidate(drs_id)
+    get_download_url_cache(config).invalidate(drs_id)
+
+
+def _watch_outbox_changes(config: Config = CONFIG):
+    """
+    Makes sure that the cached outbox state of objects is forgotten as soon as the
+    database notifies that they left the outbox (e.g. because they were evicted),
+    no matter which process recorded it. If notifications may have been missed,
+    the cached outbox states of all objects are forgotten.
+    """
+
+    def forget_unstaged(payload: str):
+        change = json.loads(payload)
+        if change.get("unstaged"):
+            forget_outbox_state(change["file_id"], config)
+
+    def forget_all():
+        get_outbox_cache(config).clear()
+        get_download_url_cache(config).clear()
+
+    listener = get_change_listener(DRS_OBJECT_CHANGES_CHANNEL, config=config)
+    listener.subscribe("outbox_cache", on_notify=forget_unstaged, on_reset=forget_all)
+
+
+def _is_in_outbox(storage: ObjectStorage, drs_id: str, config: Config) -> bool:
+    """
+    Checks whether the object with the specified ID exists in the outbox, using the
+    cached result of a previous check if available.
+    """
+
+    _watch_outbox_changes(config)
+    in_outbox = get_outbox_cache(config).get(drs_id)
+
+    if in_outbox is None:
+        with time_stage(OUTBOX_CHECK):
+            in_outbox = storage.does_object_exist(config.s3_outbox_bucket_id, drs_id)
+        remember_outbox_state(drs_id, in_outbox, config)
+
+    return in_outbox
+
+
+def _needs_outbox_check(db_object_info: DrsObjectRecord, config: Config) -> bool:
+    """
+    Decides whether the outbox state of the object recorded in the database has to
+    be verified by checking the outbox. This is the case for staged objects whose
+    presence in the outbox was last verified more than `outbox_verify_interval`
+    seconds ago and for objects that have neither been staged nor requested to be
+    staged, e.g. because they were staged before the outbox state was recorded.
+    """
+
+    if db_object_info.staged_at is None:
+        return db_object_info.stage_requested_at is None
+
+    last_verified_at = db_object_info.last_verified_at
+
+    # the time of the last verification is recorded with time zone, so that it can
+    # be compared to the current time no matter the time zone of the database:
+    return (
+        last_verified_at is None
+        or (datetime.now(timezone.utc) - last_verified_at).total_seconds()
+        >= config.outbox_verify_interval
+    )
+
+
+def _is_staged(
+    storage: ObjectStorage, db_object_info: DrsObjectRecord, config: Config
+) -> bool:
+    """
+    Decides whether the object exists in the outbox based on the outbox state
+    recorded in the database, which is kept up to date when objects are staged.
+    The outbox is only checked if needed (see `_needs_outbox_check`), in which case
+    the result is recorded.
+    """
+
+    if not _needs_outbox_check(db_object_info, config):
+        return db_object_info.staged_at is not None
+
+    drs_id = db_object_info.file_id
+    in_outbox = _is_in_outbox(storage, drs_id, config)
+
+    # objects that are neither staged nor in the outbox are recorded once staging
+    # is requested (recording the result invalidates the cached metadata):
+    if in_outbox or db_object_info.staged_at is not None:
+        with Database(config=config) as database:
+            database.record_outbox_verification(drs_id, in_outbox=in_outbox)
+
+    return in_outbox
+
+
+def _are_staged(
+    storage: ObjectStorage, db_object_infos: List[DrsObjectRecord], config: Config
+) -> List[bool]:
+    """
+    Same as `_is_staged` but for multiple objects at once. The outbox is checked for
+    up to `bulk_outbox_check_concurrency` objects concurrently, while the results
+    are recorded in a single transaction afterwards, so that only one database
+    connection is used no matter how many objects are checked concurrently.
+    """
+
+    to_be_checked = [
+        db_object_info
+        for db_object_info in db_object_infos
+        if _needs_outbox_check(db_object_info, config)
+    ]
+
+    with ThreadPoolExecutor(
+        max_workers=config.bulk_outbox_check_concurrency
+    ) as executor:
+        checked = dict(
+            zip(
+                [db_object_info.file_id for db_object_info in to_be_checked],
+                executor.map(
+                    lambda info: _is_in_outbox(storage, info.file_id, config),
+                    to_be_checked,
+                ),
+            )
+        )
+
+    # see `_is_staged`:
+    to_be_recorded = [
+        db_object_info
+        for db_object_info in to_be_checked
+        if checked[db_object_info.file_id] or db_object_info.staged_at is not None
+    ]
+    if to_be_recorded:
+        with Database(config=config) as database:
+            for db_object_info in to_be_recorded:
+                database.record_outbox_verification(
+                    db_object_info.file_id, in_outbox=checked[db_object_info.file_id]
+                )
+
+    return [
+        checked.get(db_object_info.file_id, db_object_info.staged_at is not None)
+        for db_object_info in db_object_infos
+    ]
+
+
+def _sign_download_url(storage: ObjectStorage, drs_id: str, config: Config) -> str:
+    """
+    Creates a presigned download url for an object that is known to exist in the
+    outbox, or reuses a cached one.
+    """
+
+    cache = get_download_url_cache(config)
+
+    download_url = cache.get(drs_id)
+    if download_url is None:
+        with time_stage(URL_SIGNING):
+            download_url = storage.sign_object_download_url(
+                config.s3_outbox_bucket_id,
+                drs_id,
+                expires_after=config.download_url_expires_after,
+            )
+        cache.set(drs_id, download_url)
+
+    return download_url
+
+
+def _request_staging(
+    db_object_info: DrsObjectRecord,
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+    config: Config,
+):
+    """
+    Makes a stage request for the object, unless one has been made recently.
+    """
+
+    dedup_window = max(config.stage_request_dedup_window, 0)
+
+    # The stage request is made within the transaction, so that the claim is
+    # rolled back if the request can't be queued for publishing. Since publishing
+    # happens in the background, a request that is rejected by the broker later on
+    # keeps its claim and is only made again after the deduplication window. If
+    # the deduplication is disabled, staging is requested anyway, the claim only
+    # records when that happened:
+    with Database(config=config) as database:
+        if (
+            database.claim_stage_requests([db_object_info.file_id], window=dedup_window)
+            or dedup_window == 0
+        ):
+            with time_stage(STAGE_REQUEST_PUBLISHING):
+                make_stage_request(db_object_info, config)
+
+
+def get_prestaged_groups_cache(config: Config = CONFIG) -> TtlCache[str, bool]:
+    """
+    Get the process-wide cache of the grouping labels whose siblings have been
+    prestaged recently.
+    """
+
+    return get_cache(
+        "prestaged_groups",
+        max_size=config.prestage_group_cache_max_size,
+        ttl=config.prestage_group_interval,
+    )
+
+
+def _should_prestage_siblings(db_object_info: DrsObjectRecord, config: Config) -> bool:
+    """
+    Decides whether the siblings of the object should be prestaged, i.e. whether
+    prestaging is enabled, the object belongs to a group, and the siblings of the
+    group have not been prestaged by this process recently. If so, the group is
+    remembered as prestaged.
+    """
+
+    grouping_label = db_object_info.grouping_label
+    if config.prestage_max_siblings <= 0 or grouping_label is None:
+        return False
+
+    cache = get_prestaged_groups_cache(config)
+    if cache.get(grouping_label) is not None:
+        return False
+    cache.set(grouping_label, True)
+
+    return True
+
+
+def _prestage_siblings(
+    db_object_infos: List[DrsObjectRecord],
+    make_stage_requests: Callable[[List[DrsObjectRecord], Config], None],
+    config: Config,
+):
+    """
+    Makes stage requests for the siblings of the objects, i.e. the objects with the
+    same grouping label, since they are likely to be requested soon (see
+    `prestage_max_siblings`). The siblings are claimed once per group, after the
+    objects themselves have been claimed, so that these are not among them.
+    Failing to do so does not affect the request of the objects themselves.
+    """
+
+    for db_object_info in db_object_infos:
+        if not _should_prestage_siblings(db_object_info, config):
+            continue
+
+        try:
+            # The stage requests are made within the transaction, so that the
+            # claims are rolled back if they can't be queued for publishing (see
+            # `_request_staging`):
+            with Database(config=config) as database:
+                siblings = database.claim_sibling_stage_requests(
+                    db_object_info.file_id,
+                    limit=config.prestage_max_siblings,
+                    window=config.stage_request_dedup_window,
+                )
+                make_stage_requests(siblings, config)
+        except Exception as error:  # pylint: disable=broad-except
+            PRESTAGE_REQUESTS.labels(outcome="failure").inc()
+            logging.warning("Could not prestage the siblings of an object: %s", error)
+        else:
+            PRESTAGE_REQUESTS.labels(outcome="success").inc(len(siblings))
+
+
+def _make_each(
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+) -> Callable[[List[DrsObjectRecord], Config], None]:
+    """
+    Adapts a function making the stage request for one object to make the stage
+    requests for a list of objects, one at a time.
+    """
+
+    def make_stage_requests(db_object_infos: List[DrsObjectRecord], config: Config):
+        for db_object_info in db_object_infos:
+            make_stage_request(db_object_info, config)
+
+    return make_stage_requests
+
+
+def _request_stagings(
+    db_object_infos: List[DrsObjectRecord],
+    make_stage_requests: Callable[[List[DrsObjectRecord], Config], None],
+    config: Config,
+):
+    """
+    Makes stage requests for all objects at once, except for the ones that have
+    been requested recently.
+    """
+
+    if not db_object_infos:
+        return
+
+    dedup_window = max(config.stage_request_dedup_window, 0)
+
+    # see `_request_staging`:
+    with Database(config=config) as database:
+        claimed_file_ids = set(
+            database.claim_stage_requests(
+                [db_object_info.file_id for db_object_info in db_object_infos],
+                window=dedup_window,
+            )
+        )
+        with time_stage(STAGE_REQUEST_PUBLISHING):
+            make_stage_requests(
+                [
+                    db_object_info
+                    for db_object_info in db_object_infos
+                    if db_object_info.file_id in claimed_file_ids or dedup_window == 0
+                ],
+                config,
+            )
+
+
+def _get_download_url(
+    db_object_info: DrsObjectRecord,
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+    config: Config,
+) -> Optional[str]:
+    """
+    Creates a presigned download url, if the object exists in the outbox.
+    Otherwise, a stage request is made and None is returned.
+    """
+
+    drs_id = db_object_info.file_id
+
+    with ObjectStorage(config=config) as storage:
+
+        if _is_staged(storage, db_object_info, config):
+
+            # create presigned url
+            return _sign_download_url(storage, drs_id, config)
+
+    # If the object does not exist, make a stage request, and for its siblings
+    _request_staging(db_object_info, make_stage_request, config)
+    _prestage_siblings([db_object_info], _make_each(make_stage_request), config)
+
+    return None
+
+
+def _coalesce(
+    key: Tuple[str, ...], drs_id: str, lookup: Callable[[], ResultType], config: Config
+) -> ResultType:
+    """
+    Performs the lookup concerning the object with the specified ID, unless a lookup
+    with the same key is already in flight, in which case its result is shared
+    (see `single_flight_mode`). The first element of the key denotes the kind of the
+    lookup.
+    """
+
+    if config.single_flight_mode == "off":
+        return lookup()
+
+    performed = False
+
+    def perform_lookup() -> ResultType:
+        nonlocal performed
+        performed = True
+
+        if config.single_flight_mode != "database":
+            return lookup()
+
+        # wait for lookups of the object in other processes to finish:
+        with Database(config=config) as database:
+            database.lock_drs_object(drs_id)
+            return lookup()
+
+    try:
+        return get_single_flight("lookups").do(key, perform_lookup)
+    finally:
+        if not performed:
+            COALESCED_LOOKUPS.labels(kind=key[0]).inc()
+
+
+def _get_db_object_info(drs_id: str, config: Config) -> DrsObjectRecord:
+    """
+    Gets the info on a drs object from the metadata cache or from the database.
+    """
+
+    def load() -> DrsObjectRecord:
+        with time_stage(DB_LOOKUP), Database(config=config) as database:
+            return database.get_drs_object(drs_id)
+
+    return get_drs_object_cached(drs_id, load, config)
 
 
 def get_drs_object_serve(
     drs_id: str,
-    make_stage_request: Callable[[DrsObjectInternal, Config], None],
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
     config: Config = CONFIG,
+    inline_access_url: bool = True,
 ) -> Optional[DrsObjectServe]:
     """
-    Gets the drs object for serving, if it exists in the outbox
+    Gets the drs object for serving, if it exists in the outbox.
+    If `inline_access_url` is set to False, the drs object only refers to the access
+    ID of its access method, so that neither the outbox has to be checked nor a
+    download url has to be signed. The access url may then be obtained using
+    `get_drs_object_access_url`.
+    Concurrent calls for the same object are coalesced.
     """
 
-    with Database(config=config) as database:
-        try:
-            db_object_info = database.get_drs_object(drs_id)
-        except DrsObjectNotFoundError:  # pylint: disable=try-except-raise
-            raise
+    check_file_id_known(drs_id, config)
+
+    drs_object = _coalesce(
+        ("serve", drs_id, str(inline_access_url)),
+        drs_id,
+        lambda: _lookup_drs_object_serve(
+            drs_id, make_stage_request, config, inline_access_url
+        ),
+        config,
+    )
+    track_accesses([drs_id], config)
+
+    return drs_object
+
+
+def _lookup_drs_object_serve(
+    drs_id: str,
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+    config: Config,
+    inline_access_url: bool,
+) -> Optional[DrsObjectServe]:
+    """Performs the lookup for `get_drs_object_serve`."""
+
+    db_object_info = _get_db_object_info(drs_id, config)
+
+    if not inline_access_url:
+        return _get_drs_object_serve(db_object_info, None, config)
 
     # If object exists in Database, see if it exists in outbox
+    download_url = _get_download_url(db_object_info, make_stage_request, config)
 
-    bucket_id = config.s3_outbox_bucket_id
+    if download_url is None:
+        return None
 
-    with ObjectStorage(config=config) as storage:
+    # return DRS Object
+    return _get_drs_object_serve(db_object_info, download_url, config)
 
-        if storage.does_object_exist(bucket_id, drs_id):
 
-            # create presigned url
-            download_url = storage.get_object_download_url(bucket_id, drs_id)
-
-            # return DRS Object
-            return DrsObjectServe(
-                file_id=drs_id,
-                self_uri=f"{config.drs_self_url}/{drs_id}",
-                size=db_object_info.size,
-                created_time=db_object_info.registration_date.isoformat(),
-                checksums=[Checksum(checksum=db_object_info.md5_checksum, type="md5")],
-                access_methods=[
-                    AccessMethod(access_url=AccessURL(url=download_url), type="s3")
-                ],
-            )
+def get_drs_object_access_url(
+    drs_id: str,
+    access_id: str,
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+    config: Config = CONFIG,
+) -> Optional[AccessURL]:
+    """
+    Gets the access url for the access method with the specified ID of a drs object,
+    if it exists in the outbox. Otherwise, a stage request is made and None is
+    returned.
+    Concurrent calls for the same object are coalesced.
+    """
 
-    # If the object does not exist, make a stage request
-    make_stage_request(
-        db_object_info,
+    if access_id != S3_ACCESS_ID:
+        raise AccessIdNotFoundError(access_id=access_id)
+
+    check_file_id_known(drs_id, config)
+
+    access_url = _coalesce(
+        ("access", drs_id),
+        drs_id,
+        lambda: _lookup_drs_object_access_url(drs_id, make_stage_request, config),
         config,
     )
+    track_accesses([drs_id], config)
 
-    return None
+    return access_url
+
+
+def _lookup_drs_object_access_url(
+    drs_id: str,
+    make_stage_request: Callable[[DrsObjectRecord, Config], None],
+    config: Config,
+) -> Optional[AccessURL]:
+    """Performs the lookup for `get_drs_object_access_url`."""
+
+    db_object_info = _get_db_object_info(drs_id, config)
+
+    download_url = _get_download_url(db_object_info, make_stage_request, config)
+
+    return None if download_url is None else AccessURL(url=download_url)
+
+
+def get_drs_objects_serve(
+    drs_ids: List[str],
+    make_stage_requests: Callable[[List[DrsObjectRecord], Config], None],
+    config: Config = CONFIG,
+    inline_access_url: bool = True,
+) -> BulkDrsObjectsServe:
+    """
+    Resolves multiple drs objects at once. Objects that exist in the outbox are
+    served, for objects that are registered but not yet in the outbox, stage
+    requests are made in one batch. Objects that are not registered are reported
+    as unresolved.
+    If `inline_access_url` is set to False, all registered objects are served
+    referring to the access ID of their access method without checking the outbox
+    (see `get_drs_object_serve`).
+    """
+
+    # remove duplicates but preserve the order:
+    unique_drs_ids = list(dict.fromkeys(drs_ids))
+
+    with time_stage(DB_LOOKUP), Database(config=config) as database:
+        lookup = database.get_drs_objects(unique_drs_ids)
+
+    not_found_ids = lookup.missing_file_ids
+    ordered_infos = lookup.found
+    track_accesses([info.file_id for info in ordered_infos], config)
+
+    resolved: List[DrsObjectServe] = []
+    to_be_staged: List[DrsObjectRecord] = []
+
+    if not inline_access_url:
+        resolved = [
+            _get_drs_object_serve(db_object_info, None, config)
+            for db_object_info in ordered_infos
+        ]
+        ordered_infos = []
+
+    with ObjectStorage(config=config) as storage:
+
+        in_outbox = _are_staged(storage, ordered_infos, config)
+
+        for db_object_info, exists in zip(ordered_infos, in_outbox):
+            if not exists:
+                to_be_staged.append(db_object_info)
+                continue
+
+            download_url = _sign_download_url(storage, db_object_info.file_id, config)
+            resolved.append(_get_drs_object_serve(db_object_info, download_url, config))
+
+    # make stage requests for all objects that are not in the outbox at once:
+    _request_stagings(to_be_staged, make_stage_requests, config)
+    _prestage_siblings(to_be_staged, make_stage_requests, config)
+
+    unresolved = [
+        UnresolvedDrsObjects(error_code=error_code, object_ids=object_ids)
+        for error_code, object_ids in (
+            (202, [info.file_id for info in to_be_staged]),
+            (404, not_found_ids),
+        )
+        if object_ids
+    ]
+
+    return BulkDrsObjectsServe(
+        summary=BulkSummary(
+            requested=len(unique_drs_ids),
+            resolved=len(resolved),
+            unresolved=len(to_be_staged) + len(not_found_ids),
+        ),
+        resolved_drs_object=resolved,
+        unresolved_drs_objects=unresolved,
+    )
 
 
 def handle_registered_file(
@@ -90,10 +720,38 @@ def handle_registered_file(
     with Database(config=config) as database:
         database.register_drs_object(drs_object)
 
+    # the file ID is known from now on, even before the database notifies about it:
+    add_known_file_ids([drs_object.file_id], config)
+
     # publish message that the drs file has been registered
     publish_object_registered(drs_object, config)
 
 
+def handle_registered_files(
+    drs_objects: List[DrsObjectInitial],
+    publish_objects_registered: Callable[[List[DrsObjectInitial], Config], None],
+    config: Config = CONFIG,
+):
+    """
+    Add new entries for multiple processed messages to the database within one
+    transaction and then publish messages that we did so.
+    Objects that already exist are skipped, however, the messages are published for
+    all of them, so that publishing is completed if the messages are processed
+    again after a failure.
+    """
+
+    # write all file entries to the database at once
+    with Database(config=config) as database:
+        database.register_drs_objects(drs_objects)
+
+    # the file IDs are known from now on, even before the database notifies about
+    # them:
+    add_known_file_ids([drs_object.file_id for drs_object in drs_objects], config)
+
+    # publish messages that the drs files have been registered
+    publish_objects_registered(drs_objects, config)
+
+
 def handle_staged_file(message: Dict[str, Any], config: Config = CONFIG):
     """
     Check if the file really is in the outbox,
@@ -104,22 +762,39 @@ def handle_staged_file(message: Dict[str, Any], config: Config = CONFIG):
     file_id = message["file_id"]
     md5_checksum = message["md5_checksum"]
 
-    # Check if file exists in database
+    # Check if file is in outbox, the size of the file is only known once it is:
+    with ObjectStorage(config=config) as storage:
+        size = storage.get_object_size(config.s3_outbox_bucket_id, file_id)
+    in_outbox = size is not None
+
     with Database(config=config) as database:
-        db_object_info = database.get_drs_object(file_id)
+        # Update information, in case something has changed, and record the size.
+        # This also checks whether the file exists in the database and is rolled
+        # back if the file turns out not to be in the outbox:
+        updated = database.update_drs_objects(
+            [DrsObjectUpdate(file_id=file_id, md5_checksum=md5_checksum, size=size)]
+        )
+        if not updated:
+            raise DrsObjectNotFoundError(file_id=file_id)
 
-        # Check if file is in outbox
-        with ObjectStorage(config=config) as storage:
-            if storage.does_object_exist(config.s3_outbox_bucket_id, file_id):
+        remember_outbox_state(file_id, in_outbox, config)
 
-                db_object_info.md5_checksum = md5_checksum
+        if in_outbox:
 
-                # Update information, in case something has changed
-                database.update_drs_object(file_id=file_id, drs_object=db_object_info)
-                return
+            # the stage request is fulfilled:
+            latency = database.clear_stage_request(file_id)
+            if latency is not None:
+                record_staging_latency(
+                    database,
+                    file_id=file_id,
+                    size=size,
+                    latency=latency,
+                    config=config,
+                )
+            return
 
-            # Throw error, if the file does not exist in the outbox
-            raise ObjectNotFoundError(
-                object_id=file_id,
-                bucket_id=config.s3_outbox_bucket_id,
-            )
+        # Throw error, if the file does not exist in the outbox
+        raise ObjectNotFoundError(
+            object_id=file_id,
+            bucket_id=config.s3_outbox_bucket_id,
+        )
@@ -0,0 +1,437 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Business-logic for serving DrsObjects from within coroutines, mirroring the
+corresponding functions of the main module. Requires the `asgi` extra.
+"""
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple, TypeVar
+
+from ..config import CONFIG, Config
+from ..dao import AsyncPostgresDatabase
+from ..dao.s3_async import AsyncObjectStorageS3
+from ..metrics import (
+    COALESCED_LOOKUPS,
+    DB_LOOKUP,
+    OUTBOX_CHECK,
+    PRESTAGE_REQUESTS,
+    STAGE_REQUEST_PUBLISHING,
+    time_stage,
+)
+from ..models import (
+    AccessURL,
+    BulkDrsObjectsServe,
+    BulkSummary,
+    DrsObjectRecord,
+    DrsObjectServe,
+    UnresolvedDrsObjects,
+)
+from .access_tracker import track_accesses
+from .known_file_ids import check_file_id_known_async
+from .main import (
+    S3_ACCESS_ID,
+    AccessIdNotFoundError,
+    _get_drs_object_serve,
+    _needs_outbox_check,
+    _should_prestage_siblings,
+    _sign_download_url,
+    _watch_outbox_changes,
+    get_outbox_cache,
+    remember_outbox_state,
+)
+from .metadata_cache import get_drs_object_cached_async
+from .single_flight import get_async_single_flight
+
+AsyncStageRequester = Callable[[List[DrsObjectRecord], Config], Awaitable[None]]
+ResultType = TypeVar("ResultType")
+
+
+async def _coalesce(
+    key: Tuple[str, ...],
+    drs_id: str,
+    lookup: Callable[[], Awaitable[ResultType]],
+    config: Config,
+) -> ResultType:
+    """
+    Same as `_coalesce` of the main module but for use in coroutines.
+    """
+
+    if config.single_flight_mode == "off":
+        return await lookup()
+
+    performed = False
+
+    async def perform_lookup() -> ResultType:
+        nonlocal performed
+        performed = True
+
+        if config.single_flight_mode != "database":
+            return await lookup()
+
+        # wait for lookups of the object in other processes to finish:
+        async with AsyncPostgresDatabase(config=config) as database:
+            await database.lock_drs_object(drs_id)
+            return await lookup()
+
+    try:
+        return await get_async_single_flight("lookups").do(key, perform_lookup)
+    finally:
+        if not performed:
+            COALESCED_LOOKUPS.labels(kind=key[0]).inc()
+
+
+async def _is_in_outbox(
+    storage: AsyncObjectStorageS3, drs_id: str, config: Config
+) -> bool:
+    """
+    Checks whether the object with the specified ID exists in the outbox, using the
+    cached result of a previous check if available.
+    """
+
+    _watch_outbox_changes(config)
+    in_outbox = get_outbox_cache(config).get(drs_id)
+
+    if in_outbox is None:
+        with time_stage(OUTBOX_CHECK):
+            in_outbox = await storage.does_object_exist(
+                config.s3_outbox_bucket_id, drs_id
+            )
+        remember_outbox_state(drs_id, in_outbox, config)
+
+    return in_outbox
+
+
+async def _is_staged(
+    storage: AsyncObjectStorageS3, db_object_info: DrsObjectRecord, config: Config
+) -> bool:
+    """
+    Same as `_is_staged` of the main module but for use in coroutines.
+    """
+
+    if not _needs_outbox_check(db_object_info, config):
+        return db_object_info.staged_at is not None
+
+    drs_id = db_object_info.file_id
+    in_outbox = await _is_in_outbox(storage, drs_id, config)
+
+    if in_outbox or db_object_info.staged_at is not None:
+        async with AsyncPostgresDatabase(config=config) as database:
+            await database.record_outbox_verification(drs_id, in_outbox=in_outbox)
+
+    return in_outbox
+
+
+async def _are_staged(
+    storage: AsyncObjectStorageS3,
+    db_object_infos: List[DrsObjectRecord],
+    config: Config,
+) -> List[bool]:
+    """
+    Same as `_are_staged` of the main module but for use in coroutines.
+    """
+
+    to_be_checked = [
+        db_object_info
+        for db_object_info in db_object_infos
+        if _needs_outbox_check(db_object_info, config)
+    ]
+
+    semaphore = asyncio.Semaphore(config.bulk_outbox_check_concurrency)
+
+    async def is_in_outbox(db_object_info: DrsObjectRecord) -> bool:
+        async with semaphore:
+            return await _is_in_outbox(storage, db_object_info.file_id, config)
+
+    checked = dict(
+        zip(
+            [db_object_info.file_id for db_object_info in to_be_checked],
+            await asyncio.gather(*(is_in_outbox(info) for info in to_be_checked)),
+        )
+    )
+
+    # see `_is_staged` of the main module:
+    to_be_recorded = [
+        db_object_info
+        for db_object_info in to_be_checked
+        if checked[db_object_info.file_id] or db_object_info.staged_at is not None
+    ]
+    if to_be_recorded:
+        async with AsyncPostgresDatabase(config=config) as database:
+            for db_object_info in to_be_recorded:
+                await database.record_outbox_verification(
+                    db_object_info.file_id, in_outbox=checked[db_object_info.file_id]
+                )
+
+    return [
+        checked.get(db_object_info.file_id, db_object_info.staged_at is not None)
+        for db_object_info in db_object_infos
+    ]
+
+
+async def _request_stagings(
+    db_object_infos: List[DrsObjectRecord],
+    make_stage_requests: AsyncStageRequester,
+    config: Config,
+):
+    """
+    Makes stage requests for all objects at once, except for the ones that have
+    been requested recently.
+    """
+
+    if not db_object_infos:
+        return
+
+    dedup_window = max(config.stage_request_dedup_window, 0)
+
+    # see `_request_staging` of the main module:
+    async with AsyncPostgresDatabase(config=config) as database:
+        claimed_file_ids = set(
+            await database.claim_stage_requests(
+                [db_object_info.file_id for db_object_info in db_object_infos],
+                window=dedup_window,
+            )
+        )
+        with time_stage(STAGE_REQUEST_PUBLISHING):
+            await make_stage_requests(
+                [
+                    db_object_info
+                    for db_object_info in db_object_infos
+                    if db_object_info.file_id in claimed_file_ids or dedup_window == 0
+                ],
+                config,
+            )
+
+
+async def _prestage_siblings(
+    db_object_infos: List[DrsObjectRecord],
+    make_stage_requests: AsyncStageRequester,
+    config: Config,
+):
+    """
+    Same as `_prestage_siblings` of the main module but for use in coroutines.
+    """
+
+    for db_object_info in db_object_infos:
+        if not _should_prestage_siblings(db_object_info, config):
+            continue
+
+        try:
+            async with AsyncPostgresDatabase(config=config) as database:
+                siblings = await database.claim_sibling_stage_requests(
+                    db_object_info.file_id,
+                    limit=config.prestage_max_siblings,
+                    window=config.stage_request_dedup_window,
+                )
+                await make_stage_requests(siblings, config)
+        except Exception as error:  # pylint: disable=broad-except
+            PRESTAGE_REQUESTS.labels(outcome="failure").inc()
+            logging.warning("Could not prestage the siblings of an object: %s", error)
+        else:
+            PRESTAGE_REQUESTS.labels(outcome="success").inc(len(siblings))
+
+
+async def _get_download_url(
+    db_object_info: DrsObjectRecord,
+    make_stage_requests: AsyncStageRequester,
+    config: Config,
+) -> Optional[str]:
+    """
+    Creates a presigned download url, if the object exists in the outbox.
+    Otherwise, a stage request is made and None is returned.
+    """
+
+    drs_id = db_object_info.file_id
+
+    async with AsyncObjectStorageS3(config=config) as storage:
+
+        if await _is_staged(storage, db_object_info, config):
+
+            # create presigned url
+            return _sign_download_url(storage, drs_id, config)
+
+    # If the object does not exist, make a stage request, and for its siblings
+    await _request_stagings([db_object_info], make_stage_requests, config)
+    await _prestage_siblings([db_object_info], make_stage_requests, config)
+
+    return None
+
+
+async def _get_db_object_info(drs_id: str, config: Config) -> DrsObjectRecord:
+    """Gets the info on a drs object from the metadata cache or from the database."""
+
+    async def load() -> DrsObjectRecord:
+        with time_stage(DB_LOOKUP):
+            async with AsyncPostgresDatabase(config=config) as database:
+                return await database.get_drs_object(drs_id)
+
+    return await get_drs_object_cached_async(drs_id, load, config)
+
+
+async def get_drs_object_serve_async(
+    drs_id: str,
+    make_stage_requests: AsyncStageRequester,
+    config: Config = CONFIG,
+    inline_access_url: bool = True,
+) -> Optional[DrsObjectServe]:
+    """
+    Same as `get_drs_object_serve` but for use in coroutines.
+    """
+
+    await check_file_id_known_async(drs_id, config)
+
+    drs_object = await _coalesce(
+        ("serve", drs_id, str(inline_access_url)),
+        drs_id,
+        lambda: _lookup_drs_object_serve(
+            drs_id, make_stage_requests, config, inline_access_url
+        ),
+        config,
+    )
+    track_accesses([drs_id], config)
+
+    return drs_object
+
+
+async def _lookup_drs_object_serve(
+    drs_id: str,
+    make_stage_requests: AsyncStageRequester,
+    config: Config,
+    inline_access_url: bool,
+) -> Optional[DrsObjectServe]:
+    """Performs the lookup for `get_drs_object_serve_async`."""
+
+    db_object_info = await _get_db_object_info(drs_id, config)
+
+    if not inline_access_url:
+        return _get_drs_object_serve(db_object_info, None, config)
+
+    # If object exists in Database, see if it exists in outbox
+    download_url = await _get_download_url(db_object_info, make_stage_requests, config)
+
+    if download_url is None:
+        return None
+
+    # return DRS Object
+    return _get_drs_object_serve(db_object_info, download_url, config)
+
+
+async def get_drs_object_access_url_async(
+    drs_id: str,
+    access_id: str,
+    make_stage_requests: AsyncStageRequester,
+    config: Config = CONFIG,
+) -> Optional[AccessURL]:
+    """
+    Same as `get_drs_object_access_url` but for use in coroutines.
+    """
+
+    if access_id != S3_ACCESS_ID:
+        raise AccessIdNotFoundError(access_id=access_id)
+
+    await check_file_id_known_async(drs_id, config)
+
+    access_url = await _coalesce(
+        ("access", drs_id),
+        drs_id,
+        lambda: _lookup_drs_object_access_url(drs_id, make_stage_requests, config),
+        config,
+    )
+    track_accesses([drs_id], config)
+
+    return access_url
+
+
+async def _lookup_drs_object_access_url(
+    drs_id: str,
+    make_stage_requests: AsyncStageRequester,
+    config: Config,
+) -> Optional[AccessURL]:
+    """Performs the lookup for `get_drs_object_access_url_async`."""
+
+    db_object_info = await _get_db_object_info(drs_id, config)
+
+    download_url = await _get_download_url(db_object_info, make_stage_requests, config)
+
+    return None if download_url is None else AccessURL(url=download_url)
+
+
+async def get_drs_objects_serve_async(
+    drs_ids: List[str],
+    make_stage_requests: AsyncStageRequester,
+    config: Config = CONFIG,
+    inline_access_url: bool = True,
+) -> BulkDrsObjectsServe:
+    """
+    Same as `get_drs_objects_serve` but for use in coroutines.
+    """
+
+    # remove duplicates but preserve the order:
+    unique_drs_ids = list(dict.fromkeys(drs_ids))
+
+    with time_stage(DB_LOOKUP):
+        async with AsyncPostgresDatabase(config=config) as database:
+            lookup = await database.get_drs_objects(unique_drs_ids)
+
+    not_found_ids = lookup.missing_file_ids
+    ordered_infos = lookup.found
+    track_accesses([info.file_id for info in ordered_infos], config)
+
+    resolved: List[DrsObjectServe] = []
+    to_be_staged: List[DrsObjectRecord] = []
+
+    if not inline_access_url:
+        resolved = [
+            _get_drs_object_serve(db_object_info, None, config)
+            for db_object_info in ordered_infos
+        ]
+        ordered_infos = []
+
+    async with AsyncObjectStorageS3(config=config) as storage:
+
+        in_outbox = await _are_staged(storage, ordered_infos, config)
+
+        for db_object_info, exists in zip(ordered_infos, in_outbox):
+            if not exists:
+                to_be_staged.append(db_object_info)
+                continue
+
+            download_url = _sign_download_url(storage, db_object_info.file_id, config)
+            resolved.append(_get_drs_object_serve(db_object_info, download_url, config))
+
+    # make stage requests for all objects that are not in the outbox at once:
+    await _request_stagings(to_be_staged, make_stage_requests, config)
+    await _prestage_siblings(to_be_staged, make_stage_requests, config)
+
+    unresolved = [
+        UnresolvedDrsObjects(error_code=error_code, object_ids=object_ids)
+        for error_code, object_ids in (
+            (202, [info.file_id for info in to_be_staged]),
+            (404, not_found_ids),
+        )
+        if object_ids
+    ]
+
+    return BulkDrsObjectsServe(
+        summary=BulkSummary(
+            requested=len(unique_drs_ids),
+            resolved=len(resolved),
+            unresolved=len(to_be_staged) + len(not_found_ids),
+        ),
+        resolved_drs_object=resolved,
+        unresolved_drs_objects=unresolved,
+    )
@@ -0,0 +1,152 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Caching of the metadata of DrsObjects in each process. Cached entries are
+invalidated when the database notifies about changes of the respective objects
+(see `DRS_OBJECT_CHANGES_CHANNEL`).
+"""
+
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+from ..config import CONFIG, Config
+from ..dao.db_models import DRS_OBJECT_CHANGES_CHANNEL
+from ..dao.listener import ChangeListener, get_change_listener
+from ..metrics import METADATA_CACHE_INVALIDATION_LAG, METADATA_CACHE_LOOKUPS
+from ..models import DrsObjectRecord
+from .cache import TtlCache, get_cache
+
+
+def get_metadata_cache(config: Config = CONFIG) -> TtlCache[str, DrsObjectRecord]:
+    """
+    Get the process-wide cache of DrsObject metadata keyed by file ID.
+    """
+
+    return get_cache(
+        "metadata",
+        max_size=config.metadata_cache_max_size,
+        ttl=config.metadata_cache_ttl,
+    )
+
+
+def _get_metadata_listener(config: Config) -> Optional[ChangeListener]:
+    """
+    Get the listener that invalidates the entries of the metadata cache or None if
+    caching is disabled. The listener is started on first use.
+    """
+
+    if config.metadata_cache_ttl <= 0 or config.metadata_cache_max_size <= 0:
+        return None
+
+    cache = get_metadata_cache(config)
+
+    def invalidate(payload: str):
+        change = json.loads(payload)
+        cache.invalidate(change["file_id"])
+        METADATA_CACHE_INVALIDATION_LAG.labels(
+            channel=DRS_OBJECT_CHANGES_CHANNEL
+        ).observe(max(time.time() - change["changed_at"], 0))
+
+    listener = get_change_listener(DRS_OBJECT_CHANGES_CHANNEL, config=config)
+    listener.subscribe("metadata_cache", on_notify=invalidate, on_reset=cache.clear)
+
+    return listener
+
+
+def _get_cached(
+    drs_id: str, listener: Optional[ChangeListener], config: Config
+) -> Optional[DrsObjectRecord]:
+    """
+    Get the cached metadata of the object or None if it has to be loaded. Cached
+    entries are only used while changes are received by the listener, since they
+    might be outdated otherwise.
+    """
+
+    if listener is None or not listener.listening:
+        return None
+
+    db_object_info = get_metadata_cache(config).get(drs_id)
+    METADATA_CACHE_LOOKUPS.labels(
+        result="miss" if db_object_info is None else "hit"
+    ).inc()
+
+    return db_object_info
+
+
+def _remember(
+    db_object_info: DrsObjectRecord,
+    listener: Optional[ChangeListener],
+    generation: int,
+    config: Config,
+):
+    """
+    Caches the loaded metadata of the object, unless a change may have been
+    notified since loading started (`generation` is the generation of the listener
+    before loading), in which case the loaded metadata might already be outdated.
+    No change is processed while caching, so that an invalidation can't happen
+    between checking the generation and caching.
+    """
+
+    if listener is None or not listener.listening:
+        return
+
+    cache = get_metadata_cache(config)
+    listener.run_if_unchanged(
+        generation, lambda: cache.set(db_object_info.file_id, db_object_info)
+    )
+
+
+def get_drs_object_cached(
+    drs_id: str, load: Callable[[], DrsObjectRecord], config: Config = CONFIG
+) -> DrsObjectRecord:
+    """
+    Get the metadata of the object with the specified ID from the cache or, on a
+    miss, using the `load` function, which raises a DrsObjectNotFoundError if the
+    object does not exist. Objects that don't exist are not cached.
+    """
+
+    listener = _get_metadata_listener(config)
+
+    db_object_info = _get_cached(drs_id, listener, config)
+    if db_object_info is not None:
+        return db_object_info
+
+    generation = -1 if listener is None else listener.generation
+    db_object_info = load()
+    _remember(db_object_info, listener, generation, config)
+
+    return db_object_info
+
+
+async def get_drs_object_cached_async(
+    drs_id: str, load: Callable[[], Awaitable[DrsObjectRecord]], config: Config = CONFIG
+) -> DrsObjectRecord:
+    """
+    Same as `get_drs_object_cached` but awaits the `load` function.
+    """
+
+    listener = _get_metadata_listener(config)
+
+    db_object_info = _get_cached(drs_id, listener, config)
+    if db_object_info is not None:
+        return db_object_info
+
+    generation = -1 if listener is None else listener.generation
+    db_object_info = await load()
+    _remember(db_object_info, listener, generation, config)
+
+    return db_object_info
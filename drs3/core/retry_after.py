@@ -0,0 +1,180 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Estimation of the time until a requested object arrives in the outbox"""
+
+import bisect
+from typing import List, Optional, Tuple
+
+from ..config import CONFIG, Config
+from ..dao import AsyncPostgresDatabase, Database
+from ..models import StageRequestState
+from .cache import TtlCache, get_cache
+
+
+def get_staging_stats_cache(
+    config: Config = CONFIG,
+) -> TtlCache[Tuple[str, Optional[int]], Tuple[Optional[float]]]:
+    """
+    Get the process-wide cache of staging statistics. The statistics are wrapped in
+    tuples, so that it can be cached that there are none.
+    """
+
+    return get_cache(
+        "staging_stats",
+        max_size=len(config.staging_latency_size_buckets) + 3,
+        ttl=config.staging_stats_ttl,
+    )
+
+
+def _get_size_bucket(size: Optional[int], config: Config) -> Optional[int]:
+    """
+    Get the index of the size bucket that an object of the given size falls in or
+    None if its size is not known.
+    """
+
+    if size is None:
+        return None
+
+    return bisect.bisect_right(config.staging_latency_size_buckets, size)
+
+
+def _get_latency_estimate(
+    database: Database, size_bucket: Optional[int], config: Config
+) -> Optional[float]:
+    """
+    Get the estimated staging latency in seconds for objects of the given size
+    bucket (or of any size if None) or None if no latencies have been observed.
+    """
+
+    cache = get_staging_stats_cache(config)
+    key = ("latency", size_bucket)
+
+    cached = cache.get(key)
+    if cached is None:
+        min_size = max_size = None
+        if size_bucket is not None:
+            bounds = [None, *config.staging_latency_size_buckets, None]
+            min_size, max_size = bounds[size_bucket], bounds[size_bucket + 1]
+
+        cached = (
+            database.get_staging_latency_quantile(
+                quantile=config.staging_latency_quantile,
+                sample_size=config.staging_latency_sample_size,
+                min_size=min_size,
+                max_size=max_size,
+            ),
+        )
+        cache.set(key, cached)
+
+    return cached[0]
+
+
+def _get_staging_rate(database: Database, config: Config) -> float:
+    """Get the number of objects staged per second."""
+
+    cache = get_staging_stats_cache(config)
+    key = ("rate", None)
+
+    cached = cache.get(key)
+    if cached is None:
+        cached = (
+            database.count_stagings(max_age=config.staging_rate_window)
+            / config.staging_rate_window,
+        )
+        cache.set(key, cached)
+
+    return cached[0]
+
+
+def _estimate_remaining_time(
+    database: Database, state: StageRequestState, config: Config
+) -> Optional[float]:
+    """
+    Estimate the seconds until the object arrives in the outbox. This is the larger
+    of the typical staging latency minus the time already waited and the time it
+    takes to work off the stage requests pending ahead at the observed throughput.
+    Returns None if no stagings have been observed.
+    """
+
+    latency = _get_latency_estimate(
+        database, _get_size_bucket(state.size, config), config
+    )
+    if latency is None:
+        return None
+
+    remaining = latency - state.elapsed
+
+    rate = _get_staging_rate(database, config)
+    if rate > 0:
+        remaining = max(remaining, state.queue_position / rate)
+
+    return remaining
+
+
+def _get_retry_after(database: Database, drs_ids: List[str], config: Config) -> int:
+    """Get the Retry-After for the specified objects (see `get_retry_after`)."""
+
+    states = database.get_stage_request_states(drs_ids)
+    estimates = [
+        estimate
+        for estimate in (
+            _estimate_remaining_time(database, state, config) for state in states
+        )
+        if estimate is not None
+    ]
+
+    if not estimates:
+        return config.retry_after_default
+
+    return int(min(max(min(estimates), config.retry_after_min), config.retry_after_max))
+
+
+def get_retry_after(drs_ids: List[str], config: Config = CONFIG) -> int:
+    """
+    Get the number of seconds after which a client should check again whether the
+    objects with the specified IDs arrived in the outbox. If multiple objects are
+    specified, the estimate for the first object to arrive is returned.
+    """
+
+    with Database(config=config) as database:
+        return _get_retry_after(database, drs_ids, config)
+
+
+async def get_retry_after_async(drs_ids: List[str], config: Config = CONFIG) -> int:
+    """
+    Same as `get_retry_after` but for use in coroutines.
+    """
+
+    async with AsyncPostgresDatabase(config=config) as database:
+        return await database.run_sync(
+            lambda sync_database: _get_retry_after(sync_database, drs_ids, config)
+        )
+
+
+def record_staging_latency(
+    database: Database,
+    file_id: str,
+    size: Optional[int],
+    latency: float,
+    config: Config = CONFIG,
+):
+    """
+    Record the observed staging latency and drop samples that are too old to be
+    considered anymore.
+    """
+
+    database.record_staging_latency(file_id=file_id, size=size, latency=latency)
+    database.prune_staging_latencies(max_age=config.staging_latency_retention)
@@ -0,0 +1,163 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Coalescing of concurrent calls with the same key"""
+
+import asyncio
+import threading
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+KeyType = TypeVar("KeyType", bound=Hashable)
+ValueType = TypeVar("ValueType")
+
+
+class _Call(Generic[ValueType]):
+    """A call in flight that others may wait for."""
+
+    def __init__(self):
+        """Initialize a call that has not finished yet."""
+
+        self.done = threading.Event()
+        self.result: Optional[ValueType] = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight(Generic[KeyType, ValueType]):
+    """
+    Makes sure that only one call per key is in flight at a time. Threads that make a
+    call while another one with the same key is in flight wait for it to finish and
+    share its result (or its exception) instead of making the call themselves.
+    """
+
+    def __init__(self):
+        """Initialize without calls in flight."""
+
+        self.shared = 0
+
+        self._calls: Dict[KeyType, _Call[ValueType]] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: KeyType, function: Callable[[], ValueType]) -> ValueType:
+        """Call the function, unless a call with the same key is in flight."""
+
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if call is None:
+                call = _Call()
+                self._calls[key] = call
+            else:
+                self.shared += 1
+
+        if not is_leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result  # type: ignore
+
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight(Generic[KeyType, ValueType]):
+    """
+    The counterpart of the SingleFlight for coroutines running in the same event
+    loop.
+    """
+
+    def __init__(self):
+        """Initialize without calls in flight."""
+
+        self.shared = 0
+
+        self._calls: Dict[KeyType, "asyncio.Future[ValueType]"] = {}
+
+    async def do(
+        self, key: KeyType, function: Callable[[], Awaitable[ValueType]]
+    ) -> ValueType:
+        """Await the function, unless a call with the same key is in flight."""
+
+        while key in self._calls:
+            call = self._calls[key]
+            self.shared += 1
+            try:
+                # the call must not be cancelled if this waiter is:
+                return await asyncio.shield(call)
+            except asyncio.CancelledError:
+                if not call.cancelled():
+                    raise
+                # the leader was cancelled, so another one has to take over
+
+        call = asyncio.get_running_loop().create_future()
+        self._calls[key] = call
+        try:
+            result = await function()
+        except Exception as error:
+            call.set_exception(error)
+            # the exception is raised to the leader, so don't warn if no one else
+            # retrieves it:
+            call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self._calls[key]
+            if not call.done():
+                call.cancel()
+
+
+_SINGLE_FLIGHTS: Dict[Tuple[Any, ...], Any] = {}
+_SINGLE_FLIGHTS_LOCK = threading.Lock()
+
+
+def get_single_flight(name: str) -> SingleFlight:
+    """
+    Get the process-wide single flight with the specified name. It is created on
+    first use and shared by all subsequent callers in the same process.
+    """
+
+    with _SINGLE_FLIGHTS_LOCK:
+        return _SINGLE_FLIGHTS.setdefault((name,), SingleFlight())
+
+
+def get_async_single_flight(name: str) -> AsyncSingleFlight:
+    """
+    Get the single flight with the specified name that is shared within the running
+    event loop. Must be called from within a coroutine.
+    """
+
+    key = (name, id(asyncio.get_running_loop()))
+
+    with _SINGLE_FLIGHTS_LOCK:
+        return _SINGLE_FLIGHTS.setdefault(key, AsyncSingleFlight())
@@ -21,7 +21,21 @@ from ghga_service_chassis_lib.object_storage_dao import (  # noqa: F401
     ObjectNotFoundError,
     ObjectStorageDao,
 )
-from ghga_service_chassis_lib.s3 import ObjectStorageS3 as ObjectStorage  # noqa: F401
 
-from .db import DrsObjectAlreadyExistsError, DrsObjectNotFoundError  # noqa: F401
+from .db import (  # noqa: F401
+    AsyncPostgresDatabase,
+    DrsObjectAlreadyExistsError,
+    DrsObjectNotFoundError,
+)
 from .db import PostgresDatabase as Database  # noqa: F401
+
+# isort: split
+from .db import (  # noqa: F401
+    dispose_async_postgresql_connectors,
+    dispose_postgresql_connectors,
+    get_async_postgresql_connector,
+    get_postgresql_connector,
+)
+from .listener import get_change_listener, stop_change_listeners  # noqa: F401
+from .s3 import PooledObjectStorageS3 as ObjectStorage  # noqa: F401
+from .s3 import dispose_s3_clients, get_s3_client  # noqa: F401
@@ -15,20 +15,57 @@
 
 """Database DAO"""
 
-from datetime import datetime
-from typing import Any, Optional
+import asyncio
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
 
 from ghga_service_chassis_lib.postgresql import (
-    PostgresqlConfigBase,
+    AsyncPostgresqlConnector,
+    PostgresqlConnectorBase,
     SyncPostgresqlConnector,
 )
-from ghga_service_chassis_lib.utils import DaoGenericBase
+from ghga_service_chassis_lib.utils import AsyncDaoGenericBase, DaoGenericBase
+from sqlalchemy import (
+    DateTime,
+    Integer,
+    String,
+    any_,
+    bindparam,
+    cast,
+    column,
+    create_engine,
+    delete,
+    func,
+    insert,
+    null,
+    or_,
+    update,
+    values,
+)
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.future import select
+from sqlalchemy.orm import Session, aliased, sessionmaker
 
 from .. import models
-from ..config import CONFIG
+from ..config import CONFIG, Config
 from . import db_models
 
+# maximum number of file IDs looked up per query:
+FILE_IDS_CHUNK_SIZE = 10000
+
+# the columns that are selected to create a DrsObjectRecord (in the order of its
+# constructor arguments), which is much cheaper than loading ORM instances and
+# validating them:
+DRS_OBJECT_RECORD_COLUMNS = tuple(
+    db_models.DrsObject.__table__.c[name] for name in models.DrsObjectRecord.__slots__
+)
+
 
 class DrsObjectNotFoundError(RuntimeError):
     """Thrown when trying to access a DrsObject with a file ID that doesn't
@@ -56,6 +93,188 @@ class DrsObjectAlreadyExistsError(RuntimeError):
         super().__init__(message)
 
 
+class PooledPostgresqlConnector(SyncPostgresqlConnector):
+    """
+    A SyncPostgresqlConnector whose engine maintains a connection pool that is
+    configured using the `db_pool_*` parameters of the provided config.
+    """
+
+    def __init__(self, config: Config):  # pylint: disable=super-init-not-called
+        """Initialize Connector.
+
+        Args:
+            config (Config): Configs including the DB url and pool parameters.
+        """
+        # the engine of the SyncPostgresqlConnector is replaced, thus,
+        # only the base class is initialized:
+        PostgresqlConnectorBase.__init__(  # pylint: disable=non-parent-init-called
+            self, config=config
+        )
+
+        self.engine = create_engine(
+            config.db_url,
+            echo=config.db_print_logs,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+            pool_pre_ping=config.db_pool_pre_ping,
+        )
+        self.sessionmaker = sessionmaker(self.engine, expire_on_commit=False)
+
+    def pool_status(self) -> Dict[str, int]:
+        """Returns statistics on the connection pool of the engine."""
+
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+
+_CONNECTORS: Dict[Tuple[Any, ...], PooledPostgresqlConnector] = {}
+_CONNECTORS_LOCK = threading.Lock()
+
+
+def _get_connector_key(config: Config) -> Tuple[Any, ...]:
+    """Derives the key under which the connector for the given config is cached.
+    The process ID is part of the key so that forked worker processes never reuse
+    the pooled connections of their parent."""
+
+    return (
+        os.getpid(),
+        config.db_url,
+        config.db_print_logs,
+        config.db_pool_size,
+        config.db_max_overflow,
+        config.db_pool_timeout,
+        config.db_pool_recycle,
+        config.db_pool_pre_ping,
+    )
+
+
+def get_postgresql_connector(config: Config = CONFIG) -> PooledPostgresqlConnector:
+    """
+    Get the process-wide connector for the provided config. The connector (and with
+    it the engine and its connection pool) is created on first use and shared by all
+    subsequent callers in the same process.
+    """
+
+    key = _get_connector_key(config)
+
+    with _CONNECTORS_LOCK:
+        connector = _CONNECTORS.get(key)
+        if connector is None:
+            connector = PooledPostgresqlConnector(config)
+            _CONNECTORS[key] = connector
+
+    return connector
+
+
+def dispose_postgresql_connectors() -> None:
+    """
+    Close all pooled connections that have been opened by the current process and
+    forget about all connectors. Connectors inherited from a parent process are
+    dropped without closing their connections as these are still in use by the
+    parent.
+    """
+
+    pid = os.getpid()
+
+    with _CONNECTORS_LOCK:
+        for key, connector in _CONNECTORS.items():
+            if key[0] == pid:
+                connector.engine.dispose()
+        _CONNECTORS.clear()
+
+
+class PooledAsyncPostgresqlConnector(AsyncPostgresqlConnector):
+    """
+    An AsyncPostgresqlConnector whose engine maintains a connection pool that is
+    configured using the `db_pool_*` parameters of the provided config.
+    """
+
+    def __init__(self, config: Config):  # pylint: disable=super-init-not-called
+        """Initialize Connector.
+
+        Args:
+            config (Config): Configs including the DB url and pool parameters.
+        """
+        # the engine of the AsyncPostgresqlConnector is replaced, thus,
+        # only the base class is initialized:
+        PostgresqlConnectorBase.__init__(  # pylint: disable=non-parent-init-called
+            self, config=config
+        )
+
+        # change url prefix to use the asyncpg driver:
+        self.db_url_async = config.db_url.replace(
+            "postgresql://", "postgresql+asyncpg://"
+        )
+
+        self.engine = create_async_engine(
+            self.db_url_async,
+            echo=config.db_print_logs,
+            pool_size=config.db_pool_size,
+            max_overflow=config.db_max_overflow,
+            pool_timeout=config.db_pool_timeout,
+            pool_recycle=config.db_pool_recycle,
+            pool_pre_ping=config.db_pool_pre_ping,
+        )
+        self.sessionmaker = sessionmaker(
+            self.engine, class_=AsyncSession, expire_on_commit=False
+        )
+
+    def pool_status(self) -> Dict[str, int]:
+        """Returns statistics on the connection pool of the engine."""
+
+        pool = self.engine.pool
+        return {
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
+
+
+_ASYNC_CONNECTORS: Dict[Tuple[Any, ...], PooledAsyncPostgresqlConnector] = {}
+
+
+def get_async_postgresql_connector(
+    config: Config = CONFIG,
+) -> PooledAsyncPostgresqlConnector:
+    """
+    Get the connector for the provided config that is shared within the running
+    event loop. Connections of asynchronous engines are bound to the event loop
+    they have been opened in, thus, the event loop is part of the key.
+    Must be called from within a coroutine.
+    """
+
+    key = (id(asyncio.get_running_loop()), *_get_connector_key(config))
+
+    # all callers run in the same thread as the event loop, so no lock is needed:
+    connector = _ASYNC_CONNECTORS.get(key)
+    if connector is None:
+        connector = PooledAsyncPostgresqlConnector(config)
+        _ASYNC_CONNECTORS[key] = connector
+
+    return connector
+
+
+async def dispose_async_postgresql_connectors() -> None:
+    """
+    Close all pooled connections that have been opened within the running event
+    loop and forget about the corresponding connectors.
+    """
+
+    loop_id = id(asyncio.get_running_loop())
+
+    for key in [key for key in _ASYNC_CONNECTORS if key[0] == loop_id]:
+        connector = _ASYNC_CONNECTORS.pop(key)
+        await connector.engine.dispose()
+
+
 # Since this is just a DAO stub without implementation, following pylint error are
 # expected:
 # pylint: disable=unused-argument,no-self-use
@@ -68,18 +287,49 @@ class DatabaseDao(DaoGenericBase):
         - DrsObjectAlreadyExistsError
     """
 
-    def get_drs_object(self, file_id: str) -> models.DrsObjectInternal:
+    def get_drs_object(self, file_id: str) -> models.DrsObjectRecord:
         """Get DRS object from the database"""
         ...
 
+    def get_drs_objects(self, file_ids: List[str]) -> models.DrsObjectsLookup:
+        """Get all DRS objects with the specified file IDs from the database.
+        File IDs that do not exist are reported as missing."""
+        ...
+
+    def iter_file_ids(
+        self, chunk_size: int = FILE_IDS_CHUNK_SIZE
+    ) -> Iterator[List[str]]:
+        """Iterate over the file IDs of all DRS objects in chunks of up to
+        `chunk_size` file IDs."""
+        ...
+
     def register_drs_object(self, drs_object: models.DrsObjectInitial) -> None:
         """Register a new DRS object to the database."""
         ...
 
+    def register_drs_objects(
+        self, drs_objects: List[models.DrsObjectInitial]
+    ) -> List[str]:
+        """
+        Register multiple new DRS objects to the database at once, skipping the ones
+        that already exist. Returns the file IDs of the registered objects.
+        """
+        ...
+
     def update_drs_object(
         self, file_id: str, drs_object: models.DrsObjectInternal
-    ) -> None:
-        """Update information for a DRS object in the database."""
+    ) -> int:
+        """Update information for a DRS object in the database.
+        Returns the number of updated rows."""
+        ...
+
+    def update_drs_objects(
+        self, updates: List[models.DrsObjectUpdate]
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Apply the updates to the DRS objects with the respective file IDs at once.
+        Returns the updated DRS objects, file IDs that do not exist are ignored.
+        """
         ...
 
     def unregister_drs_object(self, file_id: str) -> None:
@@ -88,17 +338,127 @@ class DatabaseDao(DaoGenericBase):
         """
         ...
 
+    def claim_stage_requests(self, file_ids: List[str], window: int) -> List[str]:
+        """
+        Record that staging has been requested for the DRS objects with the specified
+        file IDs, unless it has already been requested within the last `window`
+        seconds. Returns the file IDs for which staging should be requested.
+        """
+        ...
+
+    def claim_sibling_stage_requests(
+        self, file_id: str, limit: int, window: int
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Record that staging has been requested for up to `limit` DRS objects that
+        share the grouping label of the DRS object with the specified file ID and
+        that have neither been staged nor requested within the last `window`
+        seconds. Returns the DRS objects for which staging should be requested.
+        """
+        ...
+
+    def clear_stage_request(self, file_id: str) -> Optional[float]:
+        """
+        Record that the DRS object with the specified file ID has been staged.
+        Returns the number of seconds since staging was first requested or None if
+        it was not requested.
+        """
+        ...
+
+    def record_outbox_verification(
+        self, file_id: str, in_outbox: bool
+    ) -> Optional[models.DrsObjectRecord]:
+        """
+        Record whether the DRS object with the specified file ID turned out to be in
+        the outbox. Returns the updated DRS object or None if it does not exist.
+        """
+        ...
+
+    def record_accesses(self, accesses: List[models.DrsObjectAccesses]) -> None:
+        """Add the accesses to the access statistics of the respective DRS
+        objects."""
+        ...
+
+    def set_pinned(self, file_ids: List[str], pinned: bool) -> None:
+        """Pin the DRS objects with the specified file IDs to the outbox or unpin
+        them."""
+        ...
+
+    def get_outbox_usage(self) -> int:
+        """Get the total size in bytes of all DRS objects staged to the outbox."""
+        ...
+
+    def get_staged_file_ids_without_size(self, limit: int) -> List[str]:
+        """
+        Get the file IDs of up to `limit` DRS objects staged to the outbox whose size
+        is not known.
+        """
+        ...
+
+    def lock_eviction_candidates(
+        self, limit: int, min_residency: int
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Get and lock up to `limit` staged DRS objects that may be evicted from the
+        outbox, least recently used first.
+        """
+        ...
+
+    def lock_drs_object(self, file_id: str) -> None:
+        """
+        Wait until no other transaction holds the lock for the DRS object with the
+        specified file ID and hold it until the end of the transaction.
+        """
+        ...
+
+    def get_stage_request_states(
+        self, file_ids: List[str]
+    ) -> List[models.StageRequestState]:
+        """
+        Get the progress of the pending stage requests for the DRS objects with the
+        specified file IDs. File IDs without pending stage request are ignored.
+        """
+        ...
+
+    def record_staging_latency(
+        self, file_id: str, size: Optional[int], latency: float
+    ) -> None:
+        """Record how many seconds it took to stage the specified DRS object."""
+        ...
+
+    def prune_staging_latencies(self, max_age: int) -> None:
+        """Delete all staging latencies recorded more than `max_age` seconds ago."""
+        ...
+
+    def get_staging_latency_quantile(
+        self,
+        quantile: float,
+        sample_size: int,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> Optional[float]:
+        """
+        Get the specified quantile of the `sample_size` most recent staging latencies
+        of objects within the size range from `min_size` (inclusive) to `max_size`
+        (exclusive). Returns None if no latencies have been recorded.
+        """
+        ...
+
+    def count_stagings(self, max_age: int) -> int:
+        """Count the stagings recorded within the last `max_age` seconds."""
+        ...
+
 
 class PostgresDatabase(DatabaseDao):
     """
     An implementation of the  DatabaseDao interface using a PostgreSQL backend.
     """
 
-    def __init__(self, config: PostgresqlConfigBase = CONFIG):
+    def __init__(self, config: Config = CONFIG):
         """initialze DAO implementation"""
 
         super().__init__(config)
-        self._postgresql_connector = SyncPostgresqlConnector(config)
+        self._postgresql_connector = get_postgresql_connector(config)
 
         # will be defined on __enter__:
         self._session_cm: Any = None
@@ -128,44 +488,206 @@ class PostgresDatabase(DatabaseDao):
 
         return orm_drs_object
 
-    def get_drs_object(self, file_id: str) -> models.DrsObjectInternal:
+    def get_drs_object(self, file_id: str) -> models.DrsObjectRecord:
         """Get DRS object from the database"""
 
-        orm_drs_object = self._get_orm_drs_object(file_id=file_id)
-        return models.DrsObjectInternal.from_orm(orm_drs_object)
+        statement = select(*DRS_OBJECT_RECORD_COLUMNS).where(
+            db_models.DrsObject.file_id == file_id
+        )
+        row = self._session.execute(statement).one_or_none()
+
+        if row is None:
+            raise DrsObjectNotFoundError(file_id=file_id)
+
+        return models.DrsObjectRecord(*row)
+
+    def get_drs_objects(
+        self, file_ids: List[str], chunk_size: int = FILE_IDS_CHUNK_SIZE
+    ) -> models.DrsObjectsLookup:
+        """Get all DRS objects with the specified file IDs from the database. The file
+        IDs are passed as a single array parameter, so that up to `chunk_size` of
+        them are looked up per query. File IDs that do not exist are reported as
+        missing. Duplicates are ignored."""
+
+        unique_file_ids = list(dict.fromkeys(file_ids))
+
+        found_by_file_id: Dict[str, models.DrsObjectRecord] = {}
+        for start in range(0, len(unique_file_ids), chunk_size):
+            statement = select(*DRS_OBJECT_RECORD_COLUMNS).where(
+                db_models.DrsObject.file_id
+                == any_(
+                    bindparam(
+                        "file_ids",
+                        unique_file_ids[start : start + chunk_size],
+                        type_=ARRAY(String),
+                    )
+                )
+            )
+            for row in self._session.execute(statement):
+                found_by_file_id[row.file_id] = models.DrsObjectRecord(*row)
+
+        # the records are trusted, so skip the validation:
+        return models.DrsObjectsLookup.construct(
+            found=[
+                found_by_file_id[file_id]
+                for file_id in unique_file_ids
+                if file_id in found_by_file_id
+            ],
+            missing_file_ids=[
+                file_id
+                for file_id in unique_file_ids
+                if file_id not in found_by_file_id
+            ],
+        )
+
+    def iter_file_ids(
+        self, chunk_size: int = FILE_IDS_CHUNK_SIZE
+    ) -> Iterator[List[str]]:
+        """Iterate over the file IDs of all DRS objects in chunks of up to
+        `chunk_size` file IDs. The file IDs are fetched using a server-side cursor,
+        so that only one chunk is held in memory at a time."""
+
+        statement = select(db_models.DrsObject.file_id).execution_options(
+            stream_results=True
+        )
+        for partition in (
+            self._session.execute(statement).scalars().partitions(chunk_size)
+        ):
+            yield list(partition)
 
     def register_drs_object(self, drs_object: models.DrsObjectInitial) -> None:
-        """Register a new DRS object to the database."""
+        """
+        Register a new DRS object to the database.
+        The collision check and the insert are done by one atomic statement, so that
+        concurrent registrations of the same file ID fail for all but one caller.
+        """
 
-        # check for collisions in the database:
-        try:
-            self._get_orm_drs_object(file_id=drs_object.file_id)
-        except DrsObjectNotFoundError:
-            # this is expected
-            pass
-        else:
-            # this is a problem
+        if not self.register_drs_objects([drs_object]):
             raise DrsObjectAlreadyExistsError(file_id=drs_object.file_id)
 
-        drs_object_dict = {
-            **drs_object.dict(),
-            "registration_date": datetime.now(),
-        }
-        orm_drs_object = db_models.DrsObject(**drs_object_dict)
-        self._session.add(orm_drs_object)
+    def register_drs_objects(
+        self, drs_objects: List[models.DrsObjectInitial]
+    ) -> List[str]:
+        """
+        Register multiple new DRS objects to the database at once, skipping the ones
+        that already exist. Returns the file IDs of the registered objects.
+        All objects are inserted using a single statement.
+        """
+
+        if not drs_objects:
+            return []
+
+        registration_date = datetime.now()
+        statement = (
+            postgresql_insert(db_models.DrsObject)
+            .values(
+                [
+                    {
+                        **drs_object.dict(),
+                        "id": uuid.uuid4(),
+                        "registration_date": registration_date,
+                    }
+                    for drs_object in drs_objects
+                ]
+            )
+            .on_conflict_do_nothing(index_elements=[db_models.DrsObject.file_id])
+            .returning(db_models.DrsObject.file_id)
+        )
+        registered_file_ids = set(self._session.execute(statement).scalars().all())
+
+        # preserve the order of the input:
+        return [
+            drs_object.file_id
+            for drs_object in drs_objects
+            if drs_object.file_id in registered_file_ids
+        ]
 
     def update_drs_object(
         self, file_id: str, drs_object: models.DrsObjectInternal
-    ) -> None:
-        """Update information for a DRS object in the database."""
-
-        orm_drs_object = self._get_orm_drs_object(file_id=drs_object.file_id)
+    ) -> int:
+        """Update information for a DRS object in the database using a single
+        statement, without loading the object first.
+        Returns the number of updated rows."""
 
         # Modify the fields, in case they changed
-        orm_drs_object.md5_checksum = drs_object.md5_checksum
-        orm_drs_object.registration_date = drs_object.registration_date
+        changes: Dict[str, Any] = {
+            "md5_checksum": drs_object.md5_checksum,
+            "registration_date": drs_object.registration_date,
+        }
         if drs_object.size is not None:
-            orm_drs_object.size = drs_object.size
+            changes["size"] = drs_object.size
+
+        statement = (
+            update(db_models.DrsObject)
+            .where(db_models.DrsObject.file_id == drs_object.file_id)
+            .values(**changes)
+            .execution_options(synchronize_session=False)
+        )
+        row_count = self._session.execute(statement).rowcount
+
+        if row_count == 0:
+            raise DrsObjectNotFoundError(file_id=drs_object.file_id)
+
+        return row_count
+
+    def update_drs_objects(
+        self, updates: List[models.DrsObjectUpdate]
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Apply the updates to the DRS objects with the respective file IDs at once,
+        using a single statement that joins the table with the list of updates.
+        Returns the updated DRS objects in the order of the updates, file IDs that
+        do not exist are ignored.
+        """
+
+        if not updates:
+            return []
+
+        drs_objects = db_models.DrsObject.__table__
+        changes = values(
+            column("file_id", String),
+            column("md5_checksum", String),
+            column("size", Integer),
+            column("registration_date", DateTime),
+            name="changes",
+        ).data(
+            [
+                (
+                    drs_update.file_id,
+                    drs_update.md5_checksum,
+                    drs_update.size,
+                    drs_update.registration_date,
+                )
+                for drs_update in updates
+            ]
+        )
+
+        # fields that are not set (i.e. NULL) remain unchanged, the casts are needed
+        # as the types of columns that only contain NULLs can't be inferred:
+        statement = (
+            update(drs_objects)
+            .where(drs_objects.c.file_id == changes.c.file_id)
+            .values(
+                {
+                    name: func.coalesce(
+                        cast(changes.c[name], drs_objects.c[name].type),
+                        drs_objects.c[name],
+                    )
+                    for name in ("md5_checksum", "size", "registration_date")
+                }
+            )
+            .returning(*DRS_OBJECT_RECORD_COLUMNS)
+        )
+        updated_by_file_id = {
+            row.file_id: models.DrsObjectRecord(*row)
+            for row in self._session.execute(statement)
+        }
+
+        return [
+            updated_by_file_id[drs_update.file_id]
+            for drs_update in updates
+            if drs_update.file_id in updated_by_file_id
+        ]
 
     def unregister_drs_object(self, file_id: str) -> None:
         """
@@ -174,3 +696,506 @@ class PostgresDatabase(DatabaseDao):
 
         orm_drs_object = self._get_orm_drs_object(file_id=file_id)
         self._session.delete(orm_drs_object)
+
+    def claim_stage_requests(self, file_ids: List[str], window: int) -> List[str]:
+        """
+        Record that staging has been requested for the DRS objects with the specified
+        file IDs, unless it has already been requested within the last `window`
+        seconds. Returns the file IDs for which staging should be requested.
+        This is atomic, so that concurrent claims for the same file ID from multiple
+        processes are granted at most once per window. The time of the first
+        request is kept until the object has been staged.
+        """
+
+        if not file_ids:
+            return []
+
+        now = func.now()
+        statement = (
+            update(db_models.DrsObject)
+            .where(
+                db_models.DrsObject.file_id.in_(file_ids),
+                or_(
+                    db_models.DrsObject.stage_requested_at.is_(None),
+                    db_models.DrsObject.stage_requested_at
+                    < now - timedelta(seconds=window),
+                ),
+            )
+            .values(
+                stage_requested_at=now,
+                first_stage_requested_at=func.coalesce(
+                    db_models.DrsObject.first_stage_requested_at, now
+                ),
+            )
+            .returning(db_models.DrsObject.file_id)
+            .execution_options(synchronize_session=False)
+        )
+        claimed_file_ids = set(self._session.execute(statement).scalars().all())
+
+        # preserve the order of the input:
+        return [file_id for file_id in file_ids if file_id in claimed_file_ids]
+
+    def claim_sibling_stage_requests(
+        self, file_id: str, limit: int, window: int
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Record that staging has been requested for up to `limit` DRS objects that
+        share the grouping label of the DRS object with the specified file ID (its
+        siblings) and that have neither been staged nor requested within the last
+        `window` seconds. The most frequently accessed siblings are claimed first.
+        Returns the DRS objects for which staging should be requested.
+        Siblings locked by concurrent claims are skipped, so that they are granted
+        at most once per window.
+        """
+
+        drs_object = db_models.DrsObject
+        requested = aliased(drs_object)
+        now = func.now()
+
+        grouping_label = (
+            select(requested.grouping_label)
+            .where(requested.file_id == file_id)
+            .scalar_subquery()
+        )
+        siblings = (
+            select(drs_object.id)
+            .where(
+                drs_object.grouping_label == grouping_label,
+                drs_object.file_id != file_id,
+                drs_object.staged_at.is_(None),
+                or_(
+                    drs_object.stage_requested_at.is_(None),
+                    drs_object.stage_requested_at < now - timedelta(seconds=window),
+                ),
+            )
+            .order_by(drs_object.access_count.desc())
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        statement = (
+            update(drs_object)
+            .where(drs_object.id.in_(siblings.scalar_subquery()))
+            .values(
+                stage_requested_at=now,
+                first_stage_requested_at=func.coalesce(
+                    drs_object.first_stage_requested_at, now
+                ),
+            )
+            .returning(*DRS_OBJECT_RECORD_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+
+        return [
+            models.DrsObjectRecord(*row) for row in self._session.execute(statement)
+        ]
+
+    def lock_drs_object(self, file_id: str) -> None:
+        """
+        Wait until no other transaction holds the lock for the DRS object with the
+        specified file ID and hold it until the end of the transaction. The lock is
+        advisory, i.e. it only excludes other callers of this method.
+        """
+
+        # advisory locks are identified by a 64-bit integer:
+        digest = hashlib.blake2b(file_id.encode("utf-8"), digest_size=8).digest()
+        lock_id = int.from_bytes(digest, "big", signed=True)
+
+        self._session.execute(select(func.pg_advisory_xact_lock(lock_id)))
+
+    def clear_stage_request(self, file_id: str) -> Optional[float]:
+        """
+        Record that the DRS object with the specified file ID has been staged.
+        Returns the number of seconds since staging was first requested or None if
+        it was not requested.
+        """
+
+        elapsed_statement = (
+            select(
+                func.extract(
+                    "epoch", func.now() - db_models.DrsObject.first_stage_requested_at
+                )
+            )
+            .where(db_models.DrsObject.file_id == file_id)
+            .with_for_update()
+        )
+        elapsed = self._session.execute(elapsed_statement).scalar()
+
+        now = func.now()
+        statement = (
+            update(db_models.DrsObject)
+            .where(db_models.DrsObject.file_id == file_id)
+            .values(
+                stage_requested_at=None,
+                first_stage_requested_at=None,
+                staged_at=now,
+                last_verified_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        self._session.execute(statement)
+
+        return None if elapsed is None else float(elapsed)
+
+    def record_outbox_verification(
+        self, file_id: str, in_outbox: bool
+    ) -> Optional[models.DrsObjectRecord]:
+        """
+        Record whether the DRS object with the specified file ID turned out to be in
+        the outbox. An object in the outbox is considered as staged from now on, if it
+        wasn't already. Otherwise, it is no longer considered as staged.
+        Returns the updated DRS object or None if it does not exist.
+        """
+
+        # staged_at is always set, so that the change is notified (see
+        # `DRS_OBJECT_CHANGES_CHANNEL`) and cached metadata is invalidated:
+        now = func.now()
+        staged_at = (
+            func.coalesce(db_models.DrsObject.staged_at, now) if in_outbox else null()
+        )
+        statement = (
+            update(db_models.DrsObject)
+            .where(db_models.DrsObject.file_id == file_id)
+            .values(staged_at=staged_at, last_verified_at=now)
+            .returning(*DRS_OBJECT_RECORD_COLUMNS)
+            .execution_options(synchronize_session=False)
+        )
+        row = self._session.execute(statement).one_or_none()
+
+        return None if row is None else models.DrsObjectRecord(*row)
+
+    def record_accesses(self, accesses: List[models.DrsObjectAccesses]) -> None:
+        """
+        Add the accesses to the access statistics of the respective DRS objects at
+        once, using a single statement that joins the table with the list of
+        accesses. File IDs that do not exist are ignored.
+        """
+
+        if not accesses:
+            return
+
+        drs_objects = db_models.DrsObject.__table__
+        recorded = values(
+            column("file_id", String),
+            column("count", Integer),
+            column("last_accessed_at", DateTime(timezone=True)),
+            name="accesses",
+        ).data(
+            [
+                (access.file_id, access.count, access.last_accessed_at)
+                for access in accesses
+            ]
+        )
+
+        statement = (
+            update(drs_objects)
+            .where(drs_objects.c.file_id == recorded.c.file_id)
+            .values(
+                access_count=drs_objects.c.access_count + recorded.c.count,
+                # accesses recorded by other processes might have been more recent:
+                last_accessed_at=func.greatest(
+                    drs_objects.c.last_accessed_at, recorded.c.last_accessed_at
+                ),
+            )
+        )
+        self._session.execute(statement)
+
+    def set_pinned(self, file_ids: List[str], pinned: bool) -> None:
+        """
+        Pin the DRS objects with the specified file IDs to the outbox, so that they
+        are never evicted, or unpin them. File IDs that do not exist are ignored.
+        """
+
+        statement = (
+            update(db_models.DrsObject)
+            .where(db_models.DrsObject.file_id.in_(file_ids))
+            .values(pinned=pinned)
+            .execution_options(synchronize_session=False)
+        )
+        self._session.execute(statement)
+
+    def get_outbox_usage(self) -> int:
+        """
+        Get the total size in bytes of all DRS objects staged to the outbox as
+        recorded in the database. Objects of unknown size are considered empty.
+        """
+
+        statement = select(func.coalesce(func.sum(db_models.DrsObject.size), 0)).where(
+            db_models.DrsObject.staged_at.is_not(None)
+        )
+
+        return int(self._session.execute(statement).scalar())
+
+    def get_staged_file_ids_without_size(self, limit: int) -> List[str]:
+        """
+        Get the file IDs of up to `limit` DRS objects staged to the outbox whose size
+        is not known, e.g. because they were staged before sizes were recorded.
+        """
+
+        statement = (
+            select(db_models.DrsObject.file_id)
+            .where(
+                db_models.DrsObject.staged_at.is_not(None),
+                db_models.DrsObject.size.is_(None),
+            )
+            .limit(limit)
+        )
+
+        return list(self._session.execute(statement).scalars())
+
+    def lock_eviction_candidates(
+        self, limit: int, min_residency: int
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Get up to `limit` DRS objects that may be evicted from the outbox, least
+        recently used (or staged, if never used) first. Pinned objects and objects
+        staged within the last `min_residency` seconds are not considered.
+        The objects are locked until the end of the transaction, so that they can't
+        be staged or evicted concurrently. Objects locked by other transactions are
+        skipped.
+        """
+
+        drs_object = db_models.DrsObject
+        statement = (
+            select(*DRS_OBJECT_RECORD_COLUMNS)
+            .where(
+                drs_object.staged_at < func.now() - timedelta(seconds=min_residency),
+                drs_object.pinned.is_(False),
+            )
+            .order_by(func.coalesce(drs_object.last_accessed_at, drs_object.staged_at))
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+
+        return [
+            models.DrsObjectRecord(*row) for row in self._session.execute(statement)
+        ]
+
+    def get_stage_request_states(
+        self, file_ids: List[str]
+    ) -> List[models.StageRequestState]:
+        """
+        Get the progress of the pending stage requests for the DRS objects with the
+        specified file IDs. File IDs without pending stage request are ignored.
+        """
+
+        if not file_ids:
+            return []
+
+        drs_object = db_models.DrsObject
+        pending = aliased(db_models.DrsObject)
+
+        # the progress is measured from the first request, as repeated requests
+        # don't make staging start over:
+        queue_position = (
+            select(func.count())
+            .select_from(pending)
+            .where(
+                pending.first_stage_requested_at < drs_object.first_stage_requested_at
+            )
+            .scalar_subquery()
+        )
+        statement = select(
+            drs_object.file_id,
+            drs_object.size,
+            func.extract("epoch", func.now() - drs_object.first_stage_requested_at),
+            queue_position,
+        ).where(
+            drs_object.file_id.in_(file_ids),
+            drs_object.first_stage_requested_at.is_not(None),
+        )
+
+        return [
+            models.StageRequestState(
+                file_id=file_id,
+                size=size,
+                elapsed=elapsed,
+                queue_position=position,
+            )
+            for file_id, size, elapsed, position in self._session.execute(statement)
+        ]
+
+    def record_staging_latency(
+        self, file_id: str, size: Optional[int], latency: float
+    ) -> None:
+        """Record how many seconds it took to stage the specified DRS object."""
+
+        statement = insert(db_models.StagingLatency).values(
+            file_id=file_id, size=size, latency=latency
+        )
+        self._session.execute(statement)
+
+    def prune_staging_latencies(self, max_age: int) -> None:
+        """Delete all staging latencies recorded more than `max_age` seconds ago."""
+
+        statement = delete(db_models.StagingLatency).where(
+            db_models.StagingLatency.staged_at < func.now() - timedelta(seconds=max_age)
+        )
+        self._session.execute(statement)
+
+    def get_staging_latency_quantile(
+        self,
+        quantile: float,
+        sample_size: int,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+    ) -> Optional[float]:
+        """
+        Get the specified quantile of the `sample_size` most recent staging latencies
+        of objects within the size range from `min_size` (inclusive) to `max_size`
+        (exclusive). Objects of unknown size are considered to be empty.
+        Returns None if no latencies have been recorded.
+        """
+
+        size = func.coalesce(db_models.StagingLatency.size, 0)
+
+        samples_statement = select(db_models.StagingLatency.latency)
+        if min_size is not None:
+            samples_statement = samples_statement.where(size >= min_size)
+        if max_size is not None:
+            samples_statement = samples_statement.where(size < max_size)
+        samples = (
+            samples_statement.order_by(db_models.StagingLatency.staged_at.desc())
+            .limit(sample_size)
+            .subquery()
+        )
+
+        statement = select(
+            func.percentile_cont(quantile).within_group(samples.c.latency)
+        )
+        result = self._session.execute(statement).scalar()
+
+        return None if result is None else float(result)
+
+    def count_stagings(self, max_age: int) -> int:
+        """Count the stagings recorded within the last `max_age` seconds."""
+
+        statement = select(func.count()).where(
+            db_models.StagingLatency.staged_at > func.now() - timedelta(seconds=max_age)
+        )
+        return self._session.execute(statement).scalar()
+
+
+class _SessionBoundPostgresDatabase(PostgresDatabase):
+    """
+    A PostgresDatabase that operates on an already opened session instead of
+    managing a transaction on its own.
+    """
+
+    def __init__(  # pylint: disable=super-init-not-called
+        self, session: Session, config: Config = CONFIG
+    ):
+        """initialze DAO implementation"""
+
+        DatabaseDao.__init__(self, config)  # pylint: disable=non-parent-init-called
+        self._postgresql_connector = None
+        self._session_cm = None
+        self._session = session
+
+
+ResultType = TypeVar("ResultType")
+
+
+class AsyncPostgresDatabase(AsyncDaoGenericBase):
+    """
+    Offers the PostgresDatabase for use in coroutines based on non-blocking
+    connections. Instead of re-implementing all queries, the methods of the
+    PostgresDatabase are executed by SQLAlchemy in a way that suspends the coroutine
+    (rather than blocking the event loop) whenever the database is waited for.
+    """
+
+    def __init__(self, config: Config = CONFIG):
+        """initialze DAO implementation"""
+
+        super().__init__(config)
+        self._config = config
+
+        # will be defined on __aenter__:
+        self._session_cm: Any = None
+        self._session: Any = None
+
+    async def __aenter__(self):
+        """Setup database connection"""
+
+        connector = get_async_postgresql_connector(self._config)
+        self._session_cm = connector.transactional_session()
+        self._session = await self._session_cm.__aenter__()  # pylint: disable=no-member
+        return self
+
+    async def __aexit__(self, error_type, error_value, error_traceback):
+        """Teardown database connection"""
+        # pylint: disable=no-member
+        await self._session_cm.__aexit__(error_type, error_value, error_traceback)
+
+    async def run_sync(
+        self, function: Callable[[PostgresDatabase], ResultType]
+    ) -> ResultType:
+        """
+        Run a function that interacts with a (synchronous) PostgresDatabase within
+        the transaction of this DAO without blocking the event loop.
+        """
+
+        return await self._session.run_sync(
+            lambda session: function(
+                _SessionBoundPostgresDatabase(session, config=self._config)
+            )
+        )
+
+    async def get_drs_object(self, file_id: str) -> models.DrsObjectRecord:
+        """Get DRS object from the database"""
+
+        return await self.run_sync(lambda database: database.get_drs_object(file_id))
+
+    async def get_drs_objects(self, file_ids: List[str]) -> models.DrsObjectsLookup:
+        """Get all DRS objects with the specified file IDs from the database.
+        File IDs that do not exist are reported as missing."""
+
+        return await self.run_sync(lambda database: database.get_drs_objects(file_ids))
+
+    async def claim_stage_requests(self, file_ids: List[str], window: int) -> List[str]:
+        """
+        Record that staging has been requested for the DRS objects with the specified
+        file IDs, unless it has already been requested within the last `window`
+        seconds. Returns the file IDs for which staging should be requested.
+        """
+
+        return await self.run_sync(
+            lambda database: database.claim_stage_requests(file_ids, window=window)
+        )
+
+    async def claim_sibling_stage_requests(
+        self, file_id: str, limit: int, window: int
+    ) -> List[models.DrsObjectRecord]:
+        """
+        Record that staging has been requested for up to `limit` DRS objects that
+        share the grouping label of the DRS object with the specified file ID and
+        that have neither been staged nor requested within the last `window`
+        seconds. Returns the DRS objects for which staging should be requested.
+        """
+
+        return await self.run_sync(
+            lambda database: database.claim_sibling_stage_requests(
+                file_id, limit=limit, window=window
+            )
+        )
+
+    async def lock_drs_object(self, file_id: str) -> None:
+        """
+        Wait until no other transaction holds the lock for the DRS object with the
+        specified file ID and hold it until the end of the transaction.
+        """
+
+        await self.run_sync(lambda database: database.lock_drs_object(file_id))
+
+    async def record_outbox_verification(
+        self, file_id: str, in_outbox: bool
+    ) -> Optional[models.DrsObjectRecord]:
+        """
+        Record whether the DRS object with the specified file ID turned out to be in
+        the outbox. Returns the updated DRS object or None if it does not exist.
+        """
+
+        return await self.run_sync(
+            lambda database: database.record_outbox_verification(
+                file_id, in_outbox=in_outbox
+            )
+        )
@@ -18,7 +18,18 @@
 
 import uuid
 
-from sqlalchemy import Column, DateTime, Integer, String
+from sqlalchemy import (
+    DDL,
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    event,
+    false,
+    func,
+)
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm.decl_api import DeclarativeMeta
@@ -65,3 +76,154 @@ class DrsObject(Base):
     registration_date = Column(
         DateTime, nullable=False, doc="Date/time when the object was registered."
     )
+    grouping_label = Column(
+        String,
+        nullable=True,
+        default=None,
+        index=True,
+        doc=(
+            "Label of the group of files the object belongs to (e.g. the study ID)."
+            + " Files of the same group are likely to be requested together."
+        ),
+    )
+    stage_requested_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=None,
+        index=True,
+        doc=(
+            "Date/time (database clock) when staging the object to the outbox was"
+            + " last requested. Reset once the object arrived in the outbox."
+        ),
+    )
+    first_stage_requested_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=None,
+        index=True,
+        doc=(
+            "Date/time (database clock) when staging the object to the outbox was"
+            + " first requested, which is not changed by repeated requests. Reset"
+            + " once the object arrived in the outbox."
+        ),
+    )
+    staged_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=None,
+        doc=(
+            "Date/time (database clock) when the object last arrived in the outbox."
+            + " Reset once the object turns out to be no longer in the outbox."
+        ),
+    )
+    last_verified_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=None,
+        doc=(
+            "Date/time (database clock) when it was last verified whether the"
+            + " object is in the outbox."
+        ),
+    )
+    last_accessed_at = Column(
+        DateTime(timezone=True),
+        nullable=True,
+        default=None,
+        doc="Date/time when the object was last requested.",
+    )
+    access_count = Column(
+        Integer,
+        nullable=False,
+        default=0,
+        server_default="0",
+        doc="Number of times the object has been requested.",
+    )
+    pinned = Column(
+        Boolean,
+        nullable=False,
+        default=False,
+        server_default=false(),
+        doc="Whether the object must not be evicted from the outbox.",
+    )
+
+
+# Changes to the metadata and the outbox state of drs objects (except for the time
+# of the last verification) are announced on this channel, using the file ID, the
+# time of the change (seconds since the epoch), and whether the object left the
+# outbox (i.e. was staged before but isn't anymore) as JSON payload:
+DRS_OBJECT_CHANGES_CHANNEL = "drs_object_changes"
+
+NOTIFY_DRS_OBJECT_CHANGE_FUNCTION = DDL(f"""
+    CREATE OR REPLACE FUNCTION notify_drs_object_change() RETURNS trigger AS $$
+    DECLARE
+        unstaged boolean := false;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            unstaged := OLD.staged_at IS NOT NULL;
+        ELSIF TG_OP = 'UPDATE' THEN
+            unstaged := OLD.staged_at IS NOT NULL AND NEW.staged_at IS NULL;
+        END IF;
+        IF TG_OP <> 'INSERT' THEN
+            PERFORM pg_notify(
+                '{DRS_OBJECT_CHANGES_CHANNEL}',
+                json_build_object(
+                    'file_id', OLD.file_id,
+                    'changed_at', extract(epoch FROM clock_timestamp()),
+                    'unstaged', unstaged
+                )::text
+            );
+        END IF;
+        IF TG_OP = 'INSERT' OR (TG_OP = 'UPDATE' AND NEW.file_id <> OLD.file_id) THEN
+            PERFORM pg_notify(
+                '{DRS_OBJECT_CHANGES_CHANNEL}',
+                json_build_object(
+                    'file_id', NEW.file_id,
+                    'changed_at', extract(epoch FROM clock_timestamp()),
+                    'unstaged', false
+                )::text
+            );
+        END IF;
+        RETURN NULL;
+    END;
+    $$ LANGUAGE plpgsql
+    """)
+
+NOTIFY_DRS_OBJECT_CHANGE_TRIGGER = DDL("""
+    CREATE TRIGGER notify_drs_object_change
+    AFTER INSERT OR DELETE
+        OR UPDATE OF file_id, md5_checksum, size, registration_date,
+            stage_requested_at, staged_at
+    ON drs_objects
+    FOR EACH ROW EXECUTE PROCEDURE notify_drs_object_change()
+    """)
+
+# install the trigger along with the table (the same is done by the migrations):
+for ddl in (NOTIFY_DRS_OBJECT_CHANGE_FUNCTION, NOTIFY_DRS_OBJECT_CHANGE_TRIGGER):
+    event.listen(
+        DrsObject.__table__, "after_create", ddl.execute_if(dialect="postgresql")
+    )
+
+
+class StagingLatency(Base):
+    """
+    The time it took to stage an object to the outbox, measured from the first
+    stage request to the arrival in the outbox.
+    """
+
+    __tablename__ = "staging_latencies"
+    id = Column(Integer, primary_key=True)
+    file_id = Column(String, nullable=False, doc="File ID of the staged object.")
+    size = Column(
+        Integer,
+        nullable=True,
+        default=None,
+        doc="Size of the staged object content in bytes.",
+    )
+    latency = Column(Float, nullable=False, doc="Staging latency in seconds.")
+    staged_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        index=True,
+        doc="Date/time (database clock) when the object arrived in the outbox.",
+    )
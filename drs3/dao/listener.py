@@ -0,0 +1,287 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Listening for notifications of the PostgreSQL database"""
+
+import os
+import select
+import socket
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+import psycopg2
+import psycopg2.extensions
+from sqlalchemy.engine import make_url
+
+from ..config import CONFIG, Config
+
+# how often (in seconds) to check whether the listener has been stopped:
+POLL_INTERVAL = 1.0
+
+
+class ChangeListener:
+    """
+    Listens for notifications on a channel of the PostgreSQL database in a
+    background thread using a dedicated connection. The payload of every
+    notification is passed to the `on_notify` callback of all subscribers. Since
+    notifications that are sent while not listening are lost, their `on_reset`
+    callback is called whenever listening (re)starts.
+    Every notification and every reset increments the `generation`, which happens
+    together with calling the callbacks under a lock (see `run_if_unchanged`).
+    Callers may wait for all notifications sent before to be received (see `sync`).
+    """
+
+    def __init__(self, config: Config, channel: str):
+        """Initialize with the database and the channel to listen to."""
+
+        self.channel = channel
+        self.generation = 0
+
+        url = make_url(config.db_url).set(drivername="postgresql")
+        self._dsn = url.render_as_string(hide_password=False)
+        self._reconnect_delay = config.db_listener_reconnect_delay
+        self._subscribers: Dict[
+            str, Tuple[Callable[[str], None], Callable[[], None]]
+        ] = {}
+        self._subscribers_lock = threading.Lock()
+        self._dispatch_lock = threading.Lock()
+
+        # syncs are requested by waking up the thread of the listener:
+        self._wakeup_receiver, self._wakeup_sender = socket.socketpair()
+        self._wakeup_receiver.setblocking(False)
+        self._wakeup_sender.setblocking(False)
+        self._sync_condition = threading.Condition()
+        self._sync_requested = 0
+        self._synced = 0
+
+        self._listening = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name=f"listener-{channel}", daemon=True
+        )
+
+    @property
+    def listening(self) -> bool:
+        """Whether notifications are currently received."""
+
+        return self._listening.is_set()
+
+    def subscribe(
+        self,
+        name: str,
+        on_notify: Callable[[str], None],
+        on_reset: Callable[[], None],
+    ) -> None:
+        """
+        Add a subscriber with the specified callbacks, unless a subscriber with the
+        same name exists already. The callbacks are called from the thread of the
+        listener, except for `on_reset`, which is called right away when adding the
+        subscriber as it may have missed notifications before.
+        """
+
+        if name in self._subscribers:
+            return
+
+        with self._subscribers_lock:
+            if name in self._subscribers:
+                return
+            self._subscribers[name] = (on_notify, on_reset)
+
+        on_reset()
+
+    def run_if_unchanged(self, generation: int, action: Callable[[], None]) -> bool:
+        """
+        Call the action, unless the generation changed from the specified one, i.e.
+        unless a notification or reset has been received since. Notifications are
+        not passed on to the subscribers meanwhile, so that they can't interleave.
+        Returns whether the action was called.
+        """
+
+        with self._dispatch_lock:
+            if self.generation != generation:
+                return False
+            action()
+            return True
+
+    def sync(self, timeout: float) -> bool:
+        """
+        Wait until all notifications that were sent before have been passed on to
+        the subscribers. Returns whether this was the case within `timeout`
+        seconds, which is never the case while not listening.
+        """
+
+        if not self.listening:
+            return False
+
+        with self._sync_condition:
+            self._sync_requested += 1
+            requested = self._sync_requested
+
+        try:
+            self._wakeup_sender.send(b"\0")
+        except OSError:
+            # plenty of wakeups are pending already or the listener has been stopped,
+            # in which case the sync times out
+            pass
+
+        with self._sync_condition:
+            return self._sync_condition.wait_for(
+                lambda: self._synced >= requested, timeout=timeout
+            )
+
+    def start(self) -> None:
+        """Start listening in the background."""
+
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop listening and close the connection."""
+
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+        self._wakeup_receiver.close()
+        self._wakeup_sender.close()
+
+    def _reset(self) -> None:
+        """Notify that notifications may have been missed."""
+
+        with self._subscribers_lock:
+            subscribers = list(self._subscribers.values())
+        with self._dispatch_lock:
+            self.generation += 1
+            for _, on_reset in subscribers:
+                on_reset()
+
+    def _run(self) -> None:
+        """Listen until stopped, reconnecting if the connection is lost."""
+
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except psycopg2.Error:
+                pass
+            finally:
+                self._listening.clear()
+                self._reset()
+
+            self._stopped.wait(self._reconnect_delay)
+
+    def _listen(self) -> None:
+        """Listen on a new connection until stopped or the connection is lost."""
+
+        # keepalives make sure that a broken connection is noticed:
+        connection = psycopg2.connect(
+            self._dsn, keepalives=1, keepalives_idle=30, keepalives_interval=10
+        )
+        try:
+            connection.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+
+            self._listening.set()
+            self._reset()
+
+            while not self._stopped.is_set():
+                readable, _, _ = select.select(
+                    [connection, self._wakeup_receiver], [], [], POLL_INTERVAL
+                )
+                if self._wakeup_receiver in readable:
+                    self._sync(connection)
+                elif readable:
+                    connection.poll()
+                    self._dispatch(connection)
+        finally:
+            connection.close()
+
+    def _dispatch(self, connection: Any) -> None:
+        """Pass the received notifications on to the subscribers."""
+
+        while connection.notifies:
+            notify = connection.notifies.pop(0)
+            with self._subscribers_lock:
+                subscribers = list(self._subscribers.values())
+            with self._dispatch_lock:
+                self.generation += 1
+                for on_notify, _ in subscribers:
+                    on_notify(notify.payload)
+
+    def _sync(self, connection: Any) -> None:
+        """
+        Receive all notifications that were sent before the syncs requested so far
+        and mark these syncs as done. Notifications are sent before the result of a
+        query, so a round trip to the database suffices.
+        """
+
+        try:
+            while self._wakeup_receiver.recv(4096):
+                pass
+        except BlockingIOError:
+            pass
+
+        with self._sync_condition:
+            requested = self._sync_requested
+
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        connection.poll()
+        self._dispatch(connection)
+
+        with self._sync_condition:
+            self._synced = max(self._synced, requested)
+            self._sync_condition.notify_all()
+
+
+_LISTENERS: Dict[Tuple[Any, ...], ChangeListener] = {}
+_LISTENERS_LOCK = threading.Lock()
+
+
+def get_change_listener(channel: str, config: Config = CONFIG) -> ChangeListener:
+    """
+    Get the process-wide listener for the specified channel of the database. The
+    listener is created and started on first use and shared by all subsequent
+    callers in the same process.
+    """
+
+    key = (os.getpid(), config.db_url, channel)
+
+    with _LISTENERS_LOCK:
+        listener = _LISTENERS.get(key)
+        if listener is None:
+            listener = ChangeListener(config, channel=channel)
+            listener.start()
+            _LISTENERS[key] = listener
+
+    return listener
+
+
+def stop_change_listeners() -> None:
+    """
+    Stop all listeners that have been started by the current process and forget
+    about all listeners. Listeners inherited from a parent process are dropped
+    without stopping them as their threads do not exist in this process.
+    """
+
+    pid = os.getpid()
+
+    with _LISTENERS_LOCK:
+        listeners = [listener for key, listener in _LISTENERS.items() if key[0] == pid]
+        _LISTENERS.clear()
+
+    for listener in listeners:
+        listener.stop()
@@ -0,0 +1,206 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Object Storage DAO"""
+
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import boto3
+import botocore.client
+import botocore.config
+import botocore.exceptions
+from ghga_service_chassis_lib.object_storage_dao import (
+    validate_bucket_id,
+    validate_object_id,
+)
+from ghga_service_chassis_lib.s3 import (
+    ObjectStorageS3,
+    _translate_s3_client_errors,
+    read_aws_config_ini,
+)
+
+from ..config import CONFIG, Config
+
+_CLIENTS: Dict[Tuple[Any, ...], botocore.client.BaseClient] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+
+def _get_client_key(config: Config) -> Tuple[Any, ...]:
+    """Derives the key under which the S3 client for the given config is cached.
+    The process ID is part of the key so that forked worker processes never reuse
+    the connection pool of their parent."""
+
+    return (
+        os.getpid(),
+        config.s3_endpoint_url,
+        config.s3_access_key_id,
+        config.s3_secret_access_key,
+        config.s3_session_token,
+        config.aws_config_ini,
+        config.s3_max_pool_connections,
+        config.s3_connect_timeout,
+        config.s3_read_timeout,
+        config.s3_max_attempts,
+        config.s3_retry_mode,
+    )
+
+
+def _create_client(config: Config) -> botocore.client.BaseClient:
+    """Creates a new S3 client with a keep-alive connection pool."""
+
+    client_config = botocore.config.Config(
+        max_pool_connections=config.s3_max_pool_connections,
+        connect_timeout=config.s3_connect_timeout,
+        read_timeout=config.s3_read_timeout,
+        retries={"max_attempts": config.s3_max_attempts, "mode": config.s3_retry_mode},
+        tcp_keepalive=True,
+    )
+    if config.aws_config_ini is not None:
+        client_config = client_config.merge(read_aws_config_ini(config.aws_config_ini))
+
+    # the default boto3 session must not be used concurrently, thus, a dedicated
+    # session is used:
+    session = boto3.session.Session()
+    return session.client(
+        service_name="s3",
+        endpoint_url=config.s3_endpoint_url,
+        aws_access_key_id=config.s3_access_key_id,
+        aws_secret_access_key=config.s3_secret_access_key,
+        aws_session_token=config.s3_session_token,
+        config=client_config,
+    )
+
+
+def get_s3_client(config: Config = CONFIG) -> botocore.client.BaseClient:
+    """
+    Get the process-wide S3 client for the provided config. The client is created on
+    first use and shared by all subsequent callers in the same process (S3 clients
+    are thread-safe).
+    """
+
+    key = _get_client_key(config)
+
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            client = _create_client(config)
+            _CLIENTS[key] = client
+
+    return client
+
+
+def dispose_s3_clients() -> None:
+    """
+    Close the connection pools of all S3 clients that have been created by the
+    current process and forget about all clients.
+    """
+
+    pid = os.getpid()
+
+    with _CLIENTS_LOCK:
+        for key, client in _CLIENTS.items():
+            if key[0] == pid:
+                client.close()
+        _CLIENTS.clear()
+
+
+class PooledObjectStorageS3(ObjectStorageS3):
+    """
+    An ObjectStorageS3 implementation that, instead of creating a new client whenever
+    entering the context, borrows the process-wide S3 client and with it its
+    connection pool.
+    """
+
+    _config: Config
+
+    def __enter__(self) -> "PooledObjectStorageS3":
+        """Borrow the process-wide S3 client."""
+
+        self._client = get_s3_client(self._config)
+
+        # resources are not thread-safe and, thus, are not shared,
+        # they will be created on demand:
+        self._resource = None
+
+        return self
+
+    def sign_object_download_url(
+        self, bucket_id: str, object_id: str, expires_after: int = 86400
+    ) -> str:
+        """Generates and returns a presigned HTTP-URL to download a file object with
+        the specified ID (`object_id`) from bucket with the specified id (`bucket_id`).
+        In contrast to `get_object_download_url`, the existence of the object is not
+        checked, so this should only be used for objects that are known to exist.
+        Signing happens locally and, thus, does not contact the S3 endpoint.
+        """
+        if not isinstance(self._client, botocore.client.BaseClient):
+            raise self._out_of_context_error
+
+        validate_bucket_id(bucket_id)
+        validate_object_id(object_id)
+
+        try:
+            presigned_url = self._client.generate_presigned_url(
+                "get_object",
+                Params={"Bucket": bucket_id, "Key": object_id},
+                ExpiresIn=expires_after,
+            )
+        except botocore.exceptions.ClientError as error:
+            raise _translate_s3_client_errors(
+                error, bucket_id=bucket_id, object_id=object_id
+            ) from error
+
+        return presigned_url
+
+    def get_object_size(self, bucket_id: str, object_id: str) -> Optional[int]:
+        """Get the size in bytes of the file object with the specified ID
+        (`object_id`) in the bucket with the specified id (`bucket_id`).
+        Like `does_object_exist`, any error response of S3 is considered as
+        non-existence, in which case None is returned.
+        """
+        if not isinstance(self._client, botocore.client.BaseClient):
+            raise self._out_of_context_error
+
+        validate_bucket_id(bucket_id)
+        validate_object_id(object_id)
+
+        try:
+            response = self._client.head_object(Bucket=bucket_id, Key=object_id)
+        except botocore.exceptions.ClientError:
+            return None
+
+        return int(response["ContentLength"])
+
+    def delete_bucket(self, bucket_id: str, delete_content: bool = False) -> None:
+        """
+        Delete a bucket (= a structure that can hold multiple file objects) with the
+        specified unique ID. If `delete_content` is set to True, any contained objects
+        will be deleted, if False (the default) an Error will be raised if the bucket is
+        not empty.
+        """
+
+        if self._client is not None and self._resource is None:
+            self._resource = boto3.session.Session().resource(
+                service_name="s3",
+                endpoint_url=self._config.s3_endpoint_url,
+                aws_access_key_id=self._config.s3_access_key_id,
+                aws_secret_access_key=self._config.s3_secret_access_key,
+                aws_session_token=self._config.s3_session_token,
+                config=self._advanced_config,
+            )
+
+        super().delete_bucket(bucket_id=bucket_id, delete_content=delete_content)
@@ -0,0 +1,159 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Non-blocking Object Storage DAO. Requires the `asgi` extra.
+
+Requests are signed by the process-wide boto3 client (signing happens locally) and
+sent by a non-blocking HTTP client, so that waiting for S3 never blocks the event
+loop.
+"""
+
+import asyncio
+from typing import Any, Dict, Tuple
+
+import aiohttp
+from ghga_service_chassis_lib.object_storage_dao import (
+    validate_bucket_id,
+    validate_object_id,
+)
+from ghga_service_chassis_lib.utils import AsyncDaoGenericBase
+
+from ..config import CONFIG, Config
+from .s3 import PooledObjectStorageS3
+
+# signed requests are sent right away, so they only need to be valid briefly:
+REQUEST_SIGNATURE_EXPIRY = 60
+
+_SESSIONS: Dict[Tuple[Any, ...], aiohttp.ClientSession] = {}
+
+
+def get_http_session(config: Config = CONFIG) -> aiohttp.ClientSession:
+    """
+    Get the HTTP session used to talk to S3 within the running event loop. The
+    session maintains a keep-alive connection pool that is configured using the
+    `s3_*` connection parameters of the provided config.
+    Must be called from within a coroutine.
+    """
+
+    key = (
+        id(asyncio.get_running_loop()),
+        config.s3_max_pool_connections,
+        config.s3_connect_timeout,
+        config.s3_read_timeout,
+    )
+
+    # all callers run in the same thread as the event loop, so no lock is needed:
+    session = _SESSIONS.get(key)
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=config.s3_max_pool_connections),
+            timeout=aiohttp.ClientTimeout(
+                sock_connect=config.s3_connect_timeout,
+                sock_read=config.s3_read_timeout,
+            ),
+        )
+        _SESSIONS[key] = session
+
+    return session
+
+
+async def dispose_http_sessions() -> None:
+    """
+    Close the connection pools of all HTTP sessions that have been created within
+    the running event loop and forget about them.
+    """
+
+    loop_id = id(asyncio.get_running_loop())
+
+    for key in [key for key in _SESSIONS if key[0] == loop_id]:
+        await _SESSIONS.pop(key).close()
+
+
+class AsyncObjectStorageS3(AsyncDaoGenericBase):
+    """
+    Offers the operations of the PooledObjectStorageS3 that are needed to serve
+    DrsObjects for use in coroutines.
+    """
+
+    def __init__(self, config: Config = CONFIG):
+        """Initialize with the config parameters needed to connect to S3."""
+
+        super().__init__(config)
+        self._config = config
+        self._storage = PooledObjectStorageS3(config)
+
+        # will be set on __aenter__:
+        self._http_session: Any = None
+
+    async def __aenter__(self) -> "AsyncObjectStorageS3":
+        """Borrow the process-wide S3 client and the HTTP session of the loop."""
+
+        self._storage.__enter__()
+        self._http_session = get_http_session(self._config)
+
+        return self
+
+    async def __aexit__(self, error_type, error_value, error_traceback):
+        """Return the borrowed clients."""
+
+        self._storage.__exit__(error_type, error_value, error_traceback)
+        self._http_session = None
+
+    async def does_object_exist(self, bucket_id: str, object_id: str) -> bool:
+        """Check whether an object with specified ID (`object_id`) exists in the bucket
+        with the specified id (`bucket_id`).
+        Return `True` if checks succeed and `False` otherwise.
+        Like `ObjectStorageS3.does_object_exist`, any error response of S3 is
+        considered as non-existence, while errors reaching S3 are raised once the
+        configured number of attempts (`s3_max_attempts`) are exhausted.
+        """
+        if self._http_session is None:
+            raise self._storage._out_of_context_error  # pylint: disable=protected-access
+
+        validate_bucket_id(bucket_id)
+        validate_object_id(object_id)
+
+        # pylint: disable=protected-access
+        url = self._storage._client.generate_presigned_url(
+            "head_object",
+            Params={"Bucket": bucket_id, "Key": object_id},
+            ExpiresIn=REQUEST_SIGNATURE_EXPIRY,
+        )
+
+        for attempt in range(1, self._config.s3_max_attempts + 1):
+            try:
+                async with self._http_session.head(url) as response:
+                    if response.status < 500 or attempt == self._config.s3_max_attempts:
+                        return response.status < 300
+            except aiohttp.ClientError:
+                if attempt == self._config.s3_max_attempts:
+                    raise
+
+        return False
+
+    def sign_object_download_url(
+        self, bucket_id: str, object_id: str, expires_after: int = 86400
+    ) -> str:
+        """Generates and returns a presigned HTTP-URL to download a file object with
+        the specified ID (`object_id`) from bucket with the specified id (`bucket_id`)
+        without checking its existence (see
+        `PooledObjectStorageS3.sign_object_download_url`). Signing happens locally and,
+        thus, does not need to be awaited.
+        """
+
+        return self._storage.sign_object_download_url(
+            bucket_id, object_id, expires_after=expires_after
+        )
@@ -0,0 +1,226 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Prometheus metrics of the service.
+
+If the service runs in multiple processes (gunicorn workers and subscribers), the
+environment variable `PROMETHEUS_MULTIPROC_DIR` has to point to a directory that is
+shared by all processes, so that the metrics are aggregated across them. The
+variable has to be set before the service is started and the directory should be
+emptied by the deployment before any of the processes start.
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import ContextManager, Iterator, Tuple
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+MULTIPROC_DIR_ENV_VAR = "PROMETHEUS_MULTIPROC_DIR"
+
+# The stages of serving a request range from sub-millisecond (signing a url) to
+# seconds (S3 under load), so the buckets are finer than the defaults:
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# Only labeled metrics are used, so that no values are created on import. This way,
+# importing this module in the gunicorn master process does not leave metrics
+# files behind in the multiprocess directory.
+
+REQUEST_DURATION = Histogram(
+    "drs3_request_duration_seconds",
+    "Total time spent serving a request.",
+    ["route"],
+    buckets=LATENCY_BUCKETS,
+)
+
+REQUESTS = Counter(
+    "drs3_requests",
+    "Number of served requests by outcome.",
+    ["route", "status"],
+)
+
+STAGE_DURATION = Histogram(
+    "drs3_request_stage_duration_seconds",
+    "Time spent in the individual stages of serving a request.",
+    ["stage"],
+    buckets=LATENCY_BUCKETS,
+)
+
+COALESCED_LOOKUPS = Counter(
+    "drs3_coalesced_lookups",
+    "Number of lookups that shared the result of a concurrent lookup.",
+    ["kind"],
+)
+
+METADATA_CACHE_LOOKUPS = Counter(
+    "drs3_metadata_cache_lookups",
+    "Number of lookups of DrsObject metadata in the cache by result.",
+    ["result"],
+)
+
+METADATA_CACHE_INVALIDATION_LAG = Histogram(
+    "drs3_metadata_cache_invalidation_lag_seconds",
+    "Time from changing a DrsObject in the database to invalidating its metadata.",
+    ["channel"],
+    buckets=LATENCY_BUCKETS,
+)
+
+FILE_ID_FILTER_LOOKUPS = Counter(
+    "drs3_file_id_filter_lookups",
+    "Number of lookups of file IDs in the filter of known file IDs by result.",
+    ["result"],
+)
+
+PRESTAGE_REQUESTS = Counter(
+    "drs3_prestage_requests",
+    "Number of stage requests made for siblings of requested DrsObjects by outcome.",
+    ["outcome"],
+)
+
+MESSAGE_DURATION = Histogram(
+    "drs3_message_duration_seconds",
+    "Time spent processing a message received from a topic.",
+    ["topic"],
+    buckets=LATENCY_BUCKETS,
+)
+
+MESSAGES = Counter(
+    "drs3_messages",
+    "Number of processed messages received from a topic by outcome.",
+    ["topic", "outcome"],
+)
+
+# stages of serving a request:
+DB_LOOKUP = "db_lookup"
+OUTBOX_CHECK = "outbox_check"
+URL_SIGNING = "url_signing"
+STAGE_REQUEST_PUBLISHING = "stage_request_publishing"
+
+
+def is_multiprocess() -> bool:
+    """Checks whether the metrics are aggregated across multiple processes."""
+
+    return MULTIPROC_DIR_ENV_VAR in os.environ
+
+
+def time_stage(stage: str) -> ContextManager:
+    """Times the enclosed block as the specified stage of serving a request."""
+
+    return STAGE_DURATION.labels(stage=stage).time()
+
+
+@contextmanager
+def observe_message(topic: str, count: int = 1) -> Iterator[None]:
+    """
+    Times the processing of a message received from the specified topic, which
+    takes place in the enclosed block, and counts it as failed if an exception is
+    raised. If the block processes a batch of `count` messages at once, its
+    duration is observed once, while all messages are counted.
+    """
+
+    with MESSAGE_DURATION.labels(topic=topic).time():
+        try:
+            yield
+        except Exception:
+            MESSAGES.labels(topic=topic, outcome="failure").inc(count)
+            raise
+    MESSAGES.labels(topic=topic, outcome="success").inc(count)
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Renders the metrics in the Prometheus text format. Returns the rendered metrics
+    and the corresponding content type.
+    """
+
+    if not is_multiprocess():
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid: int) -> None:
+    """Cleans up the metrics of a process that exited."""
+
+    if is_multiprocess():
+        multiprocess.mark_process_dead(pid)
+
+
+def _is_running(pid: int) -> bool:
+    """Checks whether a process with the specified ID is running."""
+
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process exists but belongs to another user
+        return True
+    return True
+
+
+def mark_dead_processes() -> None:
+    """
+    Cleans up the metrics of the processes that exited without doing so, e.g. the
+    workers of a previous run of the server. The metrics of running processes, e.g.
+    of the other entry points sharing the multiprocess directory, are kept. Removing
+    the metrics of previous runs altogether is left to the deployment, since it has
+    to happen before any of the processes start.
+    """
+
+    if not is_multiprocess():
+        return
+
+    multiproc_dir = Path(os.environ[MULTIPROC_DIR_ENV_VAR])
+    multiproc_dir.mkdir(parents=True, exist_ok=True)
+
+    # the files are named after the type of the metric and the process ID:
+    pids = {
+        int(pid)
+        for _, _, pid in (
+            path.stem.rpartition("_") for path in multiproc_dir.glob("*.db")
+        )
+        if pid.isdigit()
+    }
+    for pid in pids:
+        if not _is_running(pid):
+            mark_process_dead(pid)
@@ -20,6 +20,7 @@ in the api."""
 import re
 from datetime import datetime
 from typing import List, Literal, Optional
+from uuid import UUID
 
 from ghga_service_chassis_lib.object_storage_dao import (
     ObjectIdValidationError,
@@ -49,6 +50,7 @@ class DrsObjectInitial(DrsObjectBase):
 
     file_id: str
     registration_date: datetime
+    grouping_label: Optional[str] = None
 
     # pylint: disable=no-self-argument,no-self-use
     @validator("file_id")
@@ -74,6 +76,111 @@ class DrsObjectInternal(DrsObjectInitial):
     id: UUID4
 
 
+class DrsObjectRecord:
+    """
+    A compact representation of the DrsObject metadata stored in the database,
+    along with the state of the object in the outbox and the label of the group it
+    belongs to.
+    Unlike the DrsObjectInternal model, it is not validated, since the database
+    only contains data that has been validated on registration.
+    Only intended for service-internal use.
+    """
+
+    __slots__ = (
+        "id",
+        "file_id",
+        "md5_checksum",
+        "size",
+        "registration_date",
+        "stage_requested_at",
+        "staged_at",
+        "last_verified_at",
+        "grouping_label",
+    )
+
+    def __init__(  # pylint: disable=redefined-builtin,too-many-arguments
+        self,
+        id: UUID,
+        file_id: str,
+        md5_checksum: str,
+        size: Optional[int],
+        registration_date: datetime,
+        stage_requested_at: Optional[datetime] = None,
+        staged_at: Optional[datetime] = None,
+        last_verified_at: Optional[datetime] = None,
+        grouping_label: Optional[str] = None,
+    ):
+        """Initialize with the values of the respective database columns."""
+
+        self.id = id  # pylint: disable=invalid-name
+        self.file_id = file_id
+        self.md5_checksum = md5_checksum
+        self.size = size
+        self.registration_date = registration_date
+        self.stage_requested_at = stage_requested_at
+        self.staged_at = staged_at
+        self.last_verified_at = last_verified_at
+        self.grouping_label = grouping_label
+
+    def __repr__(self) -> str:
+        """Represent the record by its field values."""
+
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"DrsObjectRecord({fields})"
+
+
+class DrsObjectUpdate(BaseModel):
+    """
+    A model describing changes to the metadata of a DrsObject. Fields that are not
+    set remain unchanged.
+    Only intended for service-internal use.
+    """
+
+    file_id: str
+    md5_checksum: Optional[str] = None
+    size: Optional[int] = None
+    registration_date: Optional[datetime] = None
+
+
+class DrsObjectAccesses(BaseModel):
+    """
+    A model describing how often a DrsObject has been requested since the accesses
+    were last recorded and when it was requested last.
+    Only intended for service-internal use.
+    """
+
+    file_id: str
+    count: int
+    last_accessed_at: datetime
+
+
+class DrsObjectsLookup(BaseModel):
+    """
+    The result of looking up multiple DrsObjects by file ID at once.
+    Only intended for service-internal use.
+    """
+
+    found: List[DrsObjectRecord]  # in the order of the requested file IDs
+    missing_file_ids: List[str]
+
+    class Config:
+        """Additional pydantic configs."""
+
+        arbitrary_types_allowed = True
+
+
+class StageRequestState(BaseModel):
+    """
+    Describes the progress of a pending request to stage a DrsObject to the outbox.
+    Only intended for service-internal use.
+    """
+
+    file_id: str
+    size: Optional[int]
+    elapsed: float  # seconds since staging was first requested
+    queue_position: int  # number of stage requests that are pending for longer
+
+
 class AccessURL(BaseModel):
     """Describes the URL for accessing the actual bytes of the object as per the
     DRS OpenApi spec."""
@@ -82,9 +189,11 @@ class AccessURL(BaseModel):
 
 
 class AccessMethod(BaseModel):
-    """A AccessMethod as per the DRS OpenApi spec."""
+    """A AccessMethod as per the DRS OpenApi spec. At least one of `access_url` and
+    `access_id` must be provided."""
 
-    access_url: AccessURL
+    access_url: Optional[AccessURL] = None
+    access_id: Optional[str] = None
     type: Literal["s3"] = "s3"  # currently only s3 is supported
 
 
@@ -104,7 +213,7 @@ class DrsObjectServe(BaseModel):
     user.
     """
 
-    file_id: str  # the file ID
+    id: str  # the file ID
     self_uri: str
     size: Optional[int]
     created_time: str
@@ -120,3 +229,41 @@ class DrsObjectServe(BaseModel):
             ValueError(f"The self_uri '{value}' is no valid DRS URI.")
 
         return value
+
+
+class BulkObjectIds(BaseModel):
+    """
+    A request for resolving multiple DrsObjects at once as per the DRS OpenApi specs.
+    """
+
+    bulk_object_ids: List[str]
+
+
+class UnresolvedDrsObjects(BaseModel):
+    """
+    A group of DrsObjects that could not be resolved for the same reason.
+    The error code is a HTTP status code, i.e. 404 if the DrsObjects do not exist or
+    202 if they are currently staged to the outbox.
+    """
+
+    error_code: int
+    object_ids: List[str]
+
+
+class BulkSummary(BaseModel):
+    """A summary of a bulk request as per the DRS OpenApi specs."""
+
+    requested: int
+    resolved: int
+    unresolved: int
+
+
+class BulkDrsObjectsServe(BaseModel):
+    """
+    A model containing the result of resolving multiple DrsObjects at once as per
+    the DRS OpenApi specs.
+    """
+
+    summary: BulkSummary
+    resolved_drs_object: List[DrsObjectServe]
+    unresolved_drs_objects: List[UnresolvedDrsObjects]
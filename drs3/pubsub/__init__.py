@@ -18,5 +18,21 @@ Subpackage defineing functions for publishing to or subscribing from
 asynchronous messaging topics.
 """
 
-from .publish import publish_drs_object_registered, publish_stage_request  # noqa: F401
+from .batching import (  # noqa: F401
+    StageRequestBatcher,
+    close_stage_request_batchers,
+    get_stage_request_batcher,
+)
+from .publish import (  # noqa: F401
+    publish_drs_object_registered,
+    publish_drs_objects_registered,
+    publish_stage_request,
+    publish_stage_requests,
+)
+from .publisher import (  # noqa: F401
+    AmqpPublisher,
+    PublishError,
+    close_publishers,
+    get_publisher,
+)
 from .subscribe import subscribe_file_registered, subscribe_file_staged  # noqa: F401
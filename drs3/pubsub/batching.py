@@ -0,0 +1,204 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Batching of stage requests (see `stage_request_batching`).
+
+Stage requests are collected by a background thread per process and published as
+one message of the stage request batch topic per batch, so that a request for
+many objects doesn't flood the staging side with as many messages. Like all
+messages, the batches are published by the process-wide AmqpPublisher.
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from ..config import CONFIG, Config
+from . import schemas
+from .publisher import PublishError, get_publisher
+
+# the version of the non_staged_file_requested_batch schema:
+STAGE_REQUEST_BATCH_SCHEMA_VERSION = 1
+
+
+class StageRequestBatcher:
+    """
+    Collects stage request messages and publishes them in batches once
+    `stage_request_batch_window` seconds have passed since the first message of a
+    batch was added or once `stage_request_batch_max_size` messages have been
+    added, whichever comes first.
+    """
+
+    def __init__(self, config: Config = CONFIG):
+        """Initialize without messages and start publishing in the background."""
+
+        self._config = config
+        self._pid = os.getpid()
+
+        self._pending: List[dict] = []
+        self._first_added_at: Optional[float] = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+        self._thread = threading.Thread(
+            target=self._run, name="stage-request-batcher", daemon=True
+        )
+        self._thread.start()
+
+        # publish what is left when the process exits, which requires the publisher
+        # to be closed afterwards, i.e. to be started before (see `atexit`):
+        get_publisher(config).start()
+        atexit.register(self.close)
+
+    def add(self, messages: List[dict]) -> None:
+        """
+        Add stage request messages (that comply with the non_staged_file_requested
+        schema) to the current batch. This never waits for the broker.
+        """
+
+        if not messages:
+            return
+
+        with self._condition:
+            if self._closed:
+                raise PublishError("The stage request batcher has been closed")
+
+            if not self._pending:
+                self._first_added_at = time.monotonic()
+            self._pending.extend(messages)
+            self._condition.notify()
+
+    def _take_batch(self) -> List[dict]:
+        """
+        Wait until a batch is complete and remove it from the pending messages.
+        Once closed, the pending messages are returned right away, an empty batch
+        means that there are none left.
+        """
+
+        batch_window = self._config.stage_request_batch_window
+        max_size = self._config.stage_request_batch_max_size
+
+        with self._condition:
+            while not self._closed:
+                if not self._pending:
+                    self._condition.wait()
+                    continue
+
+                if len(self._pending) >= max_size:
+                    break
+
+                remaining = self._first_added_at + batch_window - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            # the messages that don't fit into this batch are published right
+            # after it, as their window has passed as well:
+            batch = self._pending[:max_size]
+            del self._pending[:max_size]
+
+        return batch
+
+    def _publish(self, batch: List[dict]) -> None:
+        """Publish the batch as one message of the stage request batch topic."""
+
+        message = {
+            "schema_version": STAGE_REQUEST_BATCH_SCHEMA_VERSION,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "files": batch,
+        }
+        get_publisher(self._config).publish(
+            self._config.topic_name_stage_request_batch,
+            message,
+            json_schema=schemas.STAGE_REQUEST_BATCH,
+        )
+
+    def _run(self) -> None:
+        """Publish the batches until closed and all messages have been published."""
+
+        while True:
+            batch = self._take_batch()
+            if not batch:
+                return
+
+            try:
+                self._publish(batch)
+            except Exception as error:  # pylint: disable=broad-except
+                # the stage requests are made again once their claims expire:
+                logging.warning("Could not publish stage requests: %s", error)
+
+    def close(self) -> None:
+        """Publish the pending messages and stop publishing in the background."""
+
+        if self._pid != os.getpid():
+            return
+
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+
+        self._thread.join()
+
+
+_BATCHERS: Dict[Tuple[Any, ...], StageRequestBatcher] = {}
+_BATCHERS_LOCK = threading.Lock()
+
+
+def get_stage_request_batcher(config: Config = CONFIG) -> StageRequestBatcher:
+    """
+    Get the process-wide stage request batcher for the provided config. The batcher
+    is created on first use and shared by all subsequent callers in the same
+    process.
+    """
+
+    key = (
+        os.getpid(),
+        config.rabbitmq_host,
+        config.rabbitmq_port,
+        config.topic_name_stage_request_batch,
+        config.stage_request_batch_window,
+        config.stage_request_batch_max_size,
+    )
+
+    with _BATCHERS_LOCK:
+        batcher = _BATCHERS.get(key)
+        if batcher is None:
+            batcher = StageRequestBatcher(config)
+            _BATCHERS[key] = batcher
+
+    return batcher
+
+
+def close_stage_request_batchers() -> None:
+    """
+    Hand the pending stage requests of all batchers of the current process over to
+    the publishers and forget about all batchers. Batchers inherited from a parent
+    process are dropped without publishing their stage requests, as these are
+    published by the parent. Should be called before closing the publishers.
+    """
+
+    pid = os.getpid()
+
+    with _BATCHERS_LOCK:
+        batchers = [batcher for key, batcher in _BATCHERS.items() if key[0] == pid]
+        _BATCHERS.clear()
+
+    for batcher in batchers:
+        batcher.close()
@@ -13,4 +13,334 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-"""Consuming or Subscribing to Async Messaging Topics"""
+"""
+Consuming or Subscribing to Async Messaging Topics
+
+The ConsumerSupervisor consumes all topics this service subscribes to at once and
+processes the received messages in a pool of worker threads. Messages are assigned
+to the workers by file ID, so that all messages concerning the same file are
+processed one after another in the order they were received, e.g. a file is never
+handled as staged while its registration is still being processed.
+"""
+
+import json
+import logging
+import queue
+import signal
+import threading
+import time
+import zlib
+from functools import partial
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from ghga_service_chassis_lib.pubsub import (
+    AmqpTopic,
+    MaxAttemptsReached,
+    validate_message,
+)
+
+from ..config import CONFIG, Config
+from . import schemas
+from .publisher import close_publishers
+from .subscribe import (
+    process_file_registered_message,
+    process_file_registered_messages,
+    process_file_staged_message,
+)
+
+
+class _Delivery(NamedTuple):
+    """A message received from a topic that is waiting to be processed."""
+
+    consumer: "_TopicConsumer"
+    delivery_tag: int
+    message: dict
+
+
+class _TopicConsumer:
+    """
+    Receives the messages of a topic over its own connection in a dedicated thread
+    and dispatches them to the workers of the supervisor.
+    """
+
+    def __init__(
+        self,
+        topic: AmqpTopic,
+        dispatch: Callable[[_Delivery], None],
+        prefetch: int,
+    ):
+        """Initialize with the topic to consume and the dispatching function."""
+
+        self.topic = topic
+        self._dispatch = dispatch
+        self._prefetch = prefetch
+
+        self._connection, self._channel = self.topic.init_subscriber_queue()
+        self.thread = threading.Thread(
+            target=self._run, name=f"consumer-{topic.topic_name}", daemon=True
+        )
+        self.error: Optional[BaseException] = None
+
+    def _run(self) -> None:
+        """Consume until stopped."""
+
+        try:
+            self._channel.basic_qos(prefetch_count=self._prefetch)
+            self._channel.basic_consume(
+                queue=self.topic.sub_queue_name,
+                on_message_callback=self._on_message,
+            )
+            self._channel.start_consuming()
+        except Exception as error:  # pylint: disable=broad-except
+            self.error = error
+        finally:
+            if self._connection.is_open:
+                self._connection.close()
+
+    def _on_message(self, channel, method, _properties, body: bytes) -> None:
+        """
+        Dispatch a message, unless it doesn't comply with the JSON schema of the
+        topic (see `AmqpTopic.subscribe`).
+        """
+
+        message = json.loads(body)
+        if self.topic.json_schema and not validate_message(
+            message, self.topic.json_schema
+        ):
+            channel.basic_nack(delivery_tag=method.delivery_tag, requeue=False)
+            return
+
+        self._dispatch(_Delivery(self, method.delivery_tag, message))
+
+    def settle(self, delivery_tag: int, success: bool) -> None:
+        """
+        Acknowledge or reject a message. Can be called from any thread, since the
+        channel is only used by the consuming thread.
+        """
+
+        if success:
+            callback = partial(self._channel.basic_ack, delivery_tag=delivery_tag)
+        else:
+            callback = partial(
+                self._channel.basic_nack, delivery_tag=delivery_tag, requeue=False
+            )
+        self._connection.add_callback_threadsafe(callback)
+
+    def stop(self) -> None:
+        """Stop consuming. Can be called from any thread."""
+
+        try:
+            self._connection.add_callback_threadsafe(self._channel.stop_consuming)
+        except Exception:  # pylint: disable=broad-except
+            # the connection has already been closed
+            pass
+
+
+class ConsumerSupervisor:
+    """
+    Consumes the file staged and file registered topics and processes the received
+    messages in `consumer_workers` threads that share the process-wide database,
+    storage, and broker connection pools.
+    Like with `AmqpTopic.subscribe`, a message is rejected if processing it raises a
+    ValueError or MaxAttemptsReached, while any other exception stops the
+    supervisor, leaving unacknowledged messages to be redelivered.
+    """
+
+    def __init__(self, config: Config = CONFIG):
+        """Initialize with the config of the service."""
+
+        self._config = config
+        self._queues: List["queue.Queue[Optional[_Delivery]]"] = [
+            queue.Queue() for _ in range(config.consumer_workers)
+        ]
+        self._workers = [
+            threading.Thread(
+                target=self._work, args=(worker_queue,), name=f"worker-{index}"
+            )
+            for index, worker_queue in enumerate(self._queues)
+        ]
+        self._stopped = threading.Event()
+        self._errors: List[BaseException] = []
+
+        self._processors: Dict[str, Callable[[dict], None]] = {
+            config.topic_name_file_staged: lambda message: process_file_staged_message(
+                message, config=config
+            ),
+            config.topic_name_file_registered: lambda message: (
+                process_file_registered_message(message, config=config)
+            ),
+        }
+        self._consumers: List[_TopicConsumer] = []
+
+    def run(self) -> None:
+        """
+        Consume and process messages until stopped or until processing a message
+        failed unexpectedly, in which case the error is raised.
+        """
+
+        topics = [
+            AmqpTopic(
+                config=self._config,
+                topic_name=self._config.topic_name_file_staged,
+                json_schema=schemas.FILE_STAGED,
+            ),
+            AmqpTopic(
+                config=self._config,
+                topic_name=self._config.topic_name_file_registered,
+                json_schema=schemas.FILE_REGISTERED,
+            ),
+        ]
+
+        for worker in self._workers:
+            worker.start()
+
+        try:
+            for topic in topics:
+                consumer = _TopicConsumer(
+                    topic,
+                    self._dispatch,
+                    # at least one batch is delivered at a time:
+                    prefetch=max(
+                        self._config.consumer_prefetch,
+                        self._config.file_registered_batch_size,
+                    ),
+                )
+                self._consumers.append(consumer)
+                consumer.thread.start()
+
+            while not self._stopped.wait(timeout=1):
+                for consumer in self._consumers:
+                    if not consumer.thread.is_alive():
+                        self._fail(
+                            consumer.error
+                            or RuntimeError(
+                                f"Stopped consuming {consumer.topic.topic_name}"
+                            )
+                        )
+        finally:
+            self.stop()
+            # the workers settle their messages via the connections of the consumers:
+            for worker in self._workers:
+                worker.join()
+            for consumer in self._consumers:
+                consumer.stop()
+                consumer.thread.join()
+
+        if self._errors:
+            raise self._errors[0]
+
+    def stop(self) -> None:
+        """
+        Stop processing messages once the workers finished the messages they already
+        received. Messages received afterwards are left to be redelivered.
+        Can be called from any thread.
+        """
+
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+
+        for worker_queue in self._queues:
+            worker_queue.put(None)
+
+    def _fail(self, error: BaseException) -> None:
+        """Stop because of the provided error."""
+
+        self._errors.append(error)
+        self.stop()
+
+    def _dispatch(self, delivery: _Delivery) -> None:
+        """Pass the delivery on to the worker responsible for its file ID."""
+
+        file_id = delivery.message["file_id"]
+        index = zlib.crc32(file_id.encode("utf-8")) % len(self._queues)
+
+        self._queues[index].put(delivery)
+
+    def _work(self, worker_queue: "queue.Queue[Optional[_Delivery]]") -> None:
+        """
+        Process the deliveries of the queue one after another until stopped. Like
+        with `consume_in_batches`, file registered messages are processed in batches,
+        waiting at most `file_registered_batch_window` seconds for a batch to fill
+        up once its first message has been received.
+        """
+
+        delivery = worker_queue.get()
+        while delivery is not None and not self._errors:
+            batch = [delivery]
+            fetched_next = False
+
+            if self._is_batchable(delivery):
+                deadline = time.monotonic() + self._config.file_registered_batch_window
+                while len(batch) < self._config.file_registered_batch_size:
+                    try:
+                        candidate = worker_queue.get(
+                            timeout=max(deadline - time.monotonic(), 0)
+                        )
+                    except queue.Empty:
+                        break
+                    if candidate is not None and self._is_batchable(candidate):
+                        batch.append(candidate)
+                        continue
+                    delivery, fetched_next = candidate, True
+                    break
+
+            self._process(batch)
+
+            if not fetched_next:
+                delivery = worker_queue.get()
+
+    def _is_batchable(self, delivery: _Delivery) -> bool:
+        """Whether the delivery may be processed together with others."""
+
+        return (
+            self._config.file_registered_batch_size > 1
+            and delivery.consumer.topic.topic_name
+            == self._config.topic_name_file_registered
+        )
+
+    def _process(self, batch: List[_Delivery]) -> None:
+        """
+        Process the deliveries, which all belong to the same topic, and acknowledge
+        or reject them.
+        """
+
+        try:
+            if len(batch) == 1:
+                topic_name = batch[0].consumer.topic.topic_name
+                self._processors[topic_name](batch[0].message)
+            else:
+                process_file_registered_messages(
+                    [delivery.message for delivery in batch], config=self._config
+                )
+        except (MaxAttemptsReached, ValueError):
+            if len(batch) > 1:
+                # process one by one, so that only the failing ones are rejected:
+                for delivery in batch:
+                    self._process([delivery])
+                return
+            batch[0].consumer.settle(batch[0].delivery_tag, success=False)
+            return
+        except Exception as error:  # pylint: disable=broad-except
+            logging.exception("Processing a message failed, stopping.")
+            self._fail(error)
+            return
+
+        for delivery in batch:
+            delivery.consumer.settle(delivery.delivery_tag, success=True)
+
+
+def run(config: Config = CONFIG) -> None:
+    """
+    Starts the consumers of all topics
+    """
+
+    supervisor = ConsumerSupervisor(config=config)
+
+    # finish the messages in progress when asked to terminate:
+    signal.signal(signal.SIGTERM, lambda _signum, _frame: supervisor.stop())
+
+    try:
+        supervisor.run()
+    finally:
+        close_publishers()
@@ -15,54 +15,85 @@
 
 """
 Publish asynchronous topics
+
+All messages are published in the background by the process-wide AmqpPublisher.
 """
 
+from concurrent.futures import wait
 from pathlib import Path
+from typing import List
 
-from ghga_service_chassis_lib.pubsub import AmqpTopic
+from ghga_service_chassis_lib.pubsub import validate_message
 
 from .. import models
 from ..config import CONFIG, Config
 from . import schemas
+from .batching import get_stage_request_batcher
+from .publisher import PublishError, get_publisher
 
 HERE = Path(__file__).parent.resolve()
 
 
-def publish_stage_request(
-    drs_object: models.DrsObjectInternal, config: Config = CONFIG
-):
+def _get_stage_request_message(drs_object: models.DrsObjectRecord) -> dict:
     """
-    Publishes a message to a specified topic
+    Builds the message requesting to stage the specified drs object
     """
 
-    topic_name = config.topic_name_stage_request
-
     message = {
         "request_id": "",
         "file_id": drs_object.file_id,
         "timestamp": drs_object.registration_date.isoformat(),
     }
+    if drs_object.grouping_label is not None:
+        message["grouping_label"] = drs_object.grouping_label
 
-    # create a topic object:
-    topic = AmqpTopic(
-        config=config,
-        topic_name=topic_name,
-        json_schema=schemas.STAGE_REQUEST,
-    )
+    return message
 
-    topic.publish(message)
 
+def publish_stage_request(drs_object: models.DrsObjectRecord, config: Config = CONFIG):
+    """
+    Publishes a message to a specified topic
+    """
 
-def publish_drs_object_registered(
-    drs_object: models.DrsObjectInitial, config: Config = CONFIG
+    publish_stage_requests([drs_object], config=config)
+
+
+def publish_stage_requests(
+    drs_objects: List[models.DrsObjectRecord], config: Config = CONFIG
 ):
     """
-    Publishes a message to a specified topic
+    Publishes one stage request message per drs object to the stage request topic,
+    without waiting for the broker. If `stage_request_batching` is set, the messages
+    are handed over to the process-wide batcher instead.
     """
 
-    topic_name = config.topic_name_drs_object_registered
+    if not drs_objects:
+        return
 
-    message = {
+    topic_name = config.topic_name_stage_request
+
+    # validate all messages before publishing any of them:
+    messages = [_get_stage_request_message(drs_object) for drs_object in drs_objects]
+    for message in messages:
+        validate_message(message, schemas.STAGE_REQUEST, raise_on_exception=True)
+
+    if config.stage_request_batching:
+        get_stage_request_batcher(config).add(messages)
+        return
+
+    publisher = get_publisher(config)
+    for message in messages:
+        publisher.publish(topic_name, message)
+
+
+def _get_drs_object_registered_message(
+    drs_object: models.DrsObjectInitial, config: Config
+) -> dict:
+    """
+    Builds the message announcing that the specified drs object has been registered
+    """
+
+    return {
         "request_id": "",
         "file_id": drs_object.file_id,
         "timestamp": drs_object.registration_date.isoformat(),
@@ -70,11 +101,48 @@ def publish_drs_object_registered(
         "drs_uri": f"{config.drs_self_url}/{drs_object.file_id}",
     }
 
-    # create a topic object:
-    topic = AmqpTopic(
-        config=config,
-        topic_name=topic_name,
-        json_schema=schemas.DRS_OBJECT_REGISTERED,
-    )
 
-    topic.publish(message)
+def publish_drs_object_registered(
+    drs_object: models.DrsObjectInitial, config: Config = CONFIG
+):
+    """
+    Publishes a message to a specified topic and waits for the broker to confirm it
+    """
+
+    publish_drs_objects_registered([drs_object], config=config)
+
+
+def publish_drs_objects_registered(
+    drs_objects: List[models.DrsObjectInitial], config: Config = CONFIG
+):
+    """
+    Publishes one message per drs object to the drs object registered topic and
+    waits for the broker to confirm all of them
+    """
+
+    if not drs_objects:
+        return
+
+    topic_name = config.topic_name_drs_object_registered
+
+    messages = [
+        _get_drs_object_registered_message(drs_object, config)
+        for drs_object in drs_objects
+    ]
+    for message in messages:
+        validate_message(
+            message, schemas.DRS_OBJECT_REGISTERED, raise_on_exception=True
+        )
+
+    # the messages that caused the registrations must not be acknowledged before
+    # these ones are safely published:
+    publisher = get_publisher(config)
+    futures = [publisher.publish(topic_name, message) for message in messages]
+    done, not_done = wait(futures, timeout=config.amqp_publish_timeout)
+    if not_done:
+        raise PublishError(
+            f"{len(not_done)} messages to topic {topic_name} were not confirmed "
+            + f"within {config.amqp_publish_timeout} seconds"
+        )
+    for future in done:
+        future.result()
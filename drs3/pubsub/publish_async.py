@@ -0,0 +1,135 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Publish asynchronous topics without blocking the event loop. Requires the `asgi`
+extra.
+
+Messages are published over a robust connection that is shared within the event
+loop, the counterpart of the connection of the AmqpPublisher that is shared by the
+threads of a process. Publisher confirms (see `amqp_publisher_confirms`) are
+awaited when publishing.
+"""
+
+import asyncio
+import json
+from typing import Any, Dict, List, Tuple
+
+import aio_pika
+from ghga_service_chassis_lib.pubsub import validate_message
+
+from .. import models
+from ..config import CONFIG, Config
+from . import schemas
+from .batching import get_stage_request_batcher
+from .publish import _get_stage_request_message
+
+_CONNECTIONS: Dict[Tuple[Any, ...], aio_pika.RobustConnection] = {}
+_EXCHANGES: Dict[Tuple[Any, ...], aio_pika.Exchange] = {}
+_LOCKS: Dict[int, asyncio.Lock] = {}
+
+
+async def _get_exchange(topic_name: str, config: Config) -> aio_pika.Exchange:
+    """
+    Get the exchange of the specified topic on the connection that is shared within
+    the running event loop. The connection and the exchange are created on first use.
+    """
+
+    loop_id = id(asyncio.get_running_loop())
+    connection_key = (loop_id, config.rabbitmq_host, config.rabbitmq_port)
+    exchange_key = (*connection_key, topic_name)
+
+    exchange = _EXCHANGES.get(exchange_key)
+    if exchange is not None:
+        return exchange
+
+    # make sure that concurrent first uses do not open multiple connections:
+    async with _LOCKS.setdefault(loop_id, asyncio.Lock()):
+        connection = _CONNECTIONS.get(connection_key)
+        if connection is None:
+            connection = await aio_pika.connect_robust(
+                host=config.rabbitmq_host, port=config.rabbitmq_port
+            )
+            _CONNECTIONS[connection_key] = connection
+
+        exchange = _EXCHANGES.get(exchange_key)
+        if exchange is None:
+            channel = await connection.channel(
+                publisher_confirms=config.amqp_publisher_confirms
+            )
+            exchange = await channel.declare_exchange(
+                topic_name, aio_pika.ExchangeType.TOPIC
+            )
+            _EXCHANGES[exchange_key] = exchange
+
+    return exchange
+
+
+async def dispose_amqp_connections() -> None:
+    """
+    Close all broker connections that have been opened within the running event loop
+    and forget about them.
+    """
+
+    loop_id = id(asyncio.get_running_loop())
+
+    for key in [key for key in _EXCHANGES if key[0] == loop_id]:
+        del _EXCHANGES[key]
+    for key in [key for key in _CONNECTIONS if key[0] == loop_id]:
+        await _CONNECTIONS.pop(key).close()
+    _LOCKS.pop(loop_id, None)
+
+
+async def publish_stage_requests_async(
+    drs_objects: List[models.DrsObjectRecord], config: Config = CONFIG
+):
+    """
+    Publishes one stage request message per drs object to the stage request topic.
+    If `stage_request_batching` is set, the messages are handed over to the
+    process-wide batcher instead, which doesn't block the event loop.
+    """
+
+    if not drs_objects:
+        return
+
+    topic_name = config.topic_name_stage_request
+
+    messages = [_get_stage_request_message(drs_object) for drs_object in drs_objects]
+    for message in messages:
+        validate_message(message, schemas.STAGE_REQUEST, raise_on_exception=True)
+
+    if config.stage_request_batching:
+        get_stage_request_batcher(config).add(messages)
+        return
+
+    exchange = await _get_exchange(topic_name, config)
+    for message in messages:
+        await exchange.publish(
+            aio_pika.Message(
+                body=json.dumps(message).encode("utf-8"),
+                delivery_mode=aio_pika.DeliveryMode.PERSISTENT,
+            ),
+            routing_key=topic_name,
+        )
+
+
+async def publish_stage_request_async(
+    drs_object: models.DrsObjectRecord, config: Config = CONFIG
+):
+    """
+    Publishes a message to a specified topic
+    """
+
+    await publish_stage_requests_async([drs_object], config=config)
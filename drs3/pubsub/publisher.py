@@ -0,0 +1,448 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Publish messages in the background over a long-lived broker connection.
+
+`AmqpTopic.publish` opens a connection and a channel and declares the exchange for
+every single message. Instead, the AmqpPublisher hands messages over to a
+background thread that keeps one connection per process open (reconnecting if it
+is lost), declares every exchange only once per channel, and, if enabled, lets the
+broker confirm the messages without waiting for one confirmation before sending
+the next message.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+
+import pika
+from ghga_service_chassis_lib.pubsub import validate_message
+
+from ..config import CONFIG, Config
+
+
+class PublishError(RuntimeError):
+    """Thrown when a message could not be published."""
+
+
+class _Message:
+    """A message waiting to be published (and confirmed)."""
+
+    __slots__ = ("topic_name", "body", "future")
+
+    def __init__(self, topic_name: str, body: bytes):
+        """Initialize with the topic and the serialized message."""
+
+        self.topic_name = topic_name
+        self.body = body
+        self.future: "Future[None]" = Future()
+
+
+class AmqpPublisher:
+    """
+    Publishes messages to topics from a background thread that owns a long-lived
+    connection to the broker. Messages are buffered in a queue of limited size
+    until they have been sent, so that publishing does not wait for the broker.
+    At most as many messages as fit into the queue are sent but not yet confirmed,
+    further messages stay queued until the broker has caught up.
+    If the connection is lost, it is reestablished and all messages that have not
+    been confirmed yet are sent again.
+    """
+
+    def __init__(self, config: Config = CONFIG):
+        """Initialize with the config parameters needed to connect to the broker."""
+
+        self._config = config
+        self._parameters = pika.ConnectionParameters(
+            host=config.rabbitmq_host, port=config.rabbitmq_port
+        )
+        self._pid = os.getpid()
+        self._queue: "queue.Queue[_Message]" = queue.Queue(
+            maxsize=config.amqp_publish_queue_size
+        )
+        self._closing = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self._connection: Optional[pika.SelectConnection] = None
+
+        # only accessed by the background thread:
+        self._channel: Optional[Any] = None
+        self._declared: Set[str] = set()
+        self._pending: Dict[str, List[_Message]] = {}
+        self._unconfirmed: "OrderedDict[int, _Message]" = OrderedDict()
+        self._delivery_tag = 0
+        self._retry: Deque[_Message] = deque()
+
+    def publish(
+        self, topic_name: str, message: dict, json_schema: Optional[dict] = None
+    ) -> "Future[None]":
+        """
+        Publish a message to the topic in the background. The message is validated
+        against the JSON schema, if provided.
+        Returns a future that is resolved once the message has been confirmed by
+        the broker (or sent, if publisher confirms are disabled). A PublishError is
+        raised if the message can't be queued within `amqp_publish_timeout` seconds.
+        """
+
+        if json_schema:
+            validate_message(message, json_schema, raise_on_exception=True)
+
+        if self._closing.is_set():
+            raise PublishError("The publisher has been closed")
+
+        item = _Message(topic_name, json.dumps(message).encode("utf-8"))
+
+        self.start()
+        try:
+            self._queue.put(item, timeout=self._config.amqp_publish_timeout)
+        except queue.Full as error:
+            raise PublishError(
+                f"Could not queue a message to topic {topic_name}, "
+                + "the broker does not keep up"
+            ) from error
+        self._wake()
+
+        return item.future
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait until all queued messages have been published. Returns whether this was
+        the case before the timeout (in seconds) expired.
+        """
+
+        with self._queue.all_tasks_done:
+            return self._queue.all_tasks_done.wait_for(
+                lambda: not self._queue.unfinished_tasks, timeout=timeout
+            )
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        Publish all queued messages (waiting at most `timeout` seconds, defaulting to
+        `amqp_publish_timeout`) and close the connection.
+        """
+
+        if self._thread is None or self._closing.is_set() or self._pid != os.getpid():
+            return
+
+        timeout = self._config.amqp_publish_timeout if timeout is None else timeout
+        self.flush(timeout)
+
+        self._closing.set()
+        self._call_threadsafe(self._close_connection)
+        self._thread.join(timeout)
+
+    def start(self) -> None:
+        """
+        Start the background thread, unless it is already running. This happens on
+        the first call of `publish`, but may be done before, e.g. to make sure that
+        handlers run at exit before the publisher is closed (which is registered to
+        run at exit on start).
+        """
+
+        with self._thread_lock:
+            if self._thread is not None:
+                return
+
+            self._thread = threading.Thread(
+                target=self._run, name="amqp-publisher", daemon=True
+            )
+            self._thread.start()
+
+        # publish what is left when the process exits:
+        atexit.register(self.close)
+
+    def _call_threadsafe(self, callback) -> None:
+        """Schedule the callback on the I/O loop of the background thread."""
+
+        connection = self._connection
+        if connection is None:
+            # between connections, queued messages are sent once reconnected
+            return
+
+        try:
+            connection.ioloop.add_callback_threadsafe(callback)
+        except Exception:  # pylint: disable=broad-except
+            # the connection has just been closed, see above
+            pass
+
+    def _wake(self) -> None:
+        """Make the background thread send the queued messages."""
+
+        self._call_threadsafe(self._drain)
+
+    def _run(self) -> None:
+        """
+        Run the I/O loop of the connection and reconnect after
+        `amqp_reconnect_delay` seconds whenever the connection is lost.
+        """
+
+        while not self._closing.is_set():
+            connection = pika.SelectConnection(
+                self._parameters,
+                on_open_callback=self._on_connection_open,
+                on_open_error_callback=self._on_connection_open_error,
+                on_close_callback=self._on_connection_closed,
+            )
+            self._connection = connection
+            connection.ioloop.start()
+
+            self._connection = None
+            connection.ioloop.close()
+
+            self._closing.wait(self._config.amqp_reconnect_delay)
+
+    def _close_connection(self) -> None:
+        """Close the connection, which stops the I/O loop."""
+
+        connection = self._connection
+        if connection is not None and not (
+            connection.is_closing or connection.is_closed
+        ):
+            connection.close()
+
+    def _on_connection_open(self, connection: pika.SelectConnection) -> None:
+        """Open a channel once connected."""
+
+        connection.channel(on_open_callback=self._on_channel_open)
+
+    def _on_connection_open_error(
+        self, connection: pika.SelectConnection, error: BaseException
+    ) -> None:
+        """Stop the I/O loop, so that the connection is retried."""
+
+        logging.warning("Could not connect to the broker: %s", error)
+        connection.ioloop.stop()
+
+    def _on_connection_closed(
+        self, connection: pika.SelectConnection, reason: BaseException
+    ) -> None:
+        """Stop the I/O loop, so that the connection is retried."""
+
+        if not self._closing.is_set():
+            logging.warning("Lost the connection to the broker: %s", reason)
+
+        self._reset_channel()
+        connection.ioloop.stop()
+
+    def _on_channel_open(self, channel: Any) -> None:
+        """Enable publisher confirms, if requested, and start sending."""
+
+        channel.add_on_close_callback(self._on_channel_closed)
+
+        def on_ready(_frame: Any = None) -> None:
+            self._channel = channel
+            self._drain()
+
+        if self._config.amqp_publisher_confirms:
+            channel.confirm_delivery(
+                ack_nack_callback=self._on_confirmation, callback=on_ready
+            )
+        else:
+            on_ready()
+
+    def _on_channel_closed(self, _channel: Any, reason: BaseException) -> None:
+        """Reconnect, since the channel was closed due to an error."""
+
+        logging.warning("The broker closed the publishing channel: %s", reason)
+
+        self._reset_channel()
+        self._close_connection()
+
+    def _reset_channel(self) -> None:
+        """Forget the channel and send all messages in flight again later on."""
+
+        self._channel = None
+        self._declared.clear()
+        self._delivery_tag = 0
+
+        in_flight = list(self._unconfirmed.values())
+        for pending in self._pending.values():
+            in_flight.extend(pending)
+        self._unconfirmed.clear()
+        self._pending.clear()
+
+        self._retry.extendleft(reversed(in_flight))
+
+    def _in_flight(self) -> int:
+        """Count the messages that have been taken from the queue but not resolved."""
+
+        return (
+            len(self._unconfirmed)
+            + len(self._retry)
+            + sum(len(pending) for pending in self._pending.values())
+        )
+
+    def _drain(self) -> None:
+        """
+        Send all messages waiting to be sent again and as many queued messages as
+        the limit of messages in flight allows.
+        """
+
+        while self._channel is not None and self._retry:
+            self._send(self._retry.popleft())
+
+        while (
+            self._channel is not None
+            and self._in_flight() < self._config.amqp_publish_queue_size
+        ):
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            self._send(item)
+
+    def _send(self, item: _Message) -> None:
+        """
+        Send the message on the channel, after declaring the exchange of its topic
+        if necessary.
+        """
+
+        if self._channel is None:
+            self._retry.append(item)
+            return
+
+        topic_name = item.topic_name
+
+        if topic_name not in self._declared:
+            pending = self._pending.get(topic_name)
+            if pending is None:
+                self._pending[topic_name] = [item]
+                self._channel.exchange_declare(
+                    exchange=topic_name,
+                    exchange_type="topic",
+                    callback=lambda _frame: self._on_exchange_declared(topic_name),
+                )
+            else:
+                pending.append(item)
+            return
+
+        try:
+            self._channel.basic_publish(
+                exchange=topic_name,
+                routing_key=topic_name,
+                body=item.body,
+                properties=pika.BasicProperties(delivery_mode=2),
+            )
+        except pika.exceptions.AMQPError:
+            self._retry.append(item)
+            return
+
+        if self._config.amqp_publisher_confirms:
+            self._delivery_tag += 1
+            self._unconfirmed[self._delivery_tag] = item
+        else:
+            self._resolve(item)
+
+    def _on_exchange_declared(self, topic_name: str) -> None:
+        """Send the messages that waited for the exchange to be declared."""
+
+        self._declared.add(topic_name)
+
+        for item in self._pending.pop(topic_name, []):
+            self._send(item)
+
+    def _on_confirmation(self, frame: Any) -> None:
+        """Resolve the messages that the broker acknowledged or rejected."""
+
+        method = frame.method
+        delivery_tags: List[int] = (
+            [tag for tag in self._unconfirmed if tag <= method.delivery_tag]
+            if method.multiple
+            else [method.delivery_tag]
+        )
+        rejected = isinstance(method, pika.spec.Basic.Nack)
+
+        for delivery_tag in delivery_tags:
+            item = self._unconfirmed.pop(delivery_tag, None)
+            if item is None:
+                continue
+            self._resolve(
+                item,
+                (
+                    PublishError(f"The broker rejected a message to {item.topic_name}")
+                    if rejected
+                    else None
+                ),
+            )
+
+        # send the messages that waited for others to be confirmed:
+        self._drain()
+
+    def _resolve(self, item: _Message, error: Optional[PublishError] = None) -> None:
+        """Resolve the future of a message that has been dealt with."""
+
+        if error is None:
+            item.future.set_result(None)
+        else:
+            logging.warning("%s", error)
+            item.future.set_exception(error)
+
+        self._queue.task_done()
+
+
+_PUBLISHERS: Dict[Tuple[Any, ...], AmqpPublisher] = {}
+_PUBLISHERS_LOCK = threading.Lock()
+
+
+def get_publisher(config: Config = CONFIG) -> AmqpPublisher:
+    """
+    Get the process-wide publisher for the provided config. The publisher (and with
+    it the connection to the broker) is created on first use and shared by all
+    subsequent callers in the same process.
+    """
+
+    key = (
+        os.getpid(),
+        config.rabbitmq_host,
+        config.rabbitmq_port,
+        config.amqp_publisher_confirms,
+        config.amqp_publish_queue_size,
+        config.amqp_publish_timeout,
+        config.amqp_reconnect_delay,
+    )
+
+    with _PUBLISHERS_LOCK:
+        publisher = _PUBLISHERS.get(key)
+        if publisher is None:
+            publisher = AmqpPublisher(config)
+            _PUBLISHERS[key] = publisher
+
+    return publisher
+
+
+def close_publishers() -> None:
+    """
+    Publish the queued messages and close the connections of all publishers of the
+    current process and forget about all publishers. Publishers inherited from a
+    parent process are dropped without closing them.
+    """
+
+    pid = os.getpid()
+
+    with _PUBLISHERS_LOCK:
+        publishers = [
+            publisher for key, publisher in _PUBLISHERS.items() if key[0] == pid
+        ]
+        _PUBLISHERS.clear()
+
+    for publisher in publishers:
+        publisher.close()
@@ -20,4 +20,5 @@ from .read_schemas import (  # noqa: F401
     FILE_REGISTERED,
     FILE_STAGED,
     STAGE_REQUEST,
+    STAGE_REQUEST_BATCH,
 )
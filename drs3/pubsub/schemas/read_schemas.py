@@ -29,6 +29,7 @@ def read_schema(topic_name: str) -> Dict[str, object]:
 
 
 STAGE_REQUEST = read_schema("non_staged_file_requested")
+STAGE_REQUEST_BATCH = read_schema("non_staged_file_requested_batch")
 FILE_STAGED = read_schema("file_staged_for_download")
 FILE_REGISTERED = read_schema("file_internally_registered")
 DRS_OBJECT_REGISTERED = read_schema("drs_object_registered")
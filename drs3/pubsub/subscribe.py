@@ -17,15 +17,24 @@
 Subscriptions to async topics
 """
 
+import json
+import time
+from collections import deque
 from pathlib import Path
+from typing import Callable, Deque, List, Tuple
 
-from ghga_service_chassis_lib.pubsub import AmqpTopic
+from ghga_service_chassis_lib.pubsub import (
+    AmqpTopic,
+    MaxAttemptsReached,
+    validate_message,
+)
 
 from ..config import CONFIG, Config
-from ..core import handle_registered_file, handle_staged_file
+from ..core import handle_registered_file, handle_registered_files, handle_staged_file
+from ..metrics import observe_message
 from ..models import DrsObjectInitial
 from . import schemas
-from .publish import publish_drs_object_registered
+from .publish import publish_drs_object_registered, publish_drs_objects_registered
 
 HERE = Path(__file__).parent.resolve()
 
@@ -36,7 +45,8 @@ def process_file_staged_message(message: dict, config):
     otherwise throwing an error
     """
 
-    handle_staged_file(message=message, config=config)
+    with observe_message(config.topic_name_file_staged):
+        handle_staged_file(message=message, config=config)
 
 
 def process_file_registered_message(
@@ -48,20 +58,125 @@ def process_file_registered_message(
     publish that the drs_object was registered
     """
 
-    # we add a fictional size for testing purposes, size is currently not used
-    drs_object = DrsObjectInitial(
+    with observe_message(config.topic_name_file_registered):
+        handle_registered_file(
+            drs_object=_get_registered_drs_object(message),
+            publish_object_registered=publish_drs_object_registered,
+            config=config,
+        )
+
+
+def process_file_registered_messages(messages: List[dict], config: Config):
+    """
+    Processes a batch of messages, add all files to database at once and
+    publish that the drs_objects were registered
+    """
+
+    with observe_message(config.topic_name_file_registered, count=len(messages)):
+        handle_registered_files(
+            drs_objects=[_get_registered_drs_object(message) for message in messages],
+            publish_objects_registered=publish_drs_objects_registered,
+            config=config,
+        )
+
+
+def _get_registered_drs_object(message: dict) -> DrsObjectInitial:
+    """
+    Get the drs object to be registered from a message of the file registered topic
+    """
+
+    # the size is not part of the message, it is recorded once the file is staged:
+    return DrsObjectInitial(
         file_id=message["file_id"],
         md5_checksum=message["md5_checksum"],
         registration_date=message["timestamp"],
-        size=1000,
+        grouping_label=message.get("grouping_label"),
     )
 
-    handle_registered_file(
-        drs_object=drs_object,
-        publish_object_registered=publish_drs_object_registered,
-        config=config,
+
+def consume_in_batches(  # pylint: disable=too-many-arguments
+    topic: AmqpTopic,
+    process_batch: Callable[[List[dict]], None],
+    batch_size: int,
+    batch_window: float,
+    prefetch: int,
+    run_forever: bool = True,
+) -> None:
+    """
+    Subscribe to a topic and process the received messages in batches of up to
+    `batch_size` messages, waiting at most `batch_window` seconds for a batch to
+    fill up once its first message has been received. The broker delivers up to
+    `prefetch` unacknowledged messages at a time, so that the next batch is
+    received while the current one is processed.
+
+    Like with `AmqpTopic.subscribe`, messages that don't comply with the JSON schema
+    of the topic are rejected. The remaining messages of a batch are acknowledged
+    together once `process_batch` returned. If it raises a ValueError or
+    MaxAttemptsReached, the messages are processed again one by one, so that only
+    the failing ones are rejected. Any other exception is raised, leaving the
+    messages of the batch to be redelivered.
+    If `run_forever` is False, only the first batch is processed.
+    """
+
+    connection, channel = topic.init_subscriber_queue()
+    channel.basic_qos(prefetch_count=max(prefetch, batch_size))
+
+    deliveries: Deque[Tuple[int, bytes]] = deque()
+    channel.basic_consume(
+        queue=topic.sub_queue_name,
+        on_message_callback=lambda _channel, method, _properties, body: (
+            deliveries.append((method.delivery_tag, body))
+        ),
     )
 
+    def settle(batch: List[Tuple[int, dict]]):
+        """Process the batch and acknowledge or reject its messages."""
+
+        try:
+            process_batch([message for _, message in batch])
+        except (MaxAttemptsReached, ValueError):
+            if len(batch) == 1:
+                channel.basic_nack(delivery_tag=batch[0][0], requeue=False)
+                return
+            for delivery in batch:
+                settle([delivery])
+            return
+
+        # the delivery tags increase, so this acknowledges the whole batch:
+        channel.basic_ack(delivery_tag=batch[-1][0], multiple=True)
+
+    try:
+        while True:
+            # wait for the first message of the next batch:
+            while not deliveries:
+                connection.process_data_events(time_limit=None)
+
+            deadline = time.monotonic() + batch_window
+            while len(deliveries) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                connection.process_data_events(time_limit=remaining)
+
+            batch: List[Tuple[int, dict]] = []
+            for _ in range(min(batch_size, len(deliveries))):
+                delivery_tag, body = deliveries.popleft()
+                message = json.loads(body)
+                if topic.json_schema and not validate_message(
+                    message, topic.json_schema
+                ):
+                    channel.basic_nack(delivery_tag=delivery_tag, requeue=False)
+                    continue
+                batch.append((delivery_tag, message))
+
+            if batch:
+                settle(batch)
+
+            if not run_forever:
+                return
+    finally:
+        connection.close()
+
 
 def subscribe_file_staged(config: Config = CONFIG, run_forever: bool = True) -> None:
     """
@@ -90,6 +205,7 @@ def subscribe_file_registered(
 ) -> None:
     """
     Runs a subscribing process for the "file_staged_for_download topic"
+    Messages are processed in batches if `file_registered_batch_size` exceeds one.
     """
 
     # create a topic object:
@@ -99,6 +215,19 @@ def subscribe_file_registered(
         json_schema=schemas.FILE_REGISTERED,
     )
 
+    if config.file_registered_batch_size > 1:
+        consume_in_batches(
+            topic,
+            process_batch=lambda messages: process_file_registered_messages(
+                messages, config=config
+            ),
+            batch_size=config.file_registered_batch_size,
+            batch_window=config.file_registered_batch_window,
+            prefetch=config.consumer_prefetch,
+            run_forever=run_forever,
+        )
+        return
+
     # subscribe:
     topic.subscribe(
         exec_on_message=lambda message: process_file_registered_message(
@@ -34,17 +34,21 @@ from datetime import datetime
 from typing import Generator, List
 
 import pytest
-from ghga_service_chassis_lib.postgresql import PostgresqlConfigBase
 from ghga_service_chassis_lib.postgresql_testing import config_from_psql_container
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from testcontainers.postgres import PostgresContainer
 
 from drs3 import models
+from drs3.config import Config
+from drs3.core.access_tracker import close_access_trackers
+from drs3.core.cache import clear_caches
 from drs3.dao import db_models
-from drs3.dao.db import PostgresDatabase
+from drs3.dao.db import PostgresDatabase, dispose_postgresql_connectors
+from drs3.dao.listener import stop_change_listeners
 
 from . import state
+from .config import get_config
 
 existing_file_infos: List[models.DrsObjectInitial] = []
 non_existing_file_infos: List[models.DrsObjectInitial] = []
@@ -80,7 +84,7 @@ def populate_db(db_url: str, file_infos: List[models.DrsObjectInitial]):
 class PsqlState:
     """Info yielded by the `psql_fixture` function"""
 
-    config: PostgresqlConfigBase
+    config: Config
     database: PostgresDatabase
     existing_file_infos: List[models.DrsObjectInitial]
     non_existing_file_infos: List[models.DrsObjectInitial]
@@ -91,7 +95,7 @@ def psql_fixture() -> Generator[PsqlState, None, None]:
     """Pytest fixture for tests of the Prostgres DAO implementation."""
 
     with PostgresContainer() as postgres:
-        config = config_from_psql_container(postgres)
+        config = get_config(sources=[config_from_psql_container(postgres)])
         populate_db(config.db_url, file_infos=existing_file_infos)
 
         with PostgresDatabase(config) as database:
@@ -101,3 +105,10 @@ def psql_fixture() -> Generator[PsqlState, None, None]:
                 existing_file_infos=existing_file_infos,
                 non_existing_file_infos=non_existing_file_infos,
             )
+
+        # close the pooled and listening connections to this container and forget
+        # anything cached about its content:
+        close_access_trackers()
+        dispose_postgresql_connectors()
+        stop_change_listeners()
+        clear_caches()
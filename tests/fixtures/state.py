@@ -72,7 +72,6 @@ class FileState:
             file_id=self.file_id,
             grouping_label=self.grouping_label,
             md5_checksum=self.md5,
-            size=1000,  # not the real size
             registration_date=datetime.now().isoformat(),
         )
 
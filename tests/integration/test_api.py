@@ -33,3 +33,25 @@ class TestBase(BaseIntegrationTest):
         """The health check should be up, running and served on /health"""
         response = self.testapp.get("/health", status=200)
         assert response.json == {"status": "OK"}
+
+    def test_metrics(self):
+        """Request metrics should be served on /metrics in the Prometheus format"""
+        self.testapp.get("/health", status=200)
+        self.testapp.get("/does_not_exist", status=404)
+
+        response = self.testapp.get("/metrics", status=200)
+        assert response.content_type == "text/plain"
+        assert 'drs3_requests_total{route="unmatched",status="404"}' in response.text
+        assert 'route="health"' not in response.text
+
+    def test_bulk_objects_too_many_ids(self):
+        """Bulk requests exceeding the maximum number of IDs should be rejected"""
+        object_ids = [
+            f"myfile-{index}" for index in range(self.config.bulk_max_object_ids + 1)
+        ]
+        response = self.testapp.post_json(
+            f"{self.config.api_route}/objects",
+            {"bulk_object_ids": object_ids},
+            status=413,
+        )
+        assert response.json["status_code"] == 413
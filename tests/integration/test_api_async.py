@@ -0,0 +1,67 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the ASGI app"""
+
+import unittest
+
+from fastapi.testclient import TestClient
+
+from drs3.api.main_async import get_app
+from drs3.config import CONFIG, Config
+
+
+class TestAsyncBase(unittest.TestCase):
+    """Test whether Basic API functions of the ASGI app are reachable."""
+
+    def setUp(self):
+        """Setup Test Server"""
+        self.config: Config = CONFIG
+        self.client = TestClient(get_app(config=self.config))
+
+    def tearDown(self):
+        """Teardown Test Server"""
+        del self.client
+
+    def test_health(self):
+        """The health check should be up, running and served on /health"""
+        response = self.client.get("/health")
+        assert response.status_code == 200
+        assert response.json() == {"status": "OK"}
+
+    def test_spec_served(self):
+        """The OpenAPI spec should be served next to the API explorer"""
+        response = self.client.get(f"{self.config.api_route}/openapi.yaml")
+        assert response.status_code == 200
+        assert "Data Repository Service" in response.text
+
+    def test_invalid_request(self):
+        """Requests violating the OpenAPI spec should be rejected"""
+        response = self.client.post(
+            f"{self.config.api_route}/objects", json={"bulk_object_ids": []}
+        )
+        assert response.status_code == 400
+        assert response.json()["status_code"] == 400
+
+    def test_bulk_objects_too_many_ids(self):
+        """Bulk requests exceeding the maximum number of IDs should be rejected"""
+        object_ids = [
+            f"myfile-{index}" for index in range(self.config.bulk_max_object_ids + 1)
+        ]
+        response = self.client.post(
+            f"{self.config.api_route}/objects", json={"bulk_object_ids": object_ids}
+        )
+        assert response.status_code == 413
+        assert response.json()["status_code"] == 413
@@ -16,11 +16,13 @@
 
 """Test the messaging API (pubsub)"""
 
+import threading
 from typing import Any, Callable, Dict
 
 from ghga_service_chassis_lib.utils import exec_with_timeout
 
 from drs3.pubsub import schemas, subscribe_file_registered
+from drs3.pubsub.main import ConsumerSupervisor
 
 from ..fixtures import (  # noqa: F401
     DEFAULT_CONFIG,
@@ -89,3 +91,74 @@ def test_subscribe_stage_requests(psql_fixture, s3_fixture, amqp_fixture):  # no
         s3_fixture=s3_fixture,
         amqp_fixture=amqp_fixture,
     )
+
+
+def test_subscribe_file_registered_batched(
+    psql_fixture, s3_fixture, amqp_fixture  # noqa: F811
+):
+    """Test `subscribe_file_registered` processing messages in batches"""
+
+    config = get_config(
+        sources=[psql_fixture.config, s3_fixture.config, amqp_fixture.config]
+    ).copy(
+        update={
+            "file_registered_batch_size": 10,
+            "file_registered_batch_window": 0.5,
+            "consumer_prefetch": 20,
+        }
+    )
+
+    upstream_publisher = amqp_fixture.get_test_publisher(
+        topic_name=config.topic_name_file_registered,
+        message_schema=schemas.FILE_REGISTERED,
+    )
+    downstream_subscriber = amqp_fixture.get_test_subscriber(
+        topic_name=config.topic_name_drs_object_registered,
+        message_schema=schemas.DRS_OBJECT_REGISTERED,
+    )
+
+    # the same registration is processed twice within one batch:
+    upstream_message = FILES["not_in_registry_not_in_storage"].message
+    upstream_publisher.publish(upstream_message)
+    upstream_publisher.publish(upstream_message)
+
+    exec_with_timeout(
+        func=lambda: subscribe_file_registered(config=config, run_forever=False),
+        timeout_after=2,
+    )
+
+    downstream_message = downstream_subscriber.subscribe(timeout_after=2)
+    assert downstream_message["file_id"] == upstream_message["file_id"]
+
+
+def test_consumer_supervisor(psql_fixture, s3_fixture, amqp_fixture):  # noqa: F811
+    """Test processing messages by the ConsumerSupervisor"""
+
+    config = get_config(
+        sources=[psql_fixture.config, s3_fixture.config, amqp_fixture.config]
+    )
+
+    upstream_publisher = amqp_fixture.get_test_publisher(
+        topic_name=config.topic_name_file_registered,
+        message_schema=schemas.FILE_REGISTERED,
+    )
+    downstream_subscriber = amqp_fixture.get_test_subscriber(
+        topic_name=config.topic_name_drs_object_registered,
+        message_schema=schemas.DRS_OBJECT_REGISTERED,
+    )
+
+    supervisor = ConsumerSupervisor(config=config)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+
+    try:
+        upstream_message = FILES["not_in_registry_not_in_storage"].message
+        upstream_publisher.publish(upstream_message)
+
+        downstream_message = downstream_subscriber.subscribe(timeout_after=2)
+        assert downstream_message["file_id"] == upstream_message["file_id"]
+    finally:
+        supervisor.stop()
+        thread.join(timeout=5)
+
+    assert not thread.is_alive()
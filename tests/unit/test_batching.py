@@ -0,0 +1,100 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Test the batching of stage requests"""
+
+import queue
+from typing import Generator
+
+import pytest
+from ghga_service_chassis_lib.pubsub import validate_message
+
+from drs3.pubsub import PublishError, StageRequestBatcher, batching, schemas
+
+from ..fixtures import get_config
+
+
+class FakePublisher:
+    """Stands in for the AmqpPublisher, queueing the published messages."""
+
+    def __init__(self):
+        self.published: "queue.Queue[dict]" = queue.Queue()
+
+    def start(self):
+        pass
+
+    def publish(self, topic_name: str, message: dict, json_schema: dict):
+        validate_message(message, json_schema, raise_on_exception=True)
+        self.published.put(message)
+
+
+@pytest.fixture(name="publisher")
+def fixture_publisher(monkeypatch) -> Generator[FakePublisher, None, None]:
+    """Replaces the publisher used by the batcher with a fake one."""
+
+    fake_publisher = FakePublisher()
+    monkeypatch.setattr(batching, "get_publisher", lambda config: fake_publisher)
+    yield fake_publisher
+
+
+def _get_messages(count: int) -> list:
+    """Creates the specified number of stage request messages."""
+
+    return [
+        {
+            "request_id": "",
+            "file_id": f"GHGAF{index:014d}",
+            "timestamp": "2021-10-18T14:00:00",
+        }
+        for index in range(count)
+    ]
+
+
+def test_batches(publisher: FakePublisher):
+    """Test that full batches are published at once and others after the window."""
+
+    config = get_config().copy(
+        update={"stage_request_batch_window": 0.2, "stage_request_batch_max_size": 2}
+    )
+    batcher = StageRequestBatcher(config)
+    messages = _get_messages(3)
+
+    batcher.add(messages)
+
+    batch = publisher.published.get(timeout=0.1)
+    assert batch["files"] == messages[:2]
+    assert batch["schema_version"] == batching.STAGE_REQUEST_BATCH_SCHEMA_VERSION
+    validate_message(batch, schemas.STAGE_REQUEST_BATCH, raise_on_exception=True)
+
+    # the rest is published once the window has passed:
+    assert publisher.published.get(timeout=1)["files"] == messages[2:]
+
+    batcher.close()
+
+
+def test_close(publisher: FakePublisher):
+    """Test that pending messages are published on closing."""
+
+    config = get_config().copy(update={"stage_request_batch_window": 60})
+    batcher = StageRequestBatcher(config)
+    messages = _get_messages(2)
+
+    batcher.add(messages)
+    batcher.close()
+
+    assert publisher.published.get_nowait()["files"] == messages
+    assert publisher.published.empty()
+
+    with pytest.raises(PublishError):
+        batcher.add(messages)
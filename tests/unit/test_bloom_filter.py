@@ -0,0 +1,52 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the Bloom filter"""
+
+import pytest
+
+from drs3.core.bloom_filter import BloomFilter
+
+
+def test_no_false_negatives():
+    """Test that all added values are reported as contained."""
+
+    bloom_filter = BloomFilter(capacity=1000, error_rate=0.01)
+    file_ids = [f"myfile-{index}" for index in range(1000)]
+
+    bloom_filter.update(file_ids)
+
+    assert all(file_id in bloom_filter for file_id in file_ids)
+
+
+def test_false_positive_rate():
+    """Test that false positives occur at about the configured rate."""
+
+    bloom_filter = BloomFilter(capacity=10000, error_rate=0.01)
+    bloom_filter.update(f"myfile-{index}" for index in range(10000))
+
+    false_positives = sum(f"unknown-{index}" in bloom_filter for index in range(10000))
+
+    assert false_positives < 200
+    # about 9.6 bits per value are needed for a rate of 1%:
+    assert bloom_filter.size == pytest.approx(10000 * 9.6 / 8, rel=0.01)
+
+
+@pytest.mark.parametrize("capacity,error_rate", [(0, 0.01), (1000, 0), (1000, 1)])
+def test_invalid_parameters(capacity: int, error_rate: float):
+    """Test that filters can't be created with invalid parameters."""
+
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=capacity, error_rate=error_rate)
@@ -0,0 +1,77 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the in-process caches"""
+
+import time
+
+from drs3.core.cache import TtlCache, get_cache
+
+
+def test_ttl_cache_hits_and_misses():
+    """Test that cached values are returned and counted as hits."""
+
+    cache: TtlCache[str, str] = TtlCache(max_size=10, ttl=60)
+
+    assert cache.get("myfile-0") is None
+    cache.set("myfile-0", "https://example.org/myfile-0")
+    assert cache.get("myfile-0") == "https://example.org/myfile-0"
+
+    assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+
+def test_ttl_cache_expiry():
+    """Test that entries expire after their TTL."""
+
+    cache: TtlCache[str, bool] = TtlCache(max_size=10, ttl=60)
+
+    cache.set("myfile-0", False, ttl=0.01)
+    assert cache.get("myfile-0") is False
+
+    time.sleep(0.02)
+    assert cache.get("myfile-0") is None
+
+
+def test_ttl_cache_lru_eviction():
+    """Test that the least recently used entry is evicted first."""
+
+    cache: TtlCache[str, int] = TtlCache(max_size=2, ttl=60)
+
+    cache.set("myfile-0", 0)
+    cache.set("myfile-1", 1)
+    cache.get("myfile-0")
+    cache.set("myfile-2", 2)
+
+    assert cache.get("myfile-0") == 0
+    assert cache.get("myfile-1") is None
+    assert cache.get("myfile-2") == 2
+
+
+def test_ttl_cache_disabled():
+    """Test that a TTL of zero disables caching."""
+
+    cache: TtlCache[str, int] = TtlCache(max_size=2, ttl=0)
+
+    cache.set("myfile-0", 0)
+    assert cache.get("myfile-0") is None
+
+
+def test_get_cache():
+    """Test that caches are shared by name."""
+
+    cache = get_cache("test", max_size=10, ttl=60)
+
+    assert cache is get_cache("test", max_size=10, ttl=60)
+    assert cache is not get_cache("other_test", max_size=10, ttl=60)
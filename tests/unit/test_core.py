@@ -15,18 +15,34 @@
 
 """"Test core functionality"""
 
+import time
 from typing import Optional, Type
 
 import pytest
 import requests
 
 from drs3.config import Config
-from drs3.core import get_drs_object_serve, handle_registered_file, handle_staged_file
+from drs3.core import (
+    AccessIdNotFoundError,
+    forget_outbox_state,
+    get_drs_object_access_url,
+    get_drs_object_serve,
+    get_drs_objects_serve,
+    handle_registered_file,
+    handle_staged_file,
+)
+from drs3.core.eviction import evict_from_outbox
+from drs3.core.known_file_ids import check_file_id_known, get_file_id_filter
+from drs3.core.main import get_outbox_cache, get_prestaged_groups_cache
 from drs3.dao import (
+    Database,
     DrsObjectAlreadyExistsError,
     DrsObjectNotFoundError,
     ObjectNotFoundError,
+    ObjectStorage,
+    get_change_listener,
 )
+from drs3.dao.db_models import DRS_OBJECT_CHANGES_CHANNEL
 from drs3.models import DrsObjectInitial
 
 from ..fixtures import FILES, get_config, psql_fixture, s3_fixture  # noqa: F401
@@ -72,6 +88,91 @@ def test_get_drs_object_serve(
             run()
 
 
+@pytest.mark.parametrize(
+    "file_name,access_id,expected_exception,expect_none",
+    [
+        ("in_registry_in_storage", "s3", None, False),
+        ("in_registry_in_storage", "gs", AccessIdNotFoundError, False),
+        ("in_registry_not_in_storage", "s3", None, True),
+        ("not_in_registry_not_in_storage", "s3", DrsObjectNotFoundError, False),
+    ],
+)
+def test_get_drs_object_access_url(
+    file_name: str,
+    access_id: str,
+    expected_exception: Optional[Type[BaseException]],
+    expect_none: bool,
+    psql_fixture,  # noqa: F811
+    s3_fixture,  # noqa: F811
+):
+    """Test minting access URLs on demand"""
+
+    # get config
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+
+    file = FILES[file_name]
+
+    # metadata-only lookups should not refer to an access URL:
+    if expected_exception is None:
+        drs_object = get_drs_object_serve(
+            drs_id=file.file_id,
+            make_stage_request=dummy_function,
+            config=config,
+            inline_access_url=False,
+        )
+        assert drs_object.access_methods[0].access_url is None  # type: ignore[union-attr]
+        assert drs_object.access_methods[0].access_id == access_id  # type: ignore[union-attr]
+
+    run = lambda: get_drs_object_access_url(
+        drs_id=file.file_id,
+        access_id=access_id,
+        make_stage_request=dummy_function,
+        config=config,
+    )
+
+    if expected_exception is None:
+        access_url = run()
+        if expect_none:
+            assert access_url is None
+        else:
+            response = requests.get(access_url.url)  # type: ignore[union-attr]
+            assert response.status_code == 200
+    else:
+        with pytest.raises(expected_exception):
+            run()
+
+
+def test_get_drs_objects_serve(psql_fixture, s3_fixture):  # noqa: F811
+    """Test the response for a bulk request"""
+
+    # get config
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+
+    staged_files = []
+
+    def make_stage_requests(drs_objects, config: Config):
+        staged_files.extend(drs_object.file_id for drs_object in drs_objects)
+
+    drs_ids = [file.file_id for file in FILES.values()]
+
+    response = get_drs_objects_serve(
+        drs_ids=drs_ids, make_stage_requests=make_stage_requests, config=config
+    )
+
+    assert response.summary.requested == len(drs_ids)
+    assert response.summary.resolved == 1
+    assert response.summary.unresolved == 2
+    assert response.resolved_drs_object[0].id == FILES["in_registry_in_storage"].file_id
+
+    unresolved = {
+        unresolved.error_code: unresolved.object_ids
+        for unresolved in response.unresolved_drs_objects
+    }
+    assert unresolved[202] == [FILES["in_registry_not_in_storage"].file_id]
+    assert unresolved[404] == [FILES["not_in_registry_not_in_storage"].file_id]
+    assert staged_files == unresolved[202]
+
+
 @pytest.mark.parametrize(
     "file_name,expected_exception",
     [
@@ -94,11 +195,95 @@ def test_handle_staged_file(
 
     if expected_exception is None:
         run()
+        # the size is recorded once staged:
+        db_object_info = psql_fixture.database.get_drs_object(FILES[file_name].file_id)
+        assert db_object_info.size == len(FILES[file_name].content)
     else:
         with pytest.raises(expected_exception):
             run()
 
 
+def test_stage_request_deduplication(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that repeated requests for a non-staged file only make one stage request"""
+
+    # get config
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+
+    file = FILES["in_registry_not_in_storage"]
+    stage_requests = []
+
+    for _ in range(3):
+        get_drs_object_serve(
+            drs_id=file.file_id,
+            make_stage_request=lambda drs_object, config: stage_requests.append(
+                drs_object.file_id
+            ),
+            config=config,
+        )
+
+    assert stage_requests == [file.file_id]
+
+
+def test_outbox_cache(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that the outbox state is served from the cache until it is forgotten"""
+
+    # get config, verifying the outbox state on every request:
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config]).copy(
+        update={"outbox_verify_interval": 0}
+    )
+
+    file = FILES["in_registry_in_storage"]
+
+    run = lambda: get_drs_object_serve(
+        drs_id=file.file_id, make_stage_request=dummy_function, config=config
+    )
+
+    assert run() is not None
+
+    # the file leaves the outbox, this is not noticed until the state is forgotten:
+    with ObjectStorage(config=config) as storage:
+        storage.delete_object(
+            bucket_id=config.s3_outbox_bucket_id, object_id=file.file_id
+        )
+    assert run() is not None
+
+    forget_outbox_state(file.file_id, config=config)
+    assert run() is None
+
+
+def test_outbox_state(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that the outbox state recorded in the database is only verified
+    periodically"""
+
+    # get config
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+
+    file = FILES["in_registry_in_storage"]
+
+    run = lambda config: get_drs_object_serve(
+        drs_id=file.file_id, make_stage_request=dummy_function, config=config
+    )
+
+    # the presence in the outbox is verified and recorded on first request:
+    assert run(config) is not None
+    db_object_info = psql_fixture.database.get_drs_object(file.file_id)
+    assert db_object_info.staged_at is not None
+    assert db_object_info.last_verified_at is not None
+
+    # the file leaves the outbox, which is noticed once the state is verified again:
+    with ObjectStorage(config=config) as storage:
+        storage.delete_object(
+            bucket_id=config.s3_outbox_bucket_id, object_id=file.file_id
+        )
+    forget_outbox_state(file.file_id, config=config)
+    assert run(config) is not None
+
+    assert run(config.copy(update={"outbox_verify_interval": 0})) is None
+    db_object_info = psql_fixture.database.get_drs_object(file.file_id)
+    assert db_object_info.staged_at is None
+    assert db_object_info.stage_requested_at is not None
+
+
 @pytest.mark.parametrize(
     "file_name,expected_exception",
     [
@@ -137,3 +322,147 @@ def test_handle_registered_file(
 
 def dummy_function(drs_object, config: Config):
     pass
+
+
+def test_evict_from_outbox(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that staged objects are evicted from the outbox unless pinned"""
+
+    # get config, allowing no objects in the outbox:
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config]).copy(
+        update={"outbox_byte_budget": 0, "outbox_min_residency": 0}
+    )
+
+    file = FILES["in_registry_in_storage"]
+
+    # the object is recorded as staged once requested:
+    assert (
+        get_drs_object_serve(
+            drs_id=file.file_id, make_stage_request=dummy_function, config=config
+        )
+        is not None
+    )
+
+    with Database(config=config) as database:
+        database.set_pinned([file.file_id], pinned=True)
+    assert evict_from_outbox(config) == []
+
+    with Database(config=config) as database:
+        database.set_pinned([file.file_id], pinned=False)
+    assert evict_from_outbox(config) == [file.file_id]
+
+    # the size of the object, which was not known, has been looked up:
+    db_object_info = psql_fixture.database.get_drs_object(file.file_id)
+    assert db_object_info.staged_at is None
+    assert db_object_info.size == len(file.content)
+    with ObjectStorage(config=config) as storage:
+        assert not storage.does_object_exist(
+            bucket_id=config.s3_outbox_bucket_id, object_id=file.file_id
+        )
+
+
+def test_serve_after_eviction(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that evicted objects are not served based on their cached outbox state"""
+
+    # get config, allowing no objects in the outbox:
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config]).copy(
+        update={"outbox_byte_budget": 0, "outbox_min_residency": 0}
+    )
+
+    file = FILES["in_registry_in_storage"]
+
+    run = lambda: get_drs_object_serve(
+        drs_id=file.file_id, make_stage_request=dummy_function, config=config
+    )
+
+    listener = get_change_listener(DRS_OBJECT_CHANGES_CHANNEL, config=config)
+    for _ in range(100):
+        if listener.listening:
+            break
+        time.sleep(0.1)
+    assert listener.listening
+
+    # the presence in the outbox is cached on first request:
+    assert run() is not None
+    assert get_outbox_cache(config).get(file.file_id)
+
+    assert evict_from_outbox(config) == [file.file_id]
+
+    # the eviction is notified, so that the cached outbox state is forgotten:
+    for _ in range(100):
+        if get_outbox_cache(config).get(file.file_id) is None:
+            break
+        time.sleep(0.1)
+    assert run() is None
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_prestage_siblings(bulk: bool, psql_fixture, s3_fixture):  # noqa: F811
+    """Test that staging is requested for the siblings of a non-staged object"""
+
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+    get_prestaged_groups_cache(config).clear()
+
+    file = FILES["in_registry_not_in_storage"]
+    sibling = psql_fixture.non_existing_file_infos[0].copy(
+        update={
+            "file_id": f"{file.file_id}-sibling",
+            "grouping_label": file.grouping_label,
+        }
+    )
+    # the sibling needs to be committed to be visible to the core functions:
+    with Database(config=config) as database:
+        database.register_drs_objects([sibling])
+
+    requested_file_ids = []
+
+    def record_stage_request(drs_object, _):
+        requested_file_ids.append(drs_object.file_id)
+
+    def record_stage_requests(drs_objects, _):
+        requested_file_ids.extend(drs_object.file_id for drs_object in drs_objects)
+
+    for _ in range(2):
+        if bulk:
+            served = get_drs_objects_serve(
+                drs_ids=[file.file_id],
+                make_stage_requests=record_stage_requests,
+                config=config,
+            )
+            assert served.unresolved_drs_objects[0].object_ids == [file.file_id]
+        else:
+            assert (
+                get_drs_object_serve(
+                    drs_id=file.file_id,
+                    make_stage_request=record_stage_request,
+                    config=config,
+                )
+                is None
+            )
+
+    # the siblings are prestaged once:
+    assert requested_file_ids == [file.file_id, sibling.file_id]
+
+
+def test_check_file_id_known(psql_fixture, s3_fixture):  # noqa: F811
+    """Test that objects registered just before are not reported as absent"""
+
+    config = get_config(sources=[psql_fixture.config, s3_fixture.config])
+    file_id_filter = get_file_id_filter(config)
+    known_file_id = FILES["in_registry_in_storage"].file_id
+
+    # wait for the filter to be loaded:
+    for _ in range(100):
+        if file_id_filter.may_exist(known_file_id):
+            break
+        time.sleep(0.1)
+    assert file_id_filter.may_exist(known_file_id)
+
+    new_file = psql_fixture.non_existing_file_infos[0]
+    with Database(config=config) as database:
+        database.register_drs_objects([new_file])
+
+    # no need to wait for the notification of the registration:
+    check_file_id_known(new_file.file_id, config)
+
+    with pytest.raises(DrsObjectNotFoundError):
+        check_file_id_known(f"{new_file.file_id}-unknown", config)
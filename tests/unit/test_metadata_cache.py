@@ -0,0 +1,176 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the caching of DrsObject metadata"""
+
+import threading
+from datetime import datetime
+from typing import Callable, Generator, List
+
+import pytest
+
+from drs3.config import Config
+from drs3.core import metadata_cache
+from drs3.core.cache import clear_caches
+from drs3.dao import DrsObjectNotFoundError
+from drs3.dao.listener import ChangeListener
+from drs3.models import DrsObjectRecord
+
+from ..fixtures import get_config
+
+
+class FakeListener:
+    """Stands in for a ChangeListener connected to the database."""
+
+    def __init__(self):
+        self.listening = True
+        self.generation = 0
+
+    def run_if_unchanged(self, generation: int, action: Callable[[], None]) -> bool:
+        """Call the action, unless the generation changed."""
+
+        if self.generation != generation:
+            return False
+        action()
+        return True
+
+
+def _get_record(file_id: str) -> DrsObjectRecord:
+    """Creates the record of a DrsObject with the specified file ID."""
+
+    return DrsObjectRecord(
+        id="f5d6b0b4-3c1e-4a5f-9a0e-2a6d3c1b2e47",
+        file_id=file_id,
+        md5_checksum="3851c5cb7518a2ff67ab5581c3e01f2f",
+        size=64,
+        registration_date=datetime.now(),
+    )
+
+
+@pytest.fixture(name="listener")
+def fixture_listener(monkeypatch) -> Generator[FakeListener, None, None]:
+    """Replaces the listener of the metadata cache with a fake one."""
+
+    fake_listener = FakeListener()
+    monkeypatch.setattr(
+        metadata_cache, "_get_metadata_listener", lambda config: fake_listener
+    )
+    yield fake_listener
+    clear_caches()
+
+
+def _get_load(file_id: str, loaded: List[str]) -> Callable[[], DrsObjectRecord]:
+    """Creates a function loading the record that records that it was called."""
+
+    def load() -> DrsObjectRecord:
+        loaded.append(file_id)
+        return _get_record(file_id)
+
+    return load
+
+
+def test_cache_hit(listener):
+    """Test that metadata is only loaded on the first lookup."""
+
+    config: Config = get_config()
+    loaded: List[str] = []
+
+    for _ in range(3):
+        record = metadata_cache.get_drs_object_cached(
+            "myfile-0", _get_load("myfile-0", loaded), config
+        )
+        assert record.file_id == "myfile-0"
+
+    assert loaded == ["myfile-0"]
+
+
+def test_cache_bypassed_without_listener(listener):
+    """Test that the cache is bypassed while changes are not received."""
+
+    config: Config = get_config()
+    loaded: List[str] = []
+
+    metadata_cache.get_drs_object_cached(
+        "myfile-0", _get_load("myfile-0", loaded), config
+    )
+    listener.listening = False
+    metadata_cache.get_drs_object_cached(
+        "myfile-0", _get_load("myfile-0", loaded), config
+    )
+
+    assert loaded == ["myfile-0", "myfile-0"]
+
+
+def test_change_during_load_not_cached(listener):
+    """Test that metadata is not cached if a change was notified while loading."""
+
+    config: Config = get_config()
+    loaded: List[str] = []
+
+    def load() -> DrsObjectRecord:
+        loaded.append("myfile-0")
+        listener.generation += 1
+        return _get_record("myfile-0")
+
+    metadata_cache.get_drs_object_cached("myfile-0", load, config)
+    metadata_cache.get_drs_object_cached("myfile-0", load, config)
+
+    assert loaded == ["myfile-0", "myfile-0"]
+
+
+def test_non_existing_not_cached(listener):
+    """Test that lookups of non-existing objects are not cached."""
+
+    config: Config = get_config()
+
+    def load() -> DrsObjectRecord:
+        raise DrsObjectNotFoundError(file_id="myfile-0")
+
+    for _ in range(2):
+        with pytest.raises(DrsObjectNotFoundError):
+            metadata_cache.get_drs_object_cached("myfile-0", load, config)
+
+
+def test_no_change_while_caching():
+    """
+    Test that the listener does not process changes while the loaded metadata is
+    being cached, so that its invalidation can't be missed.
+    """
+
+    listener = ChangeListener(get_config(), channel="test")
+    caching = threading.Event()
+    release = threading.Event()
+
+    def cache():
+        caching.set()
+        release.wait(timeout=5)
+
+    thread = threading.Thread(target=listener.run_if_unchanged, args=(0, cache))
+    thread.start()
+    caching.wait(timeout=5)
+
+    # a reset during caching waits for the caching to complete:
+    reset = threading.Thread(target=listener._reset)  # pylint: disable=protected-access
+    reset.start()
+    reset.join(timeout=0.2)
+    assert listener.generation == 0
+
+    release.set()
+    thread.join(timeout=5)
+    reset.join(timeout=5)
+    assert listener.generation == 1
+
+    # the generation changed, so nothing is cached anymore:
+    assert not listener.run_if_unchanged(0, cache)
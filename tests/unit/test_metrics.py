@@ -0,0 +1,74 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the metrics helpers"""
+
+import os
+import subprocess
+
+import pytest
+
+from drs3.metrics import (
+    MESSAGE_DURATION,
+    MESSAGES,
+    MULTIPROC_DIR_ENV_VAR,
+    mark_dead_processes,
+    observe_message,
+)
+
+
+def test_observe_message():
+    """Test that processed messages are timed and counted by outcome."""
+
+    topic = "test_observe_message"
+
+    with observe_message(topic):
+        pass
+
+    with pytest.raises(RuntimeError):
+        with observe_message(topic):
+            raise RuntimeError()
+
+    success = MESSAGES.labels(topic=topic, outcome="success")
+    failure = MESSAGES.labels(topic=topic, outcome="failure")
+    assert success._value.get() == 1  # pylint: disable=protected-access
+    assert failure._value.get() == 1  # pylint: disable=protected-access
+
+    samples = MESSAGE_DURATION.labels(topic=topic).collect()[0].samples
+    count = next(sample for sample in samples if sample.name.endswith("_count"))
+    assert count.value == 2
+
+
+def test_mark_dead_processes(tmp_path, monkeypatch):
+    """Test that only the metrics of processes that exited are cleaned up."""
+
+    monkeypatch.setenv(MULTIPROC_DIR_ENV_VAR, str(tmp_path))
+
+    exited = subprocess.Popen(["true"])  # pylint: disable=consider-using-with
+    exited.wait()
+
+    for pid in (os.getpid(), exited.pid):
+        (tmp_path / f"counter_{pid}.db").touch()
+        (tmp_path / f"gauge_livesum_{pid}.db").touch()
+
+    mark_dead_processes()
+
+    assert sorted(path.name for path in tmp_path.iterdir()) == sorted(
+        [
+            f"counter_{os.getpid()}.db",
+            f"counter_{exited.pid}.db",
+            f"gauge_livesum_{os.getpid()}.db",
+        ]
+    )
@@ -15,9 +15,23 @@
 
 """Tests the database DAO implementation base on PostgreSQL"""
 
+import json
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
 import pytest
 
-from drs3.dao.db import DrsObjectAlreadyExistsError, DrsObjectNotFoundError
+from drs3.dao.db import (
+    DrsObjectAlreadyExistsError,
+    DrsObjectNotFoundError,
+    PostgresDatabase,
+    get_postgresql_connector,
+)
+from drs3.dao.db_models import DRS_OBJECT_CHANGES_CHANNEL
+from drs3.dao.listener import ChangeListener
+from drs3.models import DrsObjectAccesses, DrsObjectInternal, DrsObjectUpdate
 
 from ..fixtures import psql_fixture  # noqa: F401
 
@@ -41,6 +55,26 @@ def test_get_non_existing_file_obj(psql_fixture):  # noqa: F811
         psql_fixture.database.get_drs_object(non_existing_file_obj.file_id)
 
 
+def test_get_multiple_file_objs(psql_fixture):  # noqa: F811
+    """Test getting multiple file objects at once, reporting non-existing ones."""
+
+    file_ids = [
+        file_obj.file_id
+        for file_obj in psql_fixture.non_existing_file_infos
+        + psql_fixture.existing_file_infos
+    ]
+
+    # use a small chunk size to look up the objects using multiple queries:
+    lookup = psql_fixture.database.get_drs_objects(file_ids + file_ids, chunk_size=1)
+
+    assert [file_obj.file_id for file_obj in lookup.found] == [
+        file_obj.file_id for file_obj in psql_fixture.existing_file_infos
+    ]
+    assert lookup.missing_file_ids == [
+        file_obj.file_id for file_obj in psql_fixture.non_existing_file_infos
+    ]
+
+
 def test_register_non_existing_file_obj(psql_fixture):  # noqa: F811
     """Test registering not existing file object."""
 
@@ -64,6 +98,120 @@ def test_register_existing_file_obj(psql_fixture):  # noqa: F811
         psql_fixture.database.register_drs_object(existing_file_obj)
 
 
+def test_register_file_obj_twice(psql_fixture):  # noqa: F811
+    """
+    Test that only the first of two registrations of the same file object succeeds,
+    even if they are made concurrently, and that the registered object is kept.
+    """
+
+    new_file_obj = psql_fixture.non_existing_file_infos[0]
+    duplicate_file_obj = new_file_obj.copy(
+        update={"md5_checksum": "0" * len(new_file_obj.md5_checksum)}
+    )
+
+    outcomes: "queue.Queue[str]" = queue.Queue()
+
+    def register_duplicate():
+        with PostgresDatabase(psql_fixture.config) as database:
+            try:
+                database.register_drs_object(duplicate_file_obj)
+            except DrsObjectAlreadyExistsError:
+                outcomes.put("already exists")
+            else:
+                outcomes.put("registered")
+
+    with PostgresDatabase(psql_fixture.config) as database:
+        database.register_drs_object(new_file_obj)
+
+        # the concurrent registration waits for this transaction to complete:
+        thread = threading.Thread(target=register_duplicate)
+        thread.start()
+        thread.join(timeout=1)
+        assert thread.is_alive()
+
+    thread.join(timeout=5)
+    assert outcomes.get_nowait() == "already exists"
+
+    returned_file_obj = psql_fixture.database.get_drs_object(new_file_obj.file_id)
+    assert returned_file_obj.md5_checksum == new_file_obj.md5_checksum
+
+
+def test_register_multiple_file_objs(psql_fixture):  # noqa: F811
+    """Test registering multiple file objects at once, skipping existing ones."""
+
+    existing_file_obj = psql_fixture.existing_file_infos[0]
+    non_existing_file_obj = psql_fixture.non_existing_file_infos[0]
+
+    registered_file_ids = psql_fixture.database.register_drs_objects(
+        [existing_file_obj, non_existing_file_obj]
+    )
+
+    assert registered_file_ids == [non_existing_file_obj.file_id]
+    returned_file_obj = psql_fixture.database.get_drs_object(
+        non_existing_file_obj.file_id
+    )
+    assert non_existing_file_obj.md5_checksum == returned_file_obj.md5_checksum
+
+
+def test_update_file_obj(psql_fixture):  # noqa: F811
+    """Test updating an existing and a non-existing file object."""
+
+    existing_record = psql_fixture.database.get_drs_object(
+        psql_fixture.existing_file_infos[0].file_id
+    )
+    existing_file_obj = DrsObjectInternal(
+        id=existing_record.id,
+        file_id=existing_record.file_id,
+        md5_checksum="3851c5cb7518a2ff67ab5581c3e01f2f",
+        size=existing_record.size,
+        registration_date=existing_record.registration_date,
+    )
+
+    assert (
+        psql_fixture.database.update_drs_object(
+            existing_file_obj.file_id, existing_file_obj
+        )
+        == 1
+    )
+    returned_file_obj = psql_fixture.database.get_drs_object(existing_file_obj.file_id)
+    assert returned_file_obj.md5_checksum == existing_file_obj.md5_checksum
+
+    non_existing_file_obj = existing_file_obj.copy(
+        update={"file_id": psql_fixture.non_existing_file_infos[0].file_id}
+    )
+    with pytest.raises(DrsObjectNotFoundError):
+        psql_fixture.database.update_drs_object(
+            non_existing_file_obj.file_id, non_existing_file_obj
+        )
+
+
+def test_update_multiple_file_objs(psql_fixture):  # noqa: F811
+    """Test updating multiple file objects at once, ignoring non-existing ones."""
+
+    existing_file_ids = [
+        file_obj.file_id for file_obj in psql_fixture.existing_file_infos
+    ]
+    updates = [
+        DrsObjectUpdate(file_id=existing_file_ids[0], md5_checksum="checksum-0"),
+        DrsObjectUpdate(
+            file_id=psql_fixture.non_existing_file_infos[0].file_id,
+            md5_checksum="checksum-1",
+        ),
+        DrsObjectUpdate(file_id=existing_file_ids[1], size=12345),
+    ]
+
+    updated_file_objs = psql_fixture.database.update_drs_objects(updates)
+
+    assert [file_obj.file_id for file_obj in updated_file_objs] == existing_file_ids[:2]
+    assert updated_file_objs[0].md5_checksum == "checksum-0"
+    assert updated_file_objs[1].size == 12345
+    # fields that are not set remain unchanged:
+    assert (
+        updated_file_objs[1].md5_checksum
+        == psql_fixture.existing_file_infos[1].md5_checksum
+    )
+
+
 def test_unregister_non_existing_file_obj(psql_fixture):  # noqa: F811
     """Test unregistering not existing file object and expect corresponding error."""
 
@@ -83,3 +231,254 @@ def test_unregister_existing_file_obj(psql_fixture):  # noqa: F811
     # check if file object can no longer be found:
     with pytest.raises(DrsObjectNotFoundError):
         psql_fixture.database.get_drs_object(existing_file_obj.file_id)
+
+
+def test_shared_connector(psql_fixture):  # noqa: F811
+    """Test that all database DAOs of a process share one pooled connector."""
+
+    connector = get_postgresql_connector(psql_fixture.config)
+
+    assert connector is get_postgresql_connector(psql_fixture.config)
+    assert connector.pool_status()["size"] == psql_fixture.config.db_pool_size
+
+
+def test_claim_stage_requests(psql_fixture):  # noqa: F811
+    """Test that staging is only claimed once per window until it is cleared."""
+
+    file_ids = [file_obj.file_id for file_obj in psql_fixture.existing_file_infos]
+
+    assert psql_fixture.database.claim_stage_requests(file_ids, window=60) == file_ids
+    assert psql_fixture.database.claim_stage_requests(file_ids, window=60) == []
+
+    psql_fixture.database.clear_stage_request(file_ids[0])
+    assert psql_fixture.database.claim_stage_requests(file_ids, window=60) == [
+        file_ids[0]
+    ]
+
+
+def test_first_stage_request(psql_fixture):  # noqa: F811
+    """Test that stage requests are measured from the first request, even if
+    staging is requested again."""
+
+    file_id = psql_fixture.existing_file_infos[0].file_id
+
+    # the requests are made in separate transactions, so that time passes:
+    with PostgresDatabase(psql_fixture.config) as database:
+        assert database.claim_stage_requests([file_id], window=0) == [file_id]
+    time.sleep(1)
+    with PostgresDatabase(psql_fixture.config) as database:
+        assert database.claim_stage_requests([file_id], window=0) == [file_id]
+
+        (state,) = database.get_stage_request_states([file_id])
+        assert state.elapsed >= 1
+
+        latency = database.clear_stage_request(file_id)
+        assert latency is not None and latency >= 1
+
+
+def test_staging_latencies(psql_fixture):  # noqa: F811
+    """Test tracking the progress of stage requests and their latencies."""
+
+    database = psql_fixture.database
+    file_ids = [file_obj.file_id for file_obj in psql_fixture.existing_file_infos]
+
+    assert database.get_staging_latency_quantile(quantile=0.5, sample_size=10) is None
+
+    database.claim_stage_requests(file_ids, window=60)
+    states = database.get_stage_request_states(file_ids)
+    assert {state.file_id for state in states} == set(file_ids)
+    assert all(state.elapsed >= 0 for state in states)
+
+    latency = database.clear_stage_request(file_ids[0])
+    assert latency is not None
+    assert database.clear_stage_request(file_ids[0]) is None
+
+    database.record_staging_latency(file_ids[0], size=100, latency=10.0)
+    database.record_staging_latency(file_ids[0], size=100, latency=30.0)
+    database.record_staging_latency(file_ids[0], size=10000, latency=600.0)
+
+    assert (
+        database.get_staging_latency_quantile(
+            quantile=0.5, sample_size=10, max_size=1000
+        )
+        == 20.0
+    )
+    assert (
+        database.get_staging_latency_quantile(
+            quantile=0.5, sample_size=10, min_size=1000
+        )
+        == 600.0
+    )
+    assert database.count_stagings(max_age=60) == 3
+
+    database.prune_staging_latencies(max_age=3600)
+    assert database.count_stagings(max_age=60) == 3
+
+
+def test_listen_to_changes(psql_fixture):  # noqa: F811
+    """Test that changes of file objects are notified to a change listener."""
+
+    notified: "queue.Queue[str]" = queue.Queue()
+
+    listener = ChangeListener(psql_fixture.config, channel=DRS_OBJECT_CHANGES_CHANNEL)
+    listener.subscribe("test", on_notify=notified.put, on_reset=lambda: None)
+    listener.start()
+    try:
+        for _ in range(100):
+            if listener.listening:
+                break
+            time.sleep(0.1)
+        assert listener.listening
+
+        # changes are notified once committed, so they are made in separate
+        # transactions:
+        file_id = psql_fixture.existing_file_infos[0].file_id
+        with PostgresDatabase(psql_fixture.config) as database:
+            database.update_drs_objects([DrsObjectUpdate(file_id=file_id, size=1024)])
+
+        change = json.loads(notified.get(timeout=10))
+        assert change["file_id"] == file_id
+        assert change["changed_at"] <= time.time()
+        assert change["unstaged"] is False
+
+        with PostgresDatabase(psql_fixture.config) as database:
+            database.record_outbox_verification(file_id, in_outbox=True)
+        assert json.loads(notified.get(timeout=10))["unstaged"] is False
+
+        with PostgresDatabase(psql_fixture.config) as database:
+            database.record_outbox_verification(file_id, in_outbox=False)
+        assert json.loads(notified.get(timeout=10))["unstaged"] is True
+    finally:
+        listener.stop()
+
+    assert not listener.listening
+
+
+def test_iter_file_ids(psql_fixture):  # noqa: F811
+    """Test iterating over the file IDs of all file objects in chunks."""
+
+    chunks = list(psql_fixture.database.iter_file_ids(chunk_size=1))
+
+    assert all(len(chunk) == 1 for chunk in chunks)
+    assert {file_id for chunk in chunks for file_id in chunk} >= {
+        file_info.file_id for file_info in psql_fixture.existing_file_infos
+    }
+
+
+def test_record_outbox_verification(psql_fixture):  # noqa: F811
+    """Test recording whether file objects turned out to be in the outbox."""
+
+    database = psql_fixture.database
+    file_id = psql_fixture.existing_file_infos[0].file_id
+
+    staged = database.record_outbox_verification(file_id, in_outbox=True)
+    assert staged is not None
+    assert staged.staged_at is not None
+    assert staged.last_verified_at is not None
+
+    # the object remains staged since it arrived in the outbox:
+    verified = database.record_outbox_verification(file_id, in_outbox=True)
+    assert verified is not None
+    assert verified.staged_at == staged.staged_at
+
+    evicted = database.record_outbox_verification(file_id, in_outbox=False)
+    assert evicted is not None
+    assert evicted.staged_at is None
+
+    non_existing_file_id = psql_fixture.non_existing_file_infos[0].file_id
+    assert (
+        database.record_outbox_verification(non_existing_file_id, in_outbox=True)
+        is None
+    )
+
+
+def test_eviction_candidates(psql_fixture):  # noqa: F811
+    """Test that staged file objects are evicted least recently used first."""
+
+    database = psql_fixture.database
+    file_infos = psql_fixture.existing_file_infos[:2]
+    file_ids = [file_info.file_id for file_info in file_infos]
+
+    for file_id in file_ids:
+        database.record_outbox_verification(file_id, in_outbox=True)
+    assert database.get_outbox_usage() == sum(
+        file_info.size or 0 for file_info in file_infos
+    )
+
+    # the first object is used more recently:
+    database.record_accesses(
+        [
+            DrsObjectAccesses(
+                file_id=file_ids[0],
+                count=3,
+                last_accessed_at=datetime.now(timezone.utc),
+            )
+        ]
+    )
+
+    candidates = database.lock_eviction_candidates(limit=10, min_residency=-60)
+    assert [candidate.file_id for candidate in candidates] == file_ids[::-1]
+
+    database.set_pinned([file_ids[1]], pinned=True)
+    candidates = database.lock_eviction_candidates(limit=10, min_residency=-60)
+    assert [candidate.file_id for candidate in candidates] == file_ids[:1]
+
+    # recently staged objects are not evicted:
+    assert database.lock_eviction_candidates(limit=10, min_residency=60) == []
+
+
+def test_claim_sibling_stage_requests(psql_fixture):  # noqa: F811
+    """Test that staging is requested for unstaged siblings once per window."""
+
+    database = psql_fixture.database
+    requested_file_obj = psql_fixture.existing_file_infos[0]
+
+    # register siblings of the requested object, one of which is staged already:
+    siblings = [
+        psql_fixture.non_existing_file_infos[0].copy(
+            update={
+                "file_id": f"{requested_file_obj.file_id}-sibling-{index}",
+                "grouping_label": requested_file_obj.grouping_label,
+            }
+        )
+        for index in range(3)
+    ]
+    database.register_drs_objects(siblings)
+    database.record_outbox_verification(siblings[2].file_id, in_outbox=True)
+
+    # the more frequently accessed sibling is claimed first:
+    database.record_accesses(
+        [
+            DrsObjectAccesses(
+                file_id=siblings[1].file_id,
+                count=5,
+                last_accessed_at=datetime.now(timezone.utc),
+            )
+        ]
+    )
+    claimed = database.claim_sibling_stage_requests(
+        requested_file_obj.file_id, limit=1, window=60
+    )
+    assert [record.file_id for record in claimed] == [siblings[1].file_id]
+    assert claimed[0].grouping_label == requested_file_obj.grouping_label
+
+    claimed = database.claim_sibling_stage_requests(
+        requested_file_obj.file_id, limit=10, window=60
+    )
+    assert [record.file_id for record in claimed] == [siblings[0].file_id]
+
+    # the remaining siblings are requested or staged already:
+    assert (
+        database.claim_sibling_stage_requests(
+            requested_file_obj.file_id, limit=10, window=60
+        )
+        == []
+    )
+
+    # objects of other groups have no siblings:
+    assert (
+        database.claim_sibling_stage_requests(
+            psql_fixture.existing_file_infos[1].file_id, limit=10, window=60
+        )
+        == []
+    )
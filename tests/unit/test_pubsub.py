@@ -15,12 +15,25 @@
 
 """Test the messaging API (pubsub)"""
 
+import queue
+import threading
+import time
 from datetime import datetime
+from types import SimpleNamespace
 
+import pytest
 from ghga_service_chassis_lib.utils import exec_with_timeout
 
-from drs3.models import DrsObjectInternal
-from drs3.pubsub import publish_stage_request, schemas, subscribe_file_staged
+from drs3.models import DrsObjectRecord
+from drs3.pubsub import (
+    AmqpPublisher,
+    PublishError,
+    publish_stage_request,
+    schemas,
+    subscribe_file_staged,
+)
+from drs3.pubsub.main import ConsumerSupervisor, _Delivery
+from drs3.pubsub.publisher import _Message
 
 from ..fixtures import (  # noqa: F401
     FILES,
@@ -36,7 +49,7 @@ def test_publish_stage_request(amqp_fixture):  # noqa: F811
 
     config = get_config(sources=[amqp_fixture.config])
 
-    drs_object = DrsObjectInternal(
+    drs_object = DrsObjectRecord(
         id=FILES["in_registry_not_in_storage"].id,
         file_id=FILES["in_registry_not_in_storage"].file_id,
         registration_date=datetime.now(),
@@ -61,6 +74,59 @@ def test_publish_stage_request(amqp_fixture):  # noqa: F811
     assert downstream_message["file_id"] == FILES["in_registry_not_in_storage"].file_id
 
 
+def test_publisher_confirms(amqp_fixture):  # noqa: F811
+    """Test that published messages are confirmed by the broker."""
+
+    config = get_config(sources=[amqp_fixture.config])
+
+    downstream_subscriber = amqp_fixture.get_test_subscriber(
+        topic_name=config.topic_name_stage_request,
+        message_schema=schemas.STAGE_REQUEST,
+    )
+
+    publisher = AmqpPublisher(config)
+    message = {
+        "request_id": "",
+        "file_id": FILES["in_registry_not_in_storage"].file_id,
+        "timestamp": datetime.now().isoformat(),
+    }
+    futures = [
+        publisher.publish(config.topic_name_stage_request, message) for _ in range(3)
+    ]
+    for future in futures:
+        future.result(timeout=2)
+    publisher.close()
+
+    downstream_message = downstream_subscriber.subscribe(timeout_after=2)
+    assert downstream_message["file_id"] == message["file_id"]
+
+
+def test_publisher_unreachable_broker():
+    """Test that messages are buffered only up to the size of the queue."""
+
+    config = get_config().copy(
+        update={
+            "rabbitmq_host": "localhost",
+            "rabbitmq_port": 1,
+            "amqp_publish_queue_size": 1,
+            "amqp_publish_timeout": 0.1,
+        }
+    )
+
+    publisher = AmqpPublisher(config)
+    message = {"request_id": "", "file_id": "myfile-0", "timestamp": ""}
+
+    future = publisher.publish(config.topic_name_stage_request, message)
+    with pytest.raises(PublishError):
+        publisher.publish(config.topic_name_stage_request, message)
+
+    publisher.close(timeout=0.1)
+    assert not future.done()
+
+    with pytest.raises(PublishError):
+        publisher.publish(config.topic_name_stage_request, message)
+
+
 def test_subscribe_file_staged(psql_fixture, s3_fixture, amqp_fixture):  # noqa: F811
     """Test subscribing to `file_staged_for_download` topic"""
     config = get_config(
@@ -80,3 +146,92 @@ def test_subscribe_file_staged(psql_fixture, s3_fixture, amqp_fixture):  # noqa:
         func=lambda: subscribe_file_staged(config=config, run_forever=False),
         timeout_after=2,
     )
+
+
+def test_publisher_in_flight_limit():
+    """Test that only up to the size of the queue is sent but not yet confirmed."""
+
+    config = get_config().copy(
+        update={"amqp_publisher_confirms": True, "amqp_publish_queue_size": 2}
+    )
+
+    class FakeChannel:
+        """A channel that records the bodies of the published messages."""
+
+        def __init__(self):
+            self.bodies = []
+
+        def basic_publish(self, body, **_kwargs):
+            """Record the message instead of sending it."""
+            self.bodies.append(body)
+
+    class Ack:  # pylint: disable=too-few-public-methods
+        """A confirmation of the broker."""
+
+        def __init__(self, delivery_tag: int):
+            self.delivery_tag = delivery_tag
+            self.multiple = False
+
+    topic_name = config.topic_name_stage_request
+    publisher = AmqpPublisher(config)
+    channel = FakeChannel()
+    publisher._channel = channel  # pylint: disable=protected-access
+    publisher._declared.add(topic_name)  # pylint: disable=protected-access
+
+    futures = []
+    for index in range(3):
+        message = _Message(topic_name, str(index).encode())
+        publisher._queue.put_nowait(message)  # pylint: disable=protected-access
+        futures.append(message.future)
+        publisher._drain()  # pylint: disable=protected-access
+
+    # the third message stays queued:
+    assert channel.bodies == [b"0", b"1"]
+
+    publisher._on_confirmation(  # pylint: disable=protected-access
+        type("Frame", (), {"method": Ack(1)})
+    )
+    assert futures[0].done() and not futures[2].done()
+    assert channel.bodies == [b"0", b"1", b"2"]
+
+
+def test_consumer_batch_window(monkeypatch):
+    """
+    Test that the workers of the ConsumerSupervisor wait for a batch of file
+    registered messages to fill up.
+    """
+
+    config = get_config().copy(
+        update={
+            "consumer_workers": 1,
+            "file_registered_batch_size": 3,
+            "file_registered_batch_window": 5,
+        }
+    )
+    supervisor = ConsumerSupervisor(config=config)
+
+    batches = []
+    monkeypatch.setattr(
+        supervisor,
+        "_process",
+        lambda batch: batches.append([delivery.message for delivery in batch]),
+    )
+
+    consumer = SimpleNamespace(
+        topic=SimpleNamespace(topic_name=config.topic_name_file_registered)
+    )
+    worker_queue = queue.Queue()
+    worker = threading.Thread(
+        target=supervisor._work,  # pylint: disable=protected-access
+        args=(worker_queue,),
+    )
+    worker.start()
+
+    # the messages arrive one after another but within the window:
+    for index in range(3):
+        worker_queue.put(_Delivery(consumer, index, {"file_id": f"myfile-{index}"}))
+        time.sleep(0.1)
+    worker_queue.put(None)
+    worker.join(timeout=5)
+
+    assert batches == [[{"file_id": f"myfile-{index}"} for index in range(3)]]
@@ -0,0 +1,78 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the estimation of the Retry-After"""
+
+from typing import List, Optional, Tuple
+
+from drs3.core.cache import clear_caches
+from drs3.core.retry_after import get_retry_after
+from drs3.models import StageRequestState
+
+from ..fixtures import get_config
+
+
+class FakeDatabase:
+    """Stands in for a database without observed stagings."""
+
+    def __init__(self, states: List[StageRequestState]):
+        self.states = states
+        self.latency_queries: List[Tuple[Optional[int], Optional[int]]] = []
+
+    def __enter__(self) -> "FakeDatabase":
+        return self
+
+    def __exit__(self, *_args):
+        pass
+
+    def get_stage_request_states(self, _file_ids):
+        """Get the states of the pending stage requests."""
+        return self.states
+
+    def get_staging_latency_quantile(self, min_size=None, max_size=None, **_kwargs):
+        """Record the query, no latencies have been observed."""
+        self.latency_queries.append((min_size, max_size))
+
+    def count_stagings(self, **_kwargs):
+        """No stagings have been observed."""
+        return 0
+
+
+def test_no_estimate_cached(monkeypatch):
+    """
+    Test that the default is used and that it is cached that there is no estimate,
+    using the latencies of all sizes for objects of unknown size.
+    """
+
+    config = get_config().copy(update={"staging_latency_size_buckets": [1000]})
+    database = FakeDatabase(
+        [
+            StageRequestState(
+                file_id="myfile-0", size=None, elapsed=0, queue_position=0
+            ),
+            StageRequestState(
+                file_id="myfile-1", size=10000, elapsed=0, queue_position=0
+            ),
+        ]
+    )
+    monkeypatch.setattr("drs3.core.retry_after.Database", lambda config: database)
+    clear_caches()
+
+    for _ in range(2):
+        assert get_retry_after(["myfile-0", "myfile-1"], config) == (
+            config.retry_after_default
+        )
+
+    assert database.latency_queries == [(None, None), (1000, None)]
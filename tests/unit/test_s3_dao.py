@@ -0,0 +1,51 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests the pooled S3 DAO implementation"""
+
+from drs3.dao import ObjectStorage, get_s3_client
+
+from ..fixtures import FILES, get_config, s3_fixture  # noqa: F401
+
+
+def test_shared_client(s3_fixture):  # noqa: F811
+    """Test that all storage DAOs of a process share one S3 client."""
+
+    config = get_config(sources=[s3_fixture.config])
+    file = FILES["in_registry_in_storage"]
+
+    with ObjectStorage(config=config) as storage:
+        first_client = storage._client  # pylint: disable=protected-access
+        assert storage.does_object_exist(config.s3_outbox_bucket_id, file.file_id)
+
+    with ObjectStorage(config=config) as storage:
+        assert storage._client is first_client  # pylint: disable=protected-access
+
+    assert get_s3_client(config) is first_client
+
+
+def test_get_object_size(s3_fixture):  # noqa: F811
+    """Test getting the size of objects in the outbox."""
+
+    config = get_config(sources=[s3_fixture.config])
+
+    with ObjectStorage(config=config) as storage:
+        file = FILES["in_registry_in_storage"]
+        assert storage.get_object_size(config.s3_outbox_bucket_id, file.file_id) == len(
+            file.content
+        )
+
+        file = FILES["in_registry_not_in_storage"]
+        assert storage.get_object_size(config.s3_outbox_bucket_id, file.file_id) is None
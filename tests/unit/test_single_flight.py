@@ -0,0 +1,120 @@
+# Copyright 2021 Universität Tübingen, DKFZ and EMBL
+# for the German Human Genome-Phenome Archive (GHGA)
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Test the coalescing of concurrent calls"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from drs3.core.single_flight import AsyncSingleFlight, SingleFlight
+
+
+def test_single_flight_shares_result():
+    """Test that concurrent calls with the same key are made only once."""
+
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def lookup() -> str:
+        calls.append(1)
+        release.wait(timeout=5)
+        return "https://example.org/myfile-0"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [
+            executor.submit(single_flight.do, "myfile-0", lookup) for _ in range(4)
+        ]
+        # wait for the followers to join the call in flight:
+        while single_flight.shared < 3:
+            pass
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert calls == [1]
+    assert results == ["https://example.org/myfile-0"] * 4
+
+    # once the call has finished, the next one is made again:
+    assert single_flight.do("myfile-0", lambda: "again") == "again"
+
+
+def test_single_flight_shares_exception():
+    """Test that the exception of a call is raised to all callers."""
+
+    single_flight: SingleFlight[str, str] = SingleFlight()
+    release = threading.Event()
+
+    def lookup() -> str:
+        release.wait(timeout=5)
+        raise KeyError("myfile-0")
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        futures = [
+            executor.submit(single_flight.do, "myfile-0", lookup) for _ in range(2)
+        ]
+        while single_flight.shared < 1:
+            pass
+        release.set()
+
+        for future in futures:
+            with pytest.raises(KeyError):
+                future.result()
+
+
+def test_async_single_flight():
+    """Test that concurrent coroutines with the same key await the call only once."""
+
+    single_flight: AsyncSingleFlight[str, str] = AsyncSingleFlight()
+    calls = []
+
+    async def lookup() -> str:
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "https://example.org/myfile-0"
+
+    async def main():
+        return await asyncio.gather(
+            *(single_flight.do("myfile-0", lookup) for _ in range(4)),
+            single_flight.do("myfile-1", lookup),
+        )
+
+    results = asyncio.run(main())
+
+    assert calls == [1, 1]
+    assert results == ["https://example.org/myfile-0"] * 5
+    assert single_flight.shared == 3
+
+
+def test_async_single_flight_leader_cancelled():
+    """Test that a follower takes over if the leading coroutine is cancelled."""
+
+    single_flight: AsyncSingleFlight[str, str] = AsyncSingleFlight()
+
+    async def lookup() -> str:
+        await asyncio.sleep(0.01)
+        return "https://example.org/myfile-0"
+
+    async def main():
+        leader = asyncio.ensure_future(single_flight.do("myfile-0", lookup))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(single_flight.do("myfile-0", lookup))
+        await asyncio.sleep(0)
+        leader.cancel()
+        return await follower
+
+    assert asyncio.run(main()) == "https://example.org/myfile-0"